@@ -0,0 +1,299 @@
+"""Headless HTTP API for the question-answering pipeline.
+
+Serve it with several worker processes so questions use every core:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Each worker loads the embedding and reranker models once and opens document
+indexes read-only, picking up chunks that other workers index. Ingestion jobs
+live in a shared job file and each one runs in a single worker. The API uses
+`api_retriever_config`, which selects the "numpy" vector store that several
+workers can share; with Chroma it must run a single worker.
+
+Endpoints:
+    POST /documents         upload a PDF and queue it for ingestion
+    GET  /jobs/{job_id}     ingestion job status
+    POST /ask               answer a question, optionally streamed as server-sent events
+    GET  /health            liveness check
+    GET  /admin/inventory   documents, index sizes and last access
+    POST /admin/gc          evict unused documents and sweep orphaned indexes now
+"""
+
+import json
+import os
+import sys
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from pydantic import BaseModel
+from config import (
+    api_retriever_config,
+    checkpoint_path,
+    embedding_config,
+    lifecycle_config,
+    llm_config,
+    llm_gateway_config,
+    memo_config,
+    reasoning_config,
+    reranker_config,
+    routing_config,
+    speculation_config,
+    summary_config,
+)
+from index_registry import IndexRegistry
+from ingestion_jobs import DONE, QUEUED, RUNNING, IngestionJobQueue
+from parallel_embeddings import ParallelFastEmbedEmbeddings
+from question_handler import QuestionHandler, QuestionHandlerConfig
+from retriever_with_reranker import RetrieveWithReranker
+from section_summaries import build_section_summarizer
+
+# The same directory the Gradio app uploads to, so both can serve the same files.
+UPLOAD_DIR = "uploads"
+
+
+def server_workers(argv: Optional[list] = None) -> int:
+    """
+    Return the number of worker processes the server was started with.
+
+    Worker processes are spawned with the server's command line, so every worker
+    sees the `--workers` option (`-w` for gunicorn); uvicorn defaults it to the
+    WEB_CONCURRENCY environment variable. A reloading server runs one worker.
+
+    Args:
+        argv (list, optional): The command line. Defaults to sys.argv.
+
+    Returns:
+        int: The number of worker processes.
+    """
+    argv = sys.argv if argv is None else argv
+    workers = os.environ.get("WEB_CONCURRENCY", "1")
+    for i, arg in enumerate(argv):
+        if arg in ("--workers", "-w") and i + 1 < len(argv):
+            workers = argv[i + 1]
+        elif arg.startswith("--workers="):
+            workers = arg.split("=", 1)[1]
+    try:
+        return max(int(workers), 1)
+    except ValueError:
+        return 1
+
+
+class AskRequest(BaseModel):
+    """A question about one uploaded document, or about all of them if `document` is None."""
+
+    question: str
+    document: Optional[str] = None
+    max_retries: int = 1
+    stream: bool = False
+
+
+class QAService:
+    """The models, question handlers and ingestion queue of one worker process."""
+
+    def __init__(self, upload_dir: str = UPLOAD_DIR):
+        """
+        Initialize a QAService and load the models.
+
+        Args:
+            upload_dir (str, optional): The directory holding the uploaded PDFs. Defaults to "uploads".
+        """
+        # Chroma's local store is single-process.
+        workers = server_workers()
+        if api_retriever_config.get("vector_store", "chroma") == "chroma" and workers > 1:
+            raise RuntimeError(
+                f"The Chroma vector store cannot be shared by {workers} worker processes; "
+                'set api_retriever_config["vector_store"] = "numpy" or run a single worker'
+            )
+        self.upload_dir = upload_dir
+        os.makedirs(upload_dir, exist_ok=True)
+        self.embedding = ParallelFastEmbedEmbeddings(**embedding_config)
+        self.reranker = TextCrossEncoder(**reranker_config)
+        self.summarizer = build_section_summarizer(
+            llm_config, llm_gateway_config, summary_config
+        )
+        self.handlers: Dict[str, Tuple[Optional[float], QuestionHandler]] = {}
+        self._lock = threading.Lock()
+        self.ingestion_jobs = IngestionJobQueue(self.open_retriever)
+        lifecycle = dict(lifecycle_config)
+        gc_interval = lifecycle.pop("gc_interval_minutes") * 60
+        self.index_registry = IndexRegistry(
+            upload_dir=upload_dir,
+            index_directory=api_retriever_config.get("index_directory", "./vector_indexes"),
+            is_busy=self.is_ingesting,
+            **lifecycle,
+        )
+        # Every worker runs the collector; a file lock lets one collect at a time.
+        self.index_registry.start(gc_interval)
+
+    def is_ingesting(self, file_path: str) -> bool:
+        job = self.ingestion_jobs.latest_job(file_path)
+        return job is not None and job["status"] in (QUEUED, RUNNING)
+
+    def open_retriever(self, file_path: str) -> RetrieveWithReranker:
+        """Open a retriever for an ingestion job, sharing the loaded models."""
+        return RetrieveWithReranker(
+            file_path=file_path,
+            reranker=self.reranker,
+            embedding=self.embedding,
+            summarizer=self.summarizer,
+            **{**api_retriever_config, "ingest": False},
+        )
+
+    def document_path(self, document: str) -> str:
+        """Return the path of an uploaded document, rejecting names outside the upload directory."""
+        name = os.path.basename(document)
+        if name != document or not name.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail=f"Invalid document name: {document}")
+        return os.path.join(self.upload_dir, name)
+
+    def handler(self, document: Optional[str]) -> QuestionHandler:
+        """Return the handler for a document, or for all documents if None, creating it on first use."""
+        file_path = self.upload_dir if document is None else self.document_path(document)
+        if document is not None and not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail=f"Unknown document: {document}")
+        # A re-uploaded file may have been evicted meanwhile, so its handler is rebuilt.
+        # The library handler finds added and removed files itself.
+        mtime = None if document is None else os.path.getmtime(file_path)
+        with self._lock:
+            cached = self.handlers.get(file_path)
+            if cached is None or cached[0] != mtime:
+                config = QuestionHandlerConfig(
+                    file_path=file_path,
+                    llm_config=llm_config,
+                    embedding_config=embedding_config,
+                    reranker_config=reranker_config,
+                    llm_gateway_config=llm_gateway_config,
+                    # Serving workers never write an index; ingestion jobs do.
+                    retriever_config={**api_retriever_config, "ingest": False},
+                    memo_config=memo_config,
+                    reasoning_config=reasoning_config,
+                    routing_config=routing_config,
+                    summary_config=summary_config,
+                    speculation_config=speculation_config,
+                    checkpoint_path=checkpoint_path,
+                )
+                handler = QuestionHandler(
+                    config, embedding=self.embedding, reranker=self.reranker
+                )
+                self.handlers[file_path] = (mtime, handler)
+                if document is not None:
+                    self.finalize_if_needed(file_path, handler)
+            return self.handlers[file_path][1]
+
+    def finalize_if_needed(self, file_path: str, handler: QuestionHandler) -> None:
+        """Queue the whole-document indexes of a fully indexed file that lacks them, e.g., one indexed by an older version."""
+        job = self.ingestion_jobs.latest_job(file_path)
+        if (job is None or job["status"] == DONE) and handler.retriever.needs_finalize():
+            self.ingestion_jobs.submit(file_path, finalize_only=True)
+
+    def ingest(self, file: UploadFile) -> dict:
+        """Save an uploaded PDF and queue it for ingestion."""
+        file_path = self.document_path(os.path.basename(file.filename or ""))
+        tmp = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            while chunk := file.file.read(1 << 20):
+                f.write(chunk)
+        os.replace(tmp, file_path)
+        self.index_registry.touch(file_path)
+        job_id = self.ingestion_jobs.submit(file_path)
+        return {"job_id": job_id, "document": os.path.basename(file_path)}
+
+    def partial_index(self, document: Optional[str]) -> bool:
+        """Whether answers about the document come from an index that is still being built."""
+        if document is None:
+            return False
+        job = self.ingestion_jobs.latest_job(self.document_path(document))
+        return job is not None and job["status"] != DONE
+
+    def touch(self, document: Optional[str]) -> None:
+        if document is not None:
+            self.index_registry.touch(self.document_path(document))
+
+    def ask(self, request: AskRequest) -> dict:
+        handler = self.handler(request.document)
+        self.touch(request.document)
+        state = handler.invoke(
+            {"question": request.question, "max_retries": request.max_retries}
+        )
+        return {
+            "answer": state["final_answer"],
+            "document": request.document,
+            "partial_index": self.partial_index(request.document),
+        }
+
+    def ask_stream(self, request: AskRequest) -> Iterator[str]:
+        """Yield server-sent events: one "step" per finished graph node, then the "answer"."""
+        handler = self.handler(request.document)
+        self.touch(request.document)
+        input = {"question": request.question, "max_retries": request.max_retries}
+        try:
+            for node, update in handler.stream(input):
+                if node == "final":
+                    data = {
+                        "answer": update["final_answer"],
+                        "document": request.document,
+                        "partial_index": self.partial_index(request.document),
+                    }
+                    yield _event("answer", data)
+                else:
+                    yield _event("step", {"node": node})
+        except Exception as e:
+            yield _event("error", {"detail": str(e)})
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+service: Optional[QAService] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once in every worker process, after the fork.
+    global service
+    service = QAService()
+    yield
+
+
+app = FastAPI(title="PDF-RAG", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.post("/documents", status_code=202)
+def ingest(file: UploadFile = File(...)):
+    return service.ingest(file)
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = service.ingestion_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.post("/ask")
+def ask(request: AskRequest):
+    if request.stream:
+        # Resolve the handler first so unknown documents fail with a status code.
+        service.handler(request.document)
+        return StreamingResponse(service.ask_stream(request), media_type="text/event-stream")
+    return service.ask(request)
+
+
+@app.get("/admin/inventory")
+def inventory():
+    return service.index_registry.inventory()
+
+
+@app.post("/admin/gc")
+def collect_garbage():
+    return service.index_registry.collect_garbage()
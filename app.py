@@ -3,8 +3,29 @@ import os
 from pathlib import Path
 from gradio import ChatMessage
 import json
-from config import embedding_config, llm_config, reranker_config
+from config import (
+    checkpoint_path,
+    embedding_config,
+    lifecycle_config,
+    llm_config,
+    llm_gateway_config,
+    memo_config,
+    reasoning_config,
+    profiling_config,
+    reranker_config,
+    retriever_config,
+    routing_config,
+    speculation_config,
+    summary_config,
+)
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from parallel_embeddings import ParallelFastEmbedEmbeddings
 from question_handler import QuestionHandler, QuestionHandlerConfig
+from retriever_with_reranker import RetrieveWithReranker
+from section_summaries import build_section_summarizer
+from ingestion_jobs import DONE, FAILED, QUEUED, RUNNING, IngestionJobQueue
+from profiling import RequestProfiler
+from index_registry import IndexRegistry
 import re
 
 
@@ -24,9 +45,66 @@ class ChatManager:
     def __init__(self):
         self.chat_histories = self.load_histories()
         self.app = None
+        self.library_app = None
         self.current_file = None
+        self.profiler = RequestProfiler(**profiling_config)
+        self.profile_requests = False
         # Khôi phục file gần nhất khi khởi tạo
         self.restore_last_file()
+        # Started after the handler so resumed jobs reuse its loaded models.
+        self.ingestion_jobs = IngestionJobQueue(self.open_retriever)
+        if self.app is not None:
+            self.finalize_if_needed(f"{UPLOAD_DIR}/{self.current_file}")
+        lifecycle = dict(lifecycle_config)
+        gc_interval = lifecycle.pop("gc_interval_minutes") * 60
+        self.index_registry = IndexRegistry(
+            upload_dir=UPLOAD_DIR,
+            index_directory=retriever_config.get("index_directory", "./vector_indexes"),
+            is_busy=self.is_ingesting,
+            **lifecycle,
+        )
+        self.index_registry.start(gc_interval, protected=self.open_files)
+
+    def build_question_handler(self, file_path):
+        """Create a QuestionHandler over whatever part of the file is already indexed."""
+        question_handler_config = QuestionHandlerConfig(
+            file_path=file_path,
+            llm_config=llm_config,
+            embedding_config=embedding_config,
+            reranker_config=reranker_config,
+            llm_gateway_config=llm_gateway_config,
+            retriever_config={**retriever_config, "ingest": False},
+            memo_config=memo_config,
+            reasoning_config=reasoning_config,
+            routing_config=routing_config,
+            summary_config=summary_config,
+            speculation_config=speculation_config,
+            checkpoint_path=checkpoint_path,
+        )
+        return QuestionHandler(question_handler_config)
+
+    def library_handler(self):
+        """Return the QuestionHandler searching all uploaded files, creating it on first use."""
+        if self.library_app is None:
+            self.library_app = self.build_question_handler(UPLOAD_DIR)
+        return self.library_app
+
+    def open_retriever(self, file_path):
+        """Open a retriever for a background ingestion job, sharing the loaded models."""
+        if self.app is not None:
+            reranker, embedding = self.app.retriever.reranker, self.app.embedding
+        else:
+            reranker = TextCrossEncoder(**reranker_config)
+            embedding = ParallelFastEmbedEmbeddings(**embedding_config)
+        return RetrieveWithReranker(
+            file_path=file_path,
+            reranker=reranker,
+            embedding=embedding,
+            summarizer=build_section_summarizer(
+                llm_config, llm_gateway_config, summary_config
+            ),
+            **{**retriever_config, "ingest": False},
+        )
 
     def restore_last_file(self):
         """Khôi phục file gần nhất từ current_file.json và khởi tạo QuestionHandler."""
@@ -37,13 +115,9 @@ class ChatManager:
                 if last_file and os.path.exists(f"{UPLOAD_DIR}/{last_file}"):
                     self.current_file = last_file
                     # Khởi tạo QuestionHandler cho file gần nhất
-                    question_handler_config = QuestionHandlerConfig(
-                        file_path=f"{UPLOAD_DIR}/{last_file}",
-                        llm_config=llm_config,
-                        embedding_config=embedding_config,
-                        reranker_config=reranker_config,
+                    self.app = self.build_question_handler(
+                        f"{UPLOAD_DIR}/{last_file}"
                     )
-                    self.app = QuestionHandler(question_handler_config).build_graph()
 
     def upload_file(self, file):
         """Xử lý file PDF được upload và khởi tạo QuestionHandler."""
@@ -62,22 +136,90 @@ class ChatManager:
         with open(CURRENT_FILE, "w", encoding="utf-8") as f:
             json.dump({"current_file": file_name}, f)
 
-        question_handler_config = QuestionHandlerConfig(
-            file_path=file_location,
-            llm_config=llm_config,
-            embedding_config=embedding_config,
-            reranker_config=reranker_config,
-        )
-        self.app = QuestionHandler(question_handler_config).build_graph()
+        self.app = self.build_question_handler(file_location)
         self.current_file = file_name
+        self.index_registry.touch(file_location)
+
+        job = self.ingestion_jobs.latest_job(file_location)
+        if job and job["status"] in (QUEUED, RUNNING):
+            status = f"File '{file_name}' uploaded, indexing is in progress."
+        elif len(self.app.retriever.search_index.chunks) and (job is None or job["status"] == DONE):
+            if self.finalize_if_needed(file_location):
+                status = f"File '{file_name}' uploaded, building its keyword index in the background."
+            else:
+                status = f"File '{file_name}' uploaded successfully!"
+        else:
+            self.ingestion_jobs.submit(file_location)
+            status = f"File '{file_name}' uploaded, indexing in the background. You can start asking questions."
 
         formatted_history = self.format_history_for_display(
             self.get_history_for_file(file_name)
         )
-        return f"File '{file_name}' uploaded successfully!", gr.update(
+        return status, gr.update(
             value=formatted_history, label=f"Current file: {file_name}"
         )
 
+    def finalize_if_needed(self, file_location) -> bool:
+        """Queue the whole-document indexes of a fully indexed file that lacks them, e.g., one indexed by an older version."""
+        job = self.ingestion_jobs.latest_job(file_location)
+        if job is not None and job["status"] != DONE:
+            return False
+        if not self.app.retriever.needs_finalize():
+            return False
+        self.ingestion_jobs.submit(file_location, finalize_only=True)
+        return True
+
+    def ingestion_status(self):
+        """Describe the indexing progress of the current file."""
+        if not self.current_file:
+            return gr.update()
+        job = self.ingestion_jobs.latest_job(f"{UPLOAD_DIR}/{self.current_file}")
+        if job is None:
+            return gr.update()
+        if job["status"] == QUEUED:
+            return f"Indexing '{self.current_file}': queued"
+        if job["status"] == RUNNING:
+            return f"Indexing '{self.current_file}': {job['pages_done']}/{job['pages_total']} pages"
+        if job["status"] == FAILED:
+            return f"Indexing '{self.current_file}' failed: {job['error']}"
+        return f"File '{self.current_file}' is fully indexed ({job['pages_total']} pages)."
+
+    def partial_index_note(self):
+        """Return a note for answers drawn from an index that is still being built."""
+        job = self.ingestion_jobs.latest_job(f"{UPLOAD_DIR}/{self.current_file}")
+        if job is None or job["status"] == DONE:
+            return ""
+        return (
+            f"\n\n<p><i>Answer drawn from a partial index "
+            f"({job['pages_done']}/{job['pages_total'] or '?'} pages indexed).</i></p>"
+        )
+
+    def is_ingesting(self, file_path):
+        job = self.ingestion_jobs.latest_job(file_path)
+        return job is not None and job["status"] in (QUEUED, RUNNING)
+
+    def open_files(self):
+        """Files that garbage collection must keep: the one being chatted about."""
+        return [f"{UPLOAD_DIR}/{self.current_file}"] if self.current_file else []
+
+    def index_inventory(self):
+        """Admin view: every document with its size and last access, and orphaned indexes."""
+        return self.index_registry.inventory()
+
+    def collect_garbage(self):
+        """Admin action: run eviction and the orphan sweep now."""
+        return self.index_registry.collect_garbage(self.open_files())
+
+    def set_profiling(self, enabled):
+        """Admin toggle: profile every question while enabled."""
+        self.profile_requests = enabled
+
+    def last_profile(self):
+        """Return the hotspot summary path of the most recent profile."""
+        if self.profiler.last_profile is None:
+            return gr.update()
+        return self.profiler.last_profile["summary"]
+
     def load_histories(self):
         if os.path.exists(HISTORY_FILE):
             with open(HISTORY_FILE, "r", encoding="utf-8") as f:
@@ -117,21 +259,36 @@ class ChatManager:
                 formatted_history.append(msg)
         return formatted_history
 
-    def generate_response(self, message, history):
+    def generate_response(self, message, history, search_all=False):
+        profiled = self.profiler.should_profile(self.profile_requests)
+        with self.profiler.profile("generate_response", enabled=profiled):
+            return self._generate_response(message, history, search_all)
+
+    def _generate_response(self, message, history, search_all=False):
         if not self.current_file or not self.app:
             return "Please upload a file first."
 
+        if not search_all:
+            try:
+                self.index_registry.touch(f"{UPLOAD_DIR}/{self.current_file}")
+            except FileNotFoundError:
+                # Another process's garbage collector evicted the file and its indexes.
+                evicted, self.current_file, self.app = self.current_file, None, None
+                return f"File '{evicted}' was removed to free space. Please upload it again."
+
         current_history = self.get_history_for_file(self.current_file)
         current_history.append(ChatMessage(role="user", content=message))
 
-        response = self.app.invoke(
+        app = self.library_handler() if search_all else self.app
+        partial_index_note = "" if search_all else self.partial_index_note()
+        response = app.invoke(
             {
                 "question": message,
                 "max_retries": 1,
             }
         )
         answer = response["final_answer"]
-        cleaned_answer = clean_html_text(answer)
+        cleaned_answer = clean_html_text(answer) + partial_index_note
 
         current_history.append(ChatMessage(role="assistant", content=cleaned_answer))
         self.save_histories()
@@ -148,6 +305,12 @@ with gr.Blocks(theme=gr.themes.Base(), css=css) as demo:
         upload_input = gr.File(label="Upload File", file_types=[".pdf"])
         upload_btn = gr.Button("Upload")
         upload_output = gr.Textbox(label="Upload Status", interactive=False)
+        with gr.Accordion("Admin", open=False):
+            profile_toggle = gr.Checkbox(label="Profile questions", value=False)
+            profile_output = gr.Textbox(label="Last profile", interactive=False)
+            inventory_btn = gr.Button("Index inventory")
+            gc_btn = gr.Button("Collect garbage now")
+            admin_output = gr.JSON(label="Indexes")
 
     initial_history = (
         chat_manager.format_history_for_display(
@@ -168,8 +331,16 @@ with gr.Blocks(theme=gr.themes.Base(), css=css) as demo:
             show_copy_button=True,
             label=f"Current file: {chat_manager.current_file or 'None'}",
         ),
+        additional_inputs=[gr.Checkbox(label="Search all uploaded files", value=False)],
     )
 
+    timer = gr.Timer(2)
+    timer.tick(fn=chat_manager.ingestion_status, outputs=upload_output)
+    timer.tick(fn=chat_manager.last_profile, outputs=profile_output)
+    profile_toggle.change(fn=chat_manager.set_profiling, inputs=[profile_toggle])
+    inventory_btn.click(fn=chat_manager.index_inventory, outputs=admin_output)
+    gc_btn.click(fn=chat_manager.collect_garbage, outputs=admin_output)
+
     upload_btn.click(
         fn=chat_manager.upload_file,
         inputs=[upload_input],
@@ -0,0 +1,344 @@
+"""Latency benchmarks for the retrieval pipeline.
+
+Usage:
+    python benchmarks.py vector-store path/to/file.pdf
+    python benchmarks.py mmr
+    python benchmarks.py rerank path/to/file.pdf [--questions questions.txt]
+    python benchmarks.py chunk-store path/to/file.pdf
+    python benchmarks.py embedding path/to/file.pdf [--workers 1 2 4 8]
+    python benchmarks.py splitter path/to/file.pdf [--copies 10]
+    python benchmarks.py dedup path/to/file.pdf [--threshold 0.8]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+import numpy as np
+from langchain_core.documents import Document
+from parallel_embeddings import ParallelFastEmbedEmbeddings
+from langchain_chroma import Chroma
+from langchain_community.retrievers import BM25Retriever
+from langchain_core.vectorstores.utils import (
+    maximal_marginal_relevance as langchain_maximal_marginal_relevance,
+)
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from chunk_store import ChunkStore
+from config import embedding_config, reranker_config, retriever_config
+from numpy_vector_store import NumpyVectorStore, mmr_select
+from offset_splitter import OffsetTextSplitter
+from retriever_with_reranker import (
+    BM25Index,
+    CustomDocumentLoader,
+    RetrieveWithReranker,
+    _chunk_ids,
+)
+
+
+def _timed(fn: Callable, repeats: int) -> List[float]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{name:<40} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms"
+    )
+
+
+def _sample_queries(texts: List[str], n: int, seed: int = 0) -> List[str]:
+    """Use the opening words of random chunks as stand-in questions."""
+    rng = random.Random(seed)
+    picked = rng.sample(texts, min(n, len(texts)))
+    return [" ".join(text.split()[:12]) for text in picked]
+
+
+def bench_vector_store(file_path: str, n_queries: int = 50, k: int = 10, fetch_k: int = 50):
+    """Compare opening and MMR-querying Chroma against NumpyVectorStore on one PDF."""
+    documents = CustomDocumentLoader(file_path).split_and_create_documents()
+    embedding = ParallelFastEmbedEmbeddings(**embedding_config)
+    queries = _sample_queries([d.page_content for d in documents], n_queries)
+    print(f"{len(documents)} chunks, {len(queries)} queries, k={k}, fetch_k={fetch_k}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "chroma": lambda: Chroma(
+                collection_name="bench",
+                persist_directory=f"{tmp}/chroma",
+                embedding_function=embedding,
+            ),
+            "numpy float32": lambda: NumpyVectorStore(
+                f"{tmp}/numpy32", embedding, dtype="float32"
+            ),
+            "numpy float16": lambda: NumpyVectorStore(
+                f"{tmp}/numpy16", embedding, dtype="float16"
+            ),
+        }
+        for name, open_store in backends.items():
+            open_store().add_documents(documents)
+            _report(f"{name}: open", _timed(open_store, 5))
+            retriever = open_store().as_retriever(
+                search_type="mmr", search_kwargs={"k": k, "fetch_k": fetch_k}
+            )
+            it = iter(queries)
+            _report(f"{name}: mmr query", _timed(lambda: retriever.invoke(next(it)), len(queries)))
+
+
+def bench_mmr(dim: int = 512, k_values=(5, 10, 20), fetch_k_values=(50, 200, 1000)):
+    """Compare LangChain's MMR with the vectorized MMR on random unit vectors."""
+    rng = np.random.default_rng(0)
+    for fetch_k in fetch_k_values:
+        candidates = rng.normal(size=(fetch_k, dim)).astype(np.float32)
+        candidates /= np.linalg.norm(candidates, axis=1, keepdims=True)
+        query = candidates.mean(axis=0)
+        query /= np.linalg.norm(query)
+        for k in k_values:
+            _report(
+                f"langchain fetch_k={fetch_k} k={k}",
+                _timed(lambda: langchain_maximal_marginal_relevance(query, candidates, 0.5, k), 20),
+            )
+            _report(
+                f"vectorized fetch_k={fetch_k} k={k}",
+                _timed(lambda: mmr_select(query, candidates, k=k, lambda_mult=0.5), 20),
+            )
+
+
+class _CountingReranker:
+    """Wrap a cross-encoder to count the (query, document) pairs it scores."""
+
+    def __init__(self, reranker):
+        self.reranker = reranker
+        self.pairs = 0
+
+    def rerank(self, query, documents):
+        documents = list(documents)
+        self.pairs += len(documents)
+        return self.reranker.rerank(query, documents)
+
+
+def bench_rerank(file_path: str, questions_file: str = None, n_queries: int = 50):
+    """Report accuracy and latency of cascade reranking against full reranking.
+
+    Accuracy is the share of queries whose top-1 chunk matches full reranking.
+    """
+    reranker = _CountingReranker(TextCrossEncoder(**reranker_config))
+    retriever = RetrieveWithReranker(
+        file_path=file_path,
+        reranker=reranker,
+        embedding=ParallelFastEmbedEmbeddings(**embedding_config),
+        **{**retriever_config, "rerank": "full"},
+    )
+    if questions_file:
+        with open(questions_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = _sample_queries(list(retriever.search_index.chunks.texts()), n_queries)
+
+    results = {}
+    for mode in ("full", "cascade"):
+        retriever.rerank_mode = mode
+        reranker.pairs = 0
+        top, timings = [], []
+        for query in queries:
+            start = time.perf_counter()
+            docs = retriever.search(query, [query])
+            timings.append((time.perf_counter() - start) * 1000)
+            top.append(docs[0].page_content if docs else None)
+        results[mode] = top
+        _report(f"{mode}: search", timings)
+        print(f"{mode}: {reranker.pairs / len(queries):.1f} cross-encoder pairs per query")
+
+    agreement = sum(a == b for a, b in zip(results["full"], results["cascade"]))
+    print(f"cascade top-1 agreement with full: {agreement}/{len(queries)}")
+
+
+def _traced_bytes(build: Callable):
+    """Return the object built and the bytes it keeps allocated."""
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def bench_chunk_store(file_path: str, n_queries: int = 50):
+    """Compare the memory and BM25 latency of Documents + BM25Retriever against ChunkStore + BM25Index."""
+    documents = CustomDocumentLoader(file_path).split_and_create_documents()
+    texts = [d.page_content for d in documents]
+    metadatas = [d.metadata for d in documents]
+    ids = _chunk_ids(documents)
+    queries = _sample_queries(texts, n_queries)
+    print(f"{len(documents)} chunks, {sum(len(t) for t in texts) / 1e6:.1f}M characters")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ChunkStore.build(texts, metadatas, ids).save(tmp)
+        # The chunks.json layout NumpyVectorStore used before ChunkStore.
+        with open(f"{tmp}/chunks.json", "w", encoding="utf-8") as f:
+            json.dump([{"page_content": d.page_content, "metadata": d.metadata} for d in documents], f)
+        del documents
+
+        def load_documents():
+            with open(f"{tmp}/chunks.json", "r", encoding="utf-8") as f:
+                return [Document(**d) for d in json.load(f)]
+
+        legacy, legacy_bytes = _traced_bytes(load_documents)
+        chunks, chunk_bytes = _traced_bytes(lambda: ChunkStore.load(tmp))
+        print(f"{'documents':<40} {legacy_bytes / 1e6:8.2f} MB")
+        print(f"{'chunk store (memory-mapped)':<40} {chunk_bytes / 1e6:8.2f} MB")
+
+        bm25_retriever = BM25Retriever.from_documents(legacy)
+        bm25_index = BM25Index(chunks.texts())
+        it = iter(queries)
+        _report("bm25 retriever: search", _timed(lambda: bm25_retriever.invoke(next(it)), len(queries)))
+        it = iter(queries)
+        _report(
+            "bm25 index: search + materialize",
+            _timed(lambda: [chunks.document(n) for n in bm25_index.search(next(it))], len(queries)),
+        )
+
+
+def bench_embedding(
+    file_path: str, workers=(1, 2, 4), repeats: int = 3, pages_per_commit: int = 8
+):
+    """Report embedding throughput in-process and on worker pools of several sizes, for the whole PDF and per ingestion commit."""
+    documents = CustomDocumentLoader(file_path).split_and_create_documents()
+    texts = [d.page_content for d in documents]
+    # The chunks of each commit of an ingestion job, as IngestionJobQueue embeds them.
+    commits = {}
+    for doc in documents:
+        commits.setdefault(doc.metadata.get("page", 0) // pages_per_commit, []).append(doc.page_content)
+    commits = list(commits.values())
+    print(
+        f"{len(texts)} chunks, {len(commits)} commits of {pages_per_commit} pages, "
+        f"batch_size={embedding_config.get('batch_size', 256)}"
+    )
+    for n_workers in (None, *workers):
+        embedding = ParallelFastEmbedEmbeddings(**{**embedding_config, "workers": n_workers})
+        # Start the pool and load the model in every worker before timing.
+        embedding.embed_documents(texts)
+        name = "in-process" if n_workers is None else f"{n_workers} workers"
+        for label, run in (
+            ("whole PDF", lambda: embedding.embed_documents(texts)),
+            ("per commit", lambda: [embedding.embed_documents(c) for c in commits]),
+        ):
+            timings = _timed(run, repeats)
+            _report(f"embed {label}: {name}", timings)
+            print(f"{'':<40} {len(texts) / (statistics.median(timings) / 1000):8.1f} chunks/s")
+        embedding.close()
+
+
+def bench_splitter(file_path: str, copies: int = 1, repeats: int = 5):
+    """Compare the speed and allocations of the offset splitter and RecursiveCharacterTextSplitter.
+
+    That both produce the same chunks is covered by tests/test_offset_splitter.py.
+    """
+    loader = CustomDocumentLoader(file_path)
+    pages = list(loader.lazy_load_pages()) * copies
+    print(f"{len(pages)} pages, {sum(len(p.page_content) for p in pages) / 1e6:.1f}M characters")
+    loaders = {
+        "recursive": CustomDocumentLoader(file_path),
+        "offsets": CustomDocumentLoader(file_path, splitter="offsets"),
+    }
+
+    for name, l in loaders.items():
+        _report(f"{name}: flat", _timed(lambda: l.split_and_create_documents(pages=pages), repeats))
+        _report(f"{name}: parent/child", _timed(lambda: l.split_parent_child(pages=pages), repeats))
+    texts = [p.page_content for p in pages]
+    splitter = OffsetTextSplitter()
+    _report("offsets: spans only", _timed(lambda: splitter.split_pages(texts), repeats))
+    _, recursive_bytes = _traced_bytes(lambda: loaders["recursive"].split_and_create_documents(pages=pages))
+    _, spans_bytes = _traced_bytes(lambda: splitter.split_pages(texts))
+    print(f"{'recursive: documents':<40} {recursive_bytes / 1e6:8.2f} MB")
+    print(f"{'offsets: spans':<40} {spans_bytes / 1e6:8.2f} MB")
+
+
+def bench_dedup(file_path: str, threshold: float = 0.8, dimension: int = 512):
+    """Report how much header/footer stripping and near-duplicate elimination shrink the index."""
+    stages = {
+        "verbatim": CustomDocumentLoader(file_path),
+        "headers/footers stripped": CustomDocumentLoader(file_path, strip_boilerplate=True),
+        "stripped + deduplicated": CustomDocumentLoader(
+            file_path, strip_boilerplate=True, dedup_threshold=threshold
+        ),
+    }
+    boilerplate = stages["headers/footers stripped"].boilerplate()
+    print(f"{stages['verbatim'].page_count()} pages, {len(boilerplate)} header/footer lines")
+    baseline = None
+    for name, loader in stages.items():
+        start = time.perf_counter()
+        pages = list(loader.lazy_load_pages())
+        documents = loader.split_and_create_documents(pages=pages)
+        duplicates = {}
+        if loader.near_duplicates is not None:
+            documents, _, duplicates = loader.deduplicate(documents, _chunk_ids(documents))
+        elapsed = (time.perf_counter() - start) * 1000
+        chars = sum(len(d.page_content) for d in documents)
+        baseline = baseline or len(documents)
+        collapsed = sum(len(pages) for pages in duplicates.values())
+        print(
+            f"{name:<28} {len(documents):6d} chunks ({1 - len(documents) / baseline:6.1%} fewer)"
+            f"   {chars / 1e3:8.1f}K chars   {len(documents) * dimension * 4 / 1e6:6.2f} MB float32 embeddings"
+            f"   {elapsed:8.1f} ms"
+            + (f"   {collapsed} duplicates collapsed" if duplicates else "")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    vector_store = subparsers.add_parser("vector-store", help="Chroma vs NumpyVectorStore")
+    vector_store.add_argument("file_path")
+    vector_store.add_argument("--queries", type=int, default=50)
+
+    subparsers.add_parser("mmr", help="LangChain MMR vs vectorized MMR")
+
+    rerank = subparsers.add_parser("rerank", help="full vs cascade reranking")
+    rerank.add_argument("file_path")
+    rerank.add_argument("--questions", help="a file with one question per line")
+
+    chunk_store = subparsers.add_parser("chunk-store", help="Documents vs ChunkStore")
+    chunk_store.add_argument("file_path")
+
+    embedding = subparsers.add_parser("embedding", help="in-process vs multi-process embedding")
+    embedding.add_argument("file_path")
+    embedding.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+
+    splitter = subparsers.add_parser("splitter", help="RecursiveCharacterTextSplitter vs OffsetTextSplitter")
+    splitter.add_argument("file_path")
+    splitter.add_argument("--copies", type=int, default=1, help="repeat the pages to simulate a larger PDF")
+
+    dedup = subparsers.add_parser("dedup", help="index size with boilerplate stripping and near-duplicate elimination")
+    dedup.add_argument("file_path")
+    dedup.add_argument("--threshold", type=float, default=0.8)
+
+    args = parser.parse_args()
+    if args.benchmark == "vector-store":
+        bench_vector_store(args.file_path, n_queries=args.queries)
+    elif args.benchmark == "mmr":
+        bench_mmr()
+    elif args.benchmark == "rerank":
+        bench_rerank(args.file_path, questions_file=args.questions)
+    elif args.benchmark == "chunk-store":
+        bench_chunk_store(args.file_path)
+    elif args.benchmark == "embedding":
+        bench_embedding(args.file_path, workers=args.workers)
+    elif args.benchmark == "splitter":
+        bench_splitter(args.file_path, copies=args.copies)
+    elif args.benchmark == "dedup":
+        bench_dedup(args.file_path, threshold=args.threshold)
+
+
+if __name__ == "__main__":
+    main()
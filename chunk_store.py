@@ -0,0 +1,321 @@
+import io
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from numpy.lib import format as npy_format
+
+TEXT_FILE = "chunk_text.npy"
+OFFSETS_FILE = "chunk_offsets.npy"
+PAGES_FILE = "chunk_pages.npy"
+META_FILE = "chunk_meta.json"
+# Stored for chunks without a page number.
+NO_PAGE = -1
+
+
+def _load_array(path: Path) -> np.ndarray:
+    # Empty arrays cannot be memory-mapped.
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path)
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _npy_header(f, dtype: np.dtype, shape: tuple) -> Optional[bytes]:
+    """Return the header of a `.npy` file with `shape` in the version of the open file `f`, or None if it cannot be written."""
+    version = npy_format.read_magic(f)
+    if version not in ((1, 0), (2, 0)):
+        return None
+    header = io.BytesIO()
+    write = (
+        npy_format.write_array_header_1_0
+        if version == (1, 0)
+        else npy_format.write_array_header_2_0
+    )
+    write(
+        header,
+        {"descr": npy_format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape},
+    )
+    return header.getvalue()
+
+
+def _appendable(path: Path, rows: np.ndarray, start: int) -> bool:
+    """Whether `rows` can be appended in place to the `.npy` file at `path`, which must hold exactly `start` rows of the same dtype and row shape."""
+    if not path.exists():
+        return False
+    with open(path, "rb") as f:
+        version = npy_format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(f)
+        else:
+            return False
+        header_size = f.tell()
+        if fortran_order or dtype != rows.dtype or tuple(shape) != (start, *rows.shape[1:]):
+            return False
+        f.seek(0)
+        header = _npy_header(f, dtype, (start + len(rows), *rows.shape[1:]))
+    # The padded header usually keeps its size; if it grows, the file is rewritten.
+    return header is not None and len(header) == header_size
+
+
+def _append_rows(path: Path, rows: np.ndarray, start: int) -> None:
+    """
+    Append `rows` in place to a `.npy` file holding `start` rows, see `_appendable`.
+
+    The rows are written before the header that counts them, so a reader that
+    loads the file meanwhile sees the old rows only; after a crash, the unwritten
+    tail is overwritten by the next append.
+    """
+    with open(path, "r+b") as f:
+        header = _npy_header(f, rows.dtype, (start + len(rows), *rows.shape[1:]))
+        row_bytes = rows.dtype.itemsize * int(np.prod(rows.shape[1:], dtype=np.int64))
+        f.seek(len(header) + start * row_bytes)
+        f.write(np.ascontiguousarray(rows).tobytes())
+        f.truncate()
+        f.flush()
+        f.seek(0)
+        f.write(header)
+
+
+def _merge_metadata(
+    shared: dict, columns: Dict[str, list], size: int, metadatas: List[dict]
+):
+    """Return the shared metadata and columns of a store of `size` chunks after `metadatas` are appended."""
+    metadatas = [{k: v for k, v in m.items() if k != "page"} for m in metadatas]
+    shared = dict(shared)
+    columns = {key: list(values) for key, values in columns.items()}
+    missing = object()
+    for key in list(shared):
+        if any(m.get(key, missing) != shared[key] for m in metadatas):
+            columns[key] = [shared.pop(key)] * size
+    for key in dict.fromkeys(k for m in metadatas for k in m):
+        if key not in shared and key not in columns:
+            columns[key] = [None] * size
+    for key, values in columns.items():
+        values.extend(m.get(key) for m in metadatas)
+    return shared, columns
+
+
+class ChunkStore:
+    """Compact, memory-mappable storage for the chunks of a document.
+
+    All chunk texts sit in one UTF-8 byte array sliced by an offsets array, page
+    numbers sit in an int32 column, and the remaining metadata is stored once when
+    it is the same for every chunk (source, title, ...) or as a column otherwise
+    (e.g., parent_id). Search structures refer to chunks by integer ID, the
+    position in the store, and Documents are materialized only for final results.
+
+    Positions never change: re-adding a chunk ID replaces it in place and new IDs
+    are appended, so integer IDs stay valid across refreshes. Appending new chunks
+    to a persisted store writes only their rows; `base` names the store they were
+    appended to and changes whenever a store is written as a whole, so a reader
+    that sees the same `base` knows the chunks it already has are unchanged.
+    """
+
+    def __init__(
+        self,
+        text: np.ndarray,
+        offsets: np.ndarray,
+        pages: np.ndarray,
+        ids: List[str],
+        shared: dict,
+        columns: Dict[str, list],
+        base: Optional[str] = None,
+    ):
+        """
+        Initialize a ChunkStore. Use `build` or `load` instead of calling this directly.
+
+        Args:
+            text (np.ndarray): The UTF-8 bytes of all chunk texts, as uint8.
+            offsets (np.ndarray): The int64 start offset of each chunk plus the end offset of the last one.
+            pages (np.ndarray): The int32 page number of each chunk, -1 if unknown.
+            ids (List[str]): The string ID of each chunk.
+            shared (dict): The metadata common to all chunks.
+            columns (Dict[str, list]): The remaining metadata, one value (or None) per chunk.
+            base (str, optional): Identifies the store as written as a whole, kept by appends. Defaults to None (unknown).
+        """
+        self.text = text
+        self.offsets = offsets
+        self.pages = pages
+        self.ids = ids
+        self.shared = shared
+        self.columns = columns
+        self.base = base
+        self.positions = {chunk_id: n for n, chunk_id in enumerate(ids)}
+
+    @classmethod
+    def build(
+        cls, texts: List[str], metadatas: List[dict], ids: List[str]
+    ) -> "ChunkStore":
+        """Build an in-memory store from chunk texts, metadata and IDs."""
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        text = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        pages = np.array(
+            [m.get("page", NO_PAGE) for m in metadatas], dtype=np.int32
+        ).reshape(-1)
+        keys = dict.fromkeys(k for m in metadatas for k in m if k != "page")
+        shared, columns = {}, {}
+        for key in keys:
+            values = [m.get(key) for m in metadatas]
+            if all(key in m for m in metadatas) and all(v == values[0] for v in values):
+                shared[key] = values[0]
+            else:
+                columns[key] = values
+        return cls(text, offsets, pages, list(ids), shared, columns, uuid.uuid4().hex)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["ChunkStore"]:
+        """Memory-map a persisted store, or return None if there is none."""
+        directory = Path(directory)
+        if not (directory / META_FILE).exists():
+            return None
+        with open(directory / META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            _load_array(directory / TEXT_FILE),
+            _load_array(directory / OFFSETS_FILE),
+            _load_array(directory / PAGES_FILE),
+            meta["ids"],
+            meta["shared"],
+            meta["columns"],
+            meta.get("base"),
+        )
+
+    def save(self, directory: str) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        _save_array(directory / TEXT_FILE, np.asarray(self.text))
+        _save_array(directory / OFFSETS_FILE, np.asarray(self.offsets))
+        _save_array(directory / PAGES_FILE, np.asarray(self.pages))
+        self._save_meta(directory, self.ids, self.shared, self.columns, self.base)
+
+    @staticmethod
+    def _save_meta(
+        directory: Path, ids: List[str], shared: dict, columns: Dict[str, list], base: Optional[str]
+    ) -> None:
+        tmp = directory / f"{META_FILE}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"ids": ids, "shared": shared, "columns": columns, "base": base},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, directory / META_FILE)
+
+    def append(
+        self, directory: str, texts: List[str], metadatas: List[dict], ids: List[str]
+    ) -> bool:
+        """
+        Append new chunks to this store as persisted in `directory`, writing only their rows.
+
+        The text, offset and page files grow in place and the metadata file, which
+        readers load first and which bounds the chunks they see, is replaced last.
+        Load the store again afterwards to read the new chunks.
+
+        Args:
+            directory (str): The directory this store was loaded from or saved to.
+            texts (List[str]): The chunk texts.
+            metadatas (List[dict]): The chunk metadata.
+            ids (List[str]): The chunk IDs, none of them already stored.
+
+        Returns:
+            bool: False, with nothing written, if the files do not hold exactly this
+            store, e.g., after an interrupted write; save a new store instead.
+        """
+        directory = Path(directory)
+        if not len(self) or any(chunk_id in self.positions for chunk_id in ids):
+            return False
+        encoded = [t.encode("utf-8") for t in texts]
+        text = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        offsets = np.empty(len(encoded), dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets)
+        offsets += int(self.offsets[-1])
+        pages = np.array(
+            [m.get("page", NO_PAGE) for m in metadatas], dtype=np.int32
+        ).reshape(-1)
+        appends = [
+            (directory / TEXT_FILE, text, int(self.offsets[-1])),
+            (directory / PAGES_FILE, pages, len(self)),
+            # Offsets go last: readers slice the text by them.
+            (directory / OFFSETS_FILE, offsets, len(self) + 1),
+        ]
+        if not all(_appendable(path, rows, start) for path, rows, start in appends):
+            return False
+        for path, rows, start in appends:
+            _append_rows(path, rows, start)
+        shared, columns = _merge_metadata(self.shared, self.columns, len(self), metadatas)
+        # A store written before `base` existed gets one, so readers extend from here on.
+        base = self.base or uuid.uuid4().hex
+        self._save_meta(directory, [*self.ids, *ids], shared, columns, base)
+        return True
+
+    @staticmethod
+    def delete(directory: str) -> None:
+        """Remove a persisted store."""
+        for name in (META_FILE, TEXT_FILE, OFFSETS_FILE, PAGES_FILE):
+            path = Path(directory) / name
+            if path.exists():
+                path.unlink()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(
+        self, texts: List[str], metadatas: List[dict], ids: List[str]
+    ) -> "ChunkStore":
+        """Return a new store with the chunks replaced in place or appended."""
+        all_texts = list(self.texts())
+        all_metadatas = [self.metadata(n) for n in range(len(self))]
+        all_ids = list(self.ids)
+        positions = dict(self.positions)
+        for text, metadata, chunk_id in zip(texts, metadatas, ids):
+            n = positions.get(chunk_id)
+            if n is None:
+                positions[chunk_id] = len(all_ids)
+                all_texts.append(text)
+                all_metadatas.append(metadata)
+                all_ids.append(chunk_id)
+            else:
+                all_texts[n] = text
+                all_metadatas[n] = metadata
+        return ChunkStore.build(all_texts, all_metadatas, all_ids)
+
+    def get_text(self, n: int) -> str:
+        """Return the text of the chunk at position `n`."""
+        return bytes(self.text[self.offsets[n] : self.offsets[n + 1]]).decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        """Yield every chunk text in position order."""
+        for n in range(len(self)):
+            yield self.get_text(n)
+
+    def metadata(self, n: int) -> dict:
+        """Return the metadata of the chunk at position `n`."""
+        metadata = dict(self.shared)
+        for key, values in self.columns.items():
+            if values[n] is not None:
+                metadata[key] = values[n]
+        if self.pages[n] != NO_PAGE:
+            metadata["page"] = int(self.pages[n])
+        return metadata
+
+    def document(self, n: int) -> Document:
+        """Materialize the chunk at position `n` as a Document."""
+        return Document(
+            page_content=self.get_text(n), metadata=self.metadata(n), id=self.ids[n]
+        )
@@ -9,12 +9,97 @@ llm_config = {
     "base_url": os.environ.get("LLM_BASE_URL"),
 }
 
+llm_gateway_config = {
+    "max_concurrency": 4,  # requests in flight across all handlers
+    "requests_per_minute": 20,  # token-bucket rate limit, None to disable
+    "max_retries": 5,  # retries on 429, timeouts and 5xx, honoring Retry-After
+    "max_connections": 10,  # pooled HTTP connections
+}
+
 embedding_config = {
-    "model_name": "jinaai/jina-embeddings-v2-small-en",  # FastEmbedEmbeddings
+    "model_name": "jinaai/jina-embeddings-v2-small-en",  # ParallelFastEmbedEmbeddings
     "max_length": 1000,
     "batch_size": 64,
+    "workers": None,  # worker processes embedding chunks at ingest, 0 for one per core
+    "worker_threads": None,  # ONNX Runtime threads per worker, defaults to cores / workers
 }
 
 reranker_config = {
     "model_name": "jinaai/jina-reranker-v1-tiny-en"
-}  # FastEmbed TextCrossEncoder
\ No newline at end of file
+}  # FastEmbed TextCrossEncoder
+
+retriever_config = {
+    "vector_store": "chroma",  # "chroma" or "numpy" (exact in-process index)
+    "index_dtype": "float32",  # NumpyVectorStore matrix dtype, "float32" or "float16"
+    "mmr": "vectorized",  # "vectorized" (resident embeddings) or "store"
+    "k": 10,  # documents returned by the MMR search
+    "fetch_k": 50,  # candidates considered by the MMR search
+    "rerank": "full",  # "full" or "cascade" (fuse by RRF, cross-encode the best few)
+    "cascade_size": 4,  # candidates cross-encoded in cascade mode
+    "cascade_margin": 0.3,  # normalized RRF margin to cross-encode only the winner
+    "keyphrase_index": True,  # ingest-time keyphrase vocabulary instead of per-question KeyBERT
+    "chunking": "flat",  # "flat" or "parent_child" (rerank small chunks, return their parents)
+    "child_chunk_size": 400,
+    "child_chunk_overlap": 50,
+    "splitter": "recursive",  # "recursive" or "offsets" (same chunks, no intermediate strings)
+    "strip_boilerplate": False,  # remove page headers and footers repeated across the PDF
+    "dedup_threshold": None,  # e.g. 0.8: index one chunk per group of near duplicates (MinHash/LSH)
+}
+
+# The HTTP API runs several worker processes, which share the memory-mapped numpy
+# index; Chroma's local store supports a single process.
+api_retriever_config = {**retriever_config, "vector_store": "numpy"}
+
+summary_config = {
+    "enabled": False,  # summarize page groups at ingest so broad questions hit one summary node
+    "pages_per_section": 4,  # pages summarized by each leaf of the summary tree
+    "branching": 4,  # nodes summarized by each node of the level above
+    "max_words": 250,  # requested length of each summary
+}
+
+memo_config = {
+    "enabled": False,  # reuse observations of sub-questions answered by earlier questions on a document
+    "threshold": 0.95,  # cosine similarity at which a sub-question matches a remembered one
+    "max_entries": 500,  # observations kept per document, oldest dropped first
+}
+
+reasoning_config = {
+    # next thoughts proposed per step of the reasoning handler; above 1 they are
+    # retrieved in one batch and graded and answered concurrently
+    "candidate_thoughts": 1,
+}
+
+routing_config = {
+    # e.g. "routing_decisions.jsonl" to log the LLM's grading and routing decisions with
+    # their features and questions, the training data of the classifier; off by default
+    "log_path": None,
+    "model_path": "routing_model.npz",  # `python routing_classifier.py train`; used once it exists
+    "confidence": 0.9,  # below this probability the LLM decides
+    "audit_rate": 0.05,  # share of questions still decided by the LLM, to keep logging
+}
+
+speculation_config = {
+    "enabled": False,  # start likely next LLM calls while the grader and router run
+    "max_calls_per_run": 3,  # speculative LLM calls a question may start
+    "max_in_flight": 2,  # speculative calls running at once across questions
+}
+
+# SQLite file for LangGraph checkpoints; a question that fails part-way resumes
+# from its last completed step when asked again. None to disable.
+checkpoint_path = "checkpoints.sqlite"
+
+profiling_config = {
+    # fraction of questions profiled, e.g. PROFILE_SAMPLE_RATE=0.01; the admin
+    # toggle in the app profiles every question while it is on
+    "sample_rate": float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    "output_dir": "profiles",  # collapsed stacks, hotspot summary and cProfile stats
+    "interval": 0.005,  # seconds between stack samples
+    "top_n": 30,  # hotspots listed in the summary
+}
+
+lifecycle_config = {
+    "quota_gb": None,  # evict least recently used documents while uploads and indexes exceed this
+    "max_idle_days": None,  # evict documents not asked about for this long, None to keep them
+    "orphan_grace_hours": 24,  # age at which uploads that were never indexed are swept
+    "gc_interval_minutes": 60,  # how often eviction and the orphan sweep run
+}
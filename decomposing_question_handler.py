@@ -1,8 +1,9 @@
-from langchain_openai import ChatOpenAI
+from typing import Optional
 from typing_extensions import TypedDict, Annotated
-from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, START, END
-from retriever_with_reranker import RetrieveWithReranker
+from retriever_with_reranker import RetrieveWithReranker, format_documents
+from knowledge_memo import KnowledgeMemo
+from llm_gateway import LLMGateway
 import operator
 from prompts import (
     answer_generator_prompt,
@@ -26,30 +27,59 @@ class State(TypedDict):
     current_thought_index: int
     final_answer: str
     max_retries: int
+    prefetched: dict
 
 
 class DecomposingQuestionHandler:
-    def __init__(self, llm: ChatOpenAI, retriever: RetrieveWithReranker):
+    def __init__(
+        self,
+        llm: LLMGateway,
+        retriever: RetrieveWithReranker,
+        memo: Optional[KnowledgeMemo] = None,
+    ):
         """
         Initialize a DecomposingQuestionHandler.
 
         Args:
-            llm (ChatOpenAI): A configured langchain OpenAI chat model.
+            llm (LLMGateway): The shared gateway to the chat model.
             retriever (RetrieveWithReranker): A configured langchain retriever with reranker.
+            memo (KnowledgeMemo, optional): Observations of sub-questions answered by earlier questions on the document. Defaults to None.
         """
 
         self.llm = llm
         self.retriever = retriever
+        self.memo = memo
+
+    def _recall(self, state: State):
+        """Reuse the remembered observations of the next sub-questions, up to the first one not in the memo."""
+        current_thought_index = state.get("current_thought_index", 0)
+        knowledge = []
+        while self.memo is not None and current_thought_index < len(state["sub_questions"]):
+            thought = state["sub_questions"][current_thought_index]
+            observation = self.memo.lookup(thought)
+            if observation is None:
+                break
+            knowledge.append({"thought": thought, "observation": observation})
+            current_thought_index += 1
+        return {"knowledge": knowledge, "current_thought_index": current_thought_index}
 
     def _retrieve(self, state: State):
         current_thought_index = state.get("current_thought_index", 0)
         query = state["sub_questions"][current_thought_index]
         keywords = state["keywords"]
-        result = self.retriever.search(query, keywords)
-        document = ""
-        for i, r in enumerate(result):
-            document += f"Document {i+1}: {r.page_content}\n\n"
-        return {"document": document}
+        prefetched = dict(state.get("prefetched") or {})
+        if query not in prefetched:
+            # Retrieve every remaining sub-question at once so the reranker runs in one batch.
+            pending = list(
+                dict.fromkeys(
+                    q
+                    for q in state["sub_questions"][current_thought_index:]
+                    if q not in prefetched
+                )
+            )
+            for q, result in zip(pending, self.retriever.search_many(pending, keywords)):
+                prefetched[q] = format_documents(result)
+        return {"document": prefetched[query], "prefetched": prefetched}
 
     def _grade_document(self, state: State):
         current_thought_index = state.get("current_thought_index", 0)
@@ -66,17 +96,9 @@ class DecomposingQuestionHandler:
         Response: YES
         Explanation: The document directly provides the necessary information to answer the question.
         """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    document_grader_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        result = chain.invoke(
-            {"question": query, "document": state["document"], "examples": examples}
+        result = self.llm.invoke(
+            [("human", document_grader_prompt)],
+            {"question": query, "document": state["document"], "examples": examples},
         )
         if  "YES" in result.content.upper() or state["max_retries"] <= 0:
             return "Generate answer"
@@ -86,20 +108,12 @@ class DecomposingQuestionHandler:
     def _regenerate_question(self, state: State):
         current_thought_index = state.get("current_thought_index", 0)
         current_thought = state["sub_questions"][current_thought_index]
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    question_regenerator_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        result = chain.invoke(
+        result = self.llm.invoke(
+            [("human", question_regenerator_prompt)],
             {
                 "original_query": current_thought,
                 "main_query": state["question"],
-            }
+            },
         )
         return {
             "sub_questions": update_list(
@@ -112,16 +126,13 @@ class DecomposingQuestionHandler:
         current_thought_index = state.get("current_thought_index", 0)
         current_thought = state["sub_questions"][current_thought_index]
         context = state["document"]
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    answer_generator_prompt,
-                )
-            ]
+        result = self.llm.invoke(
+            [("human", answer_generator_prompt)],
+            {"question": current_thought, "context": context},
         )
-        chain = prompt | self.llm
-        result = chain.invoke({"question": current_thought, "context": context})
+        # Only observations graded sufficient on the first retrieval are remembered.
+        if self.memo is not None and state["max_retries"] > 0:
+            self.memo.add(current_thought, result.content)
         return {
             "knowledge": [{"thought": current_thought, "observation": result.content}],
             "current_thought_index": state.get("current_thought_index", 0) + 1,
@@ -139,24 +150,19 @@ class DecomposingQuestionHandler:
             [k["observation"] for k in state.get("knowledge", []) if k["observation"]]
         )
         question = state["question"]
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    answer_generator_prompt,
-                )
-            ]
+        result = self.llm.invoke(
+            [("human", answer_generator_prompt)],
+            {"question": question, "context": knowledge},
         )
-        chain = prompt | self.llm
-        result = chain.invoke({"question": question, "context": knowledge})
         return {"final_answer": result.content}
 
-    def build_graph(self):
+    def build_graph(self, checkpointer=None):
         """
         Constructs a state graph for the decomposing question handler.
 
         The graph includes the following nodes and edges:
 
+        - recall: takes the observations of the next sub-questions from the memo while it has them
         - retrieve: retrieves relevant documents based on the sub-question
         - generate_answer: generates an answer based on the retrieved documents
         - regenerate_question: regenerates a new sub-question if the document is insufficient
@@ -166,26 +172,32 @@ class DecomposingQuestionHandler:
 
         The graph is connected by the following edges:
 
-        - START -> retrieve
+        - START -> recall
+        - recall -> generate_final_answer (if all sub-questions are answered)
+        - recall -> retrieve (if more sub-questions need answering)
         - retrieve -> generate_answer (if the document is graded sufficiently)
         - retrieve -> regenerate_question (if the document is not sufficient)
         - regenerate_question -> retrieve
-        - generate_answer -> generate_final_answer (if all sub-questions are answered)
-        - generate_answer -> retrieve (if more sub-questions need answering)
+        - generate_answer -> recall
         - generate_final_answer -> END
 
         The graph is compiled into an application using the `compile` method of the `StateGraph` class.
+        When invoked from a QuestionHandler node it inherits the parent graph's checkpointer.
+
+        Args:
+            checkpointer (optional): A LangGraph checkpointer for standalone use. Defaults to None.
 
         Returns:
             The compiled state machine application.
         """
 
         workflow = StateGraph(state_schema=State)
+        workflow.add_node("recall", self._recall)
         workflow.add_node("retrieve", self._retrieve)
         workflow.add_node("generate_answer", self._generate_answer)
         workflow.add_node("regenerate_question", self._regenerate_question)
         workflow.add_node("generate_final_answer", self._generate_final_answer)
-        workflow.add_edge(START, "retrieve")
+        workflow.add_edge(START, "recall")
         workflow.add_conditional_edges(
             "retrieve",
             self._grade_document,
@@ -195,8 +207,9 @@ class DecomposingQuestionHandler:
             },
         )
         workflow.add_edge("regenerate_question", "retrieve")
+        workflow.add_edge("generate_answer", "recall")
         workflow.add_conditional_edges(
-            "generate_answer",
+            "recall",
             self._should_continue,
             {
                 "Enough knowledge": "generate_final_answer",
@@ -204,5 +217,5 @@ class DecomposingQuestionHandler:
             },
         )
         workflow.add_edge("generate_final_answer", END)
-        app = workflow.compile()
+        app = workflow.compile(checkpointer=checkpointer)
         return app
@@ -0,0 +1,295 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from keyphrase_index import KeyphraseIndex
+from retriever_with_reranker import RetrieveWithReranker, SearchIndex, SearchResult, _top_scored
+
+# A chunk in the corpus: the shard's file name and the chunk's integer ID in that shard.
+ChunkKey = Tuple[str, int]
+
+
+class FederatedRetriever:
+    """Search every PDF in a directory as one corpus.
+
+    Each PDF's index is a shard opened as a RetrieveWithReranker. A query runs the
+    BM25 and vector legs of all shards in parallel, the global best candidates are
+    picked by scores comparable across shards, and a single cross-encoder pass
+    ranks them. Results
+    carry their source file in `metadata["document"]` next to the page number.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        reranker,
+        embedding,
+        max_workers: int = 8,
+        shard_timeout: float = 5.0,
+        global_candidates: int = 20,
+        **shard_config,
+    ):
+        """
+        Initialize a FederatedRetriever and open a shard for each PDF in the directory.
+
+        Args:
+            directory (str): The directory holding the PDF files.
+            reranker: The reranker model to use.
+            embedding: The embedding model to use.
+            max_workers (int, optional): The number of threads running shard searches. Defaults to 8.
+            shard_timeout (float, optional): Seconds to wait for the shard searches of a query; slower shards are left out. Defaults to 5.0.
+            global_candidates (int, optional): The number of fused candidates sent to the cross-encoder. Defaults to 20.
+            **shard_config: Extra arguments for each shard's RetrieveWithReranker, e.g., vector_store, ingest.
+        """
+        self.directory = directory
+        self.reranker = reranker
+        self.embedding = embedding
+        self.shard_timeout = shard_timeout
+        self.global_candidates = global_candidates
+        self.shard_config = shard_config
+        self.keyphrase_index_enabled = shard_config.get("keyphrase_index", True)
+        self.shards: Dict[str, RetrieveWithReranker] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._keyphrase_key = None
+        self._keyphrase_index = None
+        self._discover()
+
+    def _discover(self) -> None:
+        """Open shards for PDFs added to the directory since the last call and drop removed ones."""
+        present = sorted(Path(self.directory).glob("*.pdf"))
+        names = {path.name for path in present}
+        file_paths = [str(path) for path in present if path.name not in self.shards]
+        shards = self._executor.map(self._open_shard, file_paths)
+        with self._lock:
+            for name in [name for name in self.shards if name not in names]:
+                del self.shards[name]
+            for file_path, shard in zip(file_paths, shards):
+                self.shards[os.path.basename(file_path)] = shard
+
+    def _open_shard(self, file_path: str) -> RetrieveWithReranker:
+        return RetrieveWithReranker(
+            file_path=file_path,
+            reranker=self.reranker,
+            embedding=self.embedding,
+            **self.shard_config,
+        )
+
+    def refresh_if_changed(self) -> None:
+        """Open new PDFs and pick up chunks indexed since the last refresh in every shard."""
+        self._discover()
+        list(self._executor.map(lambda s: s.refresh_if_changed(), self.shards.values()))
+
+    @property
+    def keyphrase_index(self) -> Optional[KeyphraseIndex]:
+        """The union of the shards' keyphrase vocabularies, rebuilt when a shard's changes."""
+        indexes = [s.keyphrase_index for s in self.shards.values() if s.keyphrase_index]
+        key = tuple(id(index) for index in indexes)
+        with self._lock:
+            if key != self._keyphrase_key:
+                self._keyphrase_index = self._merge_keyphrase_indexes(indexes)
+                self._keyphrase_key = key
+            return self._keyphrase_index
+
+    def _merge_keyphrase_indexes(
+        self, indexes: List[KeyphraseIndex]
+    ) -> Optional[KeyphraseIndex]:
+        indexes = [index for index in indexes if index.phrases]
+        if not indexes:
+            return None
+        phrases, rows = [], []
+        seen = set()
+        for index in indexes:
+            for i, phrase in enumerate(index.phrases):
+                if phrase not in seen:
+                    seen.add(phrase)
+                    phrases.append(phrase)
+                    rows.append(index.vectors[i])
+        return KeyphraseIndex(
+            phrases, np.stack(rows), self.embedding, indexes[0].ngram_range
+        )
+
+    def search(
+        self, query: str, keywords: List[str] = None, top_k: int = 1
+    ) -> List[Document]:
+        """
+        Retrieve documents from all PDFs based on the query.
+
+        Args:
+            query (str): The query string.
+            keywords (List[str], optional): The keywords to search for with BM25. Defaults to None.
+            top_k (int, optional): The number of documents to return. Defaults to 1.
+
+        Returns:
+            List[Document]: The retrieved documents, with the source file in `metadata["document"]`.
+        """
+        return self.search_scored(query, keywords, top_k).documents
+
+    def search_scored(
+        self, query: str, keywords: List[str] = None, top_k: int = 1
+    ) -> SearchResult:
+        """
+        Retrieve documents like `search`, also returning the best rerank score and the query embedding.
+
+        Args:
+            query (str): The query string.
+            keywords (List[str], optional): The keywords to search for with BM25. Defaults to None.
+            top_k (int, optional): The number of documents to return. Defaults to 1.
+
+        Returns:
+            SearchResult: The retrieved documents, the best cross-encoder score and the normalized query embedding.
+        """
+        self.refresh_if_changed()
+        indexes = self._search_indexes()
+        query_vector = None
+        if any(len(index.chunks) for index in indexes.values()):
+            query_vector = self._embed_query(query)
+        candidates = self._candidates(
+            indexes, query, self._keyword_query(query, keywords), query_vector
+        )
+        if not candidates:
+            return SearchResult([], None, query_vector)
+        scores = list(
+            self.reranker.rerank(query, [self._text(indexes, key) for key in candidates])
+        )
+        documents = self._to_documents(
+            indexes, _top_scored(candidates, scores, len(candidates)), top_k
+        )
+        return SearchResult(documents, max(scores), query_vector)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        # Embedded once for all shards, which share the embedding model.
+        query_vector = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        return query_vector / max(np.linalg.norm(query_vector), 1e-12)
+
+    def search_many(
+        self,
+        queries: List[str],
+        keywords: List[str] = None,
+        top_k: int = 1,
+        batch_size: int = 256,
+    ) -> List[List[Document]]:
+        """
+        Retrieve documents from all PDFs for several queries in one cross-encoder batch.
+
+        Args:
+            queries (List[str]): The query strings.
+            keywords (List[str], optional): The keywords to search for with BM25. Defaults to None.
+            top_k (int, optional): The number of documents to return per query. Defaults to 1.
+            batch_size (int, optional): The cross-encoder batch size. Defaults to 256.
+
+        Returns:
+            List[List[Document]]: The retrieved documents for each query, in query order.
+        """
+        if not queries:
+            return []
+        self.refresh_if_changed()
+        indexes = self._search_indexes()
+        candidates = [
+            self._candidates(indexes, query, self._keyword_query(query, keywords))
+            for query in queries
+        ]
+        pairs = list(
+            dict.fromkeys((q, key) for q, keys in zip(queries, candidates) for key in keys)
+        )
+        scores = []
+        if pairs:
+            scores = self.reranker.rerank_pairs(
+                [(q, self._text(indexes, key)) for q, key in pairs], batch_size=batch_size
+            )
+        pair_scores = dict(zip(pairs, scores))
+        return [
+            self._to_documents(
+                indexes,
+                _top_scored(keys, [pair_scores[(q, key)] for key in keys], len(keys)),
+                top_k,
+            )
+            for q, keys in zip(queries, candidates)
+        ]
+
+    def _search_indexes(self) -> Dict[str, SearchIndex]:
+        """Snapshot every shard's search structures so a refresh cannot change them mid-query."""
+        with self._lock:
+            return {name: shard.search_index for name, shard in self.shards.items()}
+
+    @staticmethod
+    def _text(indexes: Dict[str, SearchIndex], key: ChunkKey) -> str:
+        name, n = key
+        return indexes[name].chunks.get_text(n)
+
+    def _keyword_query(self, query: str, keywords: List[str] = None) -> Optional[str]:
+        if not keywords:
+            return None
+        if len(keywords) == 1:
+            return keywords[0]
+        keyphrase_index = self.keyphrase_index
+        ranked = keyphrase_index.rank(query, keywords) if keyphrase_index else None
+        if ranked is None:
+            ranked = _top_scored(keywords, self.reranker.rerank(query, keywords), 2)
+        return " ".join(ranked)
+
+    def _candidates(
+        self,
+        indexes: Dict[str, SearchIndex],
+        query: str,
+        keyword_query: str = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> List[ChunkKey]:
+        """
+        Run both legs on every shard in parallel and return the global best candidates.
+
+        Rank positions say nothing across shards, since every shard has a first hit.
+        A candidate's score is its cosine similarity to the query plus its BM25 score
+        as a share of the best the keyword query can reach in its shard, both
+        comparable between shards.
+        """
+        legs: List[Tuple[str, object]] = []
+        for name, index in indexes.items():
+            if not len(index.chunks):
+                continue
+            if query_vector is None:
+                query_vector = self._embed_query(query)
+            shard = self.shards[name]
+            if keyword_query is not None:
+                legs.append((name, self._executor.submit(index.bm25.search_scored, keyword_query)))
+            legs.append((name, self._executor.submit(shard._dense_scored, index, query_vector)))
+        if not legs:
+            return []
+        # Shards that miss the deadline are left out so one slow index cannot stall the query.
+        done, _ = wait([future for _, future in legs], timeout=self.shard_timeout)
+        scores: Dict[ChunkKey, float] = {}
+        for name, future in legs:
+            if future not in done or future.exception() is not None:
+                # A shard whose index cannot be read is left out like a slow one.
+                continue
+            for n, score in future.result():
+                scores[(name, n)] = scores.get((name, n), 0.0) + score
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        return [key for key, _ in ranked[: self.global_candidates]]
+
+    @staticmethod
+    def _with_provenance(name: str, doc: Document) -> Document:
+        return Document(page_content=doc.page_content, metadata={**doc.metadata, "document": name})
+
+    def _to_documents(
+        self, indexes: Dict[str, SearchIndex], keys: List[ChunkKey], top_k: int
+    ) -> List[Document]:
+        """Materialize the top_k distinct results, replacing child chunks by their parent chunks."""
+        results = {}
+        for name, n in keys:
+            chunks = indexes[name].chunks
+            shard = self.shards[name]
+            if shard.parents is None:
+                key, doc = chunks.ids[n], chunks.document(n)
+            else:
+                key = chunks.metadata(n)["parent_id"]
+                doc = shard.parents[key]
+            if (name, key) not in results:
+                results[(name, key)] = shard.with_pages(doc, key)
+            if len(results) == top_k:
+                break
+        return [self._with_provenance(name, doc) for (name, _), doc in results.items()]
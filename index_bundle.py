@@ -0,0 +1,321 @@
+"""Export a document's index as a portable bundle and import it on another node.
+
+A bundle is a zip file holding everything needed to search one PDF without
+parsing, splitting or embedding it again: the chunks and their metadata, the
+chunk embeddings, the BM25 statistics, the parent chunks, keyphrase index and
+near-duplicate page references when present, and optionally the PDF itself.
+`manifest.json` records the format version, the embedding model identity and a
+SHA-256 checksum of every file.
+
+Usage:
+    python index_bundle.py export uploads/file.pdf file.ragbundle
+    python index_bundle.py import file.ragbundle [--upload-dir uploads]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from chunk_store import META_FILE, OFFSETS_FILE, PAGES_FILE, TEXT_FILE, ChunkStore
+from keyphrase_index import KEYPHRASE_EMBEDDINGS_FILE, KEYPHRASES_FILE, KeyphraseIndex
+from numpy_vector_store import NumpyVectorStore
+from retriever_with_reranker import (
+    DUPLICATES_FILE,
+    PARENTS_FILE,
+    BM25Index,
+    RetrieveWithReranker,
+    _load_duplicates,
+    _load_parents,
+    _save_duplicates,
+    _save_parents,
+)
+
+BUNDLE_FORMAT = "pdf-rag-index"
+BUNDLE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+BM25_FILE = "bm25.json"
+CHUNK_FILES = (TEXT_FILE, OFFSETS_FILE, PAGES_FILE, META_FILE)
+KEYPHRASE_FILES = (KEYPHRASES_FILE, KEYPHRASE_EMBEDDINGS_FILE)
+INDEX_FILES = frozenset(
+    (*CHUNK_FILES, EMBEDDINGS_FILE, BM25_FILE, PARENTS_FILE, DUPLICATES_FILE, *KEYPHRASE_FILES)
+)
+
+
+class BundleError(ValueError):
+    """Raised when a bundle is corrupt or does not fit the retriever it is imported into."""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def embedding_identity(embedding, dimension: Optional[int] = None) -> dict:
+    """Describe an embedding model well enough to tell whether two nodes embed alike."""
+    return {
+        "class": type(embedding).__name__,
+        "model_name": getattr(embedding, "model_name", None),
+        "max_length": getattr(embedding, "max_length", None),
+        "dimension": dimension,
+    }
+
+
+def _embeddings(retriever: RetrieveWithReranker) -> np.ndarray:
+    """Return the normalized chunk embeddings, row `n` for chunk `n` of the search index."""
+    index = retriever.search_index
+    if isinstance(index.dense, NumpyVectorStore):
+        return np.asarray(index.dense.matrix)
+    ids = list(index.chunks.ids)
+    data = retriever.vector_store.get(ids=ids, include=["embeddings"])
+    rows = dict(zip(data["ids"], data["embeddings"]))
+    vectors = np.asarray([rows[chunk_id] for chunk_id in ids], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def export_bundle(
+    retriever: RetrieveWithReranker, bundle_path: str, include_pdf: bool = True
+) -> dict:
+    """
+    Write the retriever's index to a bundle file.
+
+    Args:
+        retriever (RetrieveWithReranker): A retriever whose document is fully ingested.
+        bundle_path (str): The bundle file to write.
+        include_pdf (bool, optional): Also bundle the PDF, which the importing node needs to open a retriever. Defaults to True.
+
+    Returns:
+        dict: The bundle manifest.
+    """
+    retriever.refresh_if_changed()
+    index = retriever.search_index
+    if not len(index.chunks):
+        raise BundleError(f"{retriever.file_path} has no indexed chunks to export")
+    vectors = _embeddings(retriever)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        index.chunks.save(tmp)
+        with open(tmp / EMBEDDINGS_FILE, "wb") as f:
+            np.save(f, vectors)
+        with open(tmp / BM25_FILE, "w", encoding="utf-8") as f:
+            json.dump(index.bm25.stats(), f, ensure_ascii=False)
+        names = [*CHUNK_FILES, EMBEDDINGS_FILE, BM25_FILE]
+        if retriever.parents is not None:
+            _save_parents(tmp / PARENTS_FILE, retriever.parents)
+            names.append(PARENTS_FILE)
+        if retriever.keyphrase_index is not None:
+            retriever.keyphrase_index.save(tmp)
+            names.extend(KEYPHRASE_FILES)
+        if retriever.duplicates:
+            _save_duplicates(tmp / DUPLICATES_FILE, retriever.duplicates)
+            names.append(DUPLICATES_FILE)
+        document = os.path.basename(retriever.file_path)
+        files = {name: (tmp / name).read_bytes() for name in names}
+        if include_pdf:
+            with open(retriever.file_path, "rb") as f:
+                files[document] = f.read()
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created_at": time.time(),
+        "document": document,
+        "pdf": document if include_pdf else None,
+        "chunk_count": len(index.chunks),
+        "chunking": {
+            "mode": retriever.chunking,
+            "child_chunk_size": retriever.child_chunk_size,
+            "child_chunk_overlap": retriever.child_chunk_overlap,
+        },
+        "embedding": embedding_identity(retriever.embedding, int(vectors.shape[1])),
+        "files": {name: _sha256(data) for name, data in files.items()},
+    }
+    tmp_bundle = f"{bundle_path}.tmp"
+    with zipfile.ZipFile(tmp_bundle, "w", zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr(MANIFEST_FILE, json.dumps(manifest, indent=2))
+        for name, data in files.items():
+            bundle.writestr(name, data)
+    os.replace(tmp_bundle, bundle_path)
+    return manifest
+
+
+def read_manifest(bundle_path: str) -> dict:
+    """Return the manifest of a bundle, checking that this version can read it."""
+    with zipfile.ZipFile(bundle_path) as bundle:
+        manifest = json.loads(bundle.read(MANIFEST_FILE))
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{bundle_path} is not an index bundle")
+    if manifest["version"] > BUNDLE_VERSION:
+        raise BundleError(
+            f"{bundle_path} has bundle version {manifest['version']}, "
+            f"this version reads up to {BUNDLE_VERSION}"
+        )
+    _check_names(bundle_path, manifest)
+    return manifest
+
+
+def _check_names(bundle_path: str, manifest: dict) -> None:
+    """
+    Reject bundles whose member names could be written outside the target directory.
+
+    Only the known index files and a single PDF, all plain file names, are accepted.
+    """
+    pdf = manifest["pdf"]
+    if pdf is not None and (
+        not isinstance(pdf, str)
+        or os.path.basename(pdf) != pdf
+        or pdf in (".", "..")
+        or not pdf.lower().endswith(".pdf")
+        or pdf not in manifest["files"]
+    ):
+        raise BundleError(f"{bundle_path} names an invalid PDF: {pdf!r}")
+    for name in manifest["files"]:
+        if name not in INDEX_FILES and name != pdf:
+            raise BundleError(f"{bundle_path} contains an unexpected file: {name!r}")
+
+
+def _read_verified(bundle: zipfile.ZipFile, manifest: dict, name: str) -> bytes:
+    data = bundle.read(name)
+    if _sha256(data) != manifest["files"][name]:
+        raise BundleError(f"Checksum mismatch for {name}")
+    return data
+
+
+def extract_pdf(bundle_path: str, directory: str) -> str:
+    """
+    Write the bundled PDF to `directory`, keeping an identical existing file.
+
+    Returns:
+        str: The path of the PDF.
+    """
+    manifest = read_manifest(bundle_path)
+    if not manifest["pdf"]:
+        raise BundleError(f"{bundle_path} does not contain the PDF")
+    path = os.path.join(directory, manifest["pdf"])
+    with zipfile.ZipFile(bundle_path) as bundle:
+        data = _read_verified(bundle, manifest, manifest["pdf"])
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            if _sha256(f.read()) == manifest["files"][manifest["pdf"]]:
+                return path
+    os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(data)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def _check_compatible(retriever: RetrieveWithReranker, manifest: dict) -> None:
+    model = manifest["embedding"]["model_name"]
+    local_model = getattr(retriever.embedding, "model_name", None)
+    if model != local_model:
+        raise BundleError(
+            f"The bundle was embedded with {model}, this node embeds queries with {local_model}"
+        )
+    matrix = getattr(retriever.search_index.dense, "matrix", None)
+    if matrix is not None and len(matrix) and matrix.shape[1] != manifest["embedding"]["dimension"]:
+        raise BundleError("The bundle's embedding dimension does not match the existing index")
+    chunking = manifest["chunking"]
+    if chunking["mode"] != retriever.chunking:
+        raise BundleError(
+            f"The bundle uses {chunking['mode']} chunking, the retriever {retriever.chunking}"
+        )
+
+
+def import_bundle(retriever: RetrieveWithReranker, bundle_path: str) -> dict:
+    """
+    Load a bundle into a retriever without embedding anything.
+
+    Every file is checked against its checksum, and the bundle must have been
+    embedded with the retriever's embedding model and use its chunking mode.
+
+    Args:
+        retriever (RetrieveWithReranker): A retriever for the bundled PDF, opened with `ingest=False`.
+        bundle_path (str): The bundle file to import.
+
+    Returns:
+        dict: The bundle manifest.
+    """
+    manifest = read_manifest(bundle_path)
+    _check_compatible(retriever, manifest)
+    with zipfile.ZipFile(bundle_path) as bundle, tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for name in manifest["files"]:
+            if name != manifest["pdf"]:
+                (tmp / name).write_bytes(_read_verified(bundle, manifest, name))
+        chunks = ChunkStore.load(tmp)
+        vectors = np.load(tmp / EMBEDDINGS_FILE)
+        with open(tmp / BM25_FILE, "r", encoding="utf-8") as f:
+            bm25 = BM25Index.from_stats(json.load(f))
+        parents = _load_parents(tmp / PARENTS_FILE) if (tmp / PARENTS_FILE).exists() else None
+        keyphrase_index = KeyphraseIndex.load(tmp, retriever.embedding)
+        ids = list(chunks.ids)
+        retriever.add_embedded_chunks(
+            vectors,
+            list(chunks.texts()),
+            [chunks.metadata(n) for n in range(len(chunks))],
+            ids,
+            parents=parents,
+            keyphrase_index=keyphrase_index,
+            bm25=bm25,
+            duplicates=_load_duplicates(tmp / DUPLICATES_FILE),
+        )
+    return manifest
+
+
+def _open_retriever(file_path: str, ingest: bool) -> RetrieveWithReranker:
+    from fastembed.rerank.cross_encoder import TextCrossEncoder
+    from config import (
+        embedding_config,
+        llm_config,
+        llm_gateway_config,
+        reranker_config,
+        retriever_config,
+        summary_config,
+    )
+    from parallel_embeddings import ParallelFastEmbedEmbeddings
+    from section_summaries import build_section_summarizer
+
+    return RetrieveWithReranker(
+        file_path=file_path,
+        reranker=TextCrossEncoder(**reranker_config),
+        embedding=ParallelFastEmbedEmbeddings(**embedding_config),
+        summarizer=build_section_summarizer(llm_config, llm_gateway_config, summary_config),
+        **{**retriever_config, "ingest": ingest},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="ingest a PDF if needed and write its bundle")
+    export.add_argument("file_path")
+    export.add_argument("bundle_path")
+    export.add_argument("--without-pdf", action="store_true", help="leave the PDF out of the bundle")
+
+    load = subparsers.add_parser("import", help="extract the PDF and load its index from a bundle")
+    load.add_argument("bundle_path")
+    load.add_argument("--upload-dir", default="uploads")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        retriever = _open_retriever(args.file_path, ingest=True)
+        manifest = export_bundle(retriever, args.bundle_path, include_pdf=not args.without_pdf)
+    else:
+        file_path = extract_pdf(args.bundle_path, args.upload_dir)
+        manifest = import_bundle(_open_retriever(file_path, ingest=False), args.bundle_path)
+    print(f"{args.command}ed {manifest['chunk_count']} chunks of {manifest['document']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from filelock import FileLock, Timeout
+from retriever_with_reranker import collection_names
+
+REGISTRY_FILE = "index_registry.json"
+CHROMA_DB_FILE = "chroma.sqlite3"
+
+logger = logging.getLogger(__name__)
+
+
+def _path_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    if not path.is_dir():
+        return 0
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IndexRegistry:
+    """Track uploaded documents and their indexes, and reclaim the space of unused ones.
+
+    The registry records each upload's source hash and last access in a JSON file
+    shared by all processes. `collect_garbage` evicts documents idle for longer
+    than `max_idle_days`, then the least recently used ones while the uploads and
+    indexes exceed `quota_gb`, and removes collections, index directories and
+    uploads that no longer belong to a document. Chroma reuses the space freed in
+    its SQLite file; it is not compacted, as other processes may hold it open.
+    """
+
+    def __init__(
+        self,
+        upload_dir: str = "uploads",
+        persist_directory: str = "./chromadb",
+        index_directory: str = "./vector_indexes",
+        registry_file: str = REGISTRY_FILE,
+        quota_gb: Optional[float] = None,
+        max_idle_days: Optional[float] = None,
+        orphan_grace_hours: float = 24,
+        touch_interval: float = 60.0,
+        is_busy: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Initialize an IndexRegistry.
+
+        Args:
+            upload_dir (str, optional): The directory holding the uploaded PDFs. Defaults to "uploads".
+            persist_directory (str, optional): The Chroma persist directory. Defaults to "./chromadb".
+            index_directory (str, optional): The NumpyVectorStore index directory. Defaults to "./vector_indexes".
+            registry_file (str, optional): The JSON file holding the registry. Defaults to "index_registry.json".
+            quota_gb (float, optional): The disk space uploads and indexes may use before the least recently used documents are evicted. Defaults to None (no quota).
+            max_idle_days (float, optional): Evict documents not accessed for this long. Defaults to None (never).
+            orphan_grace_hours (float, optional): The age an unindexed upload must reach before it is swept. Defaults to 24.
+            touch_interval (float, optional): Seconds within which repeated accesses are recorded once. Defaults to 60.0.
+            is_busy (Callable[[str], bool], optional): Returns True for files that must not be evicted, e.g., while they are being ingested. Defaults to None.
+        """
+        self.upload_dir = Path(upload_dir)
+        self.persist_directory = Path(persist_directory)
+        self.index_directory = Path(index_directory)
+        self.registry_file = registry_file
+        self.quota_bytes = quota_gb * 1e9 if quota_gb else None
+        self.max_idle_seconds = max_idle_days * 86400 if max_idle_days else None
+        self.orphan_grace_seconds = orphan_grace_hours * 3600
+        self.touch_interval = touch_interval
+        self.is_busy = is_busy or (lambda file_path: False)
+        self._lock = FileLock(f"{registry_file}.lock")
+        # Held while collecting garbage, so only one process collects at a time.
+        self._gc_lock = FileLock(f"{registry_file}.gc.lock")
+        self._thread: Optional[threading.Thread] = None
+
+    def _load(self) -> Dict[str, dict]:
+        if os.path.exists(self.registry_file):
+            with open(self.registry_file, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+                if content:
+                    return json.loads(content)
+        return {}
+
+    def _save(self, entries: Dict[str, dict]) -> None:
+        tmp = f"{self.registry_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.registry_file)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Dict[str, dict]]:
+        with self._lock:
+            entries = self._load()
+            yield entries
+            self._save(entries)
+
+    def _uploads(self) -> List[str]:
+        return sorted(str(p) for p in self.upload_dir.glob("*.pdf"))
+
+    def touch(self, file_path: str) -> None:
+        """Record an access to a document, registering it on first access."""
+        now = time.time()
+        mtime = os.path.getmtime(file_path)
+        entry = self._load().get(file_path)
+        if entry and entry["source_mtime"] == mtime and now - entry["last_access"] < self.touch_interval:
+            return
+        with self._transaction() as entries:
+            self._register(entries, file_path, now)
+
+    def _register(self, entries: Dict[str, dict], file_path: str, last_access: float) -> None:
+        mtime = os.path.getmtime(file_path)
+        entry = entries.get(file_path)
+        if entry is None or entry["source_mtime"] != mtime:
+            entry = entries[file_path] = {
+                "file_path": file_path,
+                "source_sha256": _file_sha256(file_path),
+                "source_mtime": mtime,
+                "created_at": time.time(),
+                "last_access": last_access,
+            }
+        entry["last_access"] = max(entry["last_access"], last_access)
+
+    def _chroma_client(self):
+        """Return a client of the Chroma store, or None if nothing was ever persisted."""
+        import chromadb
+
+        if not (self.persist_directory / CHROMA_DB_FILE).exists():
+            return None
+        return chromadb.PersistentClient(path=str(self.persist_directory))
+
+    def _chroma_collections(self) -> Dict[str, int]:
+        """Return the Chroma collections and an estimate of their size in bytes."""
+        client = self._chroma_client()
+        if client is None:
+            return {}
+        counts = {c.name: c.count() for c in client.list_collections()}
+        # Each collection is charged its share of the store's disk usage by record count.
+        total = sum(counts.values())
+        store_bytes = _path_size(self.persist_directory)
+        return {
+            name: store_bytes * count // total if total else 0
+            for name, count in counts.items()
+        }
+
+    def _index_directories(self) -> Dict[str, int]:
+        if not self.index_directory.is_dir():
+            return {}
+        return {p.name: _path_size(p) for p in self.index_directory.iterdir() if p.is_dir()}
+
+    def inventory(self) -> dict:
+        """
+        List every document with its size and last access, and whatever belongs to none.
+
+        Returns:
+            dict: "documents" (most recently used first), "orphans" (collections and index directories without an upload) and "total_bytes".
+        """
+        chroma = self._chroma_collections()
+        directories = self._index_directories()
+        entries = self._load()
+        documents = []
+        owned = set()
+        for file_path in self._uploads():
+            names = collection_names(file_path)
+            owned.update(names)
+            index_bytes = sum(chroma.get(n, 0) + directories.get(n, 0) for n in names)
+            entry = entries.get(file_path, {})
+            documents.append(
+                {
+                    "document": os.path.basename(file_path),
+                    "file_path": file_path,
+                    "upload_bytes": os.path.getsize(file_path),
+                    "index_bytes": index_bytes,
+                    "indexed": any(n in chroma or n in directories for n in names),
+                    "last_access": entry.get("last_access", os.path.getmtime(file_path)),
+                    "source_sha256": entry.get("source_sha256"),
+                    "tracked": bool(entry),
+                }
+            )
+        documents.sort(key=lambda d: d["last_access"], reverse=True)
+        orphans = [
+            {"kind": "chroma_collection", "name": n, "bytes": size}
+            for n, size in chroma.items()
+            if n not in owned
+        ] + [
+            {"kind": "index_directory", "name": n, "bytes": size}
+            for n, size in directories.items()
+            if n not in owned
+        ]
+        total = sum(d["upload_bytes"] + d["index_bytes"] for d in documents)
+        total += sum(o["bytes"] for o in orphans)
+        return {"documents": documents, "orphans": orphans, "total_bytes": total}
+
+    def _delete_collections(self, names: Iterable[str]) -> None:
+        names = set(names)
+        client = self._chroma_client() if names else None
+        if client is None:
+            return
+        existing = {c.name for c in client.list_collections()}
+        for name in names & existing:
+            client.delete_collection(name)
+
+    def _delete_index_directories(self, names: Iterable[str]) -> None:
+        for name in names:
+            path = self.index_directory / name
+            if path.is_dir():
+                shutil.rmtree(path)
+
+    def evict(self, file_path: str) -> None:
+        """Delete a document's upload, collections and index directories, and forget it."""
+        names = collection_names(file_path)
+        self._delete_collections(names)
+        self._delete_index_directories(names)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        with self._transaction() as entries:
+            entries.pop(file_path, None)
+
+    def collect_garbage(self, protected: Iterable[str] = ()) -> dict:
+        """
+        Evict idle and least recently used documents and sweep orphans.
+
+        Args:
+            protected (Iterable[str], optional): File paths never evicted, e.g., documents open in a session. Defaults to ().
+
+        Returns:
+            dict: What was removed and the bytes in use before and after, or {"skipped": True} if another process is collecting.
+        """
+        try:
+            self._gc_lock.acquire(timeout=0)
+        except Timeout:
+            return {"skipped": True}
+        try:
+            return self._collect_garbage(set(protected))
+        finally:
+            self._gc_lock.release()
+
+    def _collect_garbage(self, protected: set) -> dict:
+        now = time.time()
+        with self._transaction() as entries:
+            uploads = set(self._uploads())
+            # Documents uploaded before the registry existed count as accessed at upload time.
+            for file_path in uploads - entries.keys():
+                self._register(entries, file_path, os.path.getmtime(file_path))
+            for file_path in set(entries) - uploads:
+                del entries[file_path]
+
+        inventory = self.inventory()
+        report = {
+            "bytes_before": inventory["total_bytes"],
+            "evicted": [],
+            "orphans_removed": [],
+            "uploads_removed": [],
+        }
+
+        # Collections and index directories no upload maps to.
+        orphans = inventory["orphans"]
+        self._delete_collections(o["name"] for o in orphans if o["kind"] == "chroma_collection")
+        self._delete_index_directories(o["name"] for o in orphans if o["kind"] == "index_directory")
+        report["orphans_removed"] = [o["name"] for o in orphans]
+        total = inventory["total_bytes"] - sum(o["bytes"] for o in orphans)
+
+        def evictable(document: dict) -> bool:
+            file_path = document["file_path"]
+            return file_path not in protected and not self.is_busy(file_path)
+
+        # Uploads that were never indexed, e.g., left by a failed upload.
+        for document in inventory["documents"]:
+            if (
+                not document["indexed"]
+                and now - os.path.getmtime(document["file_path"]) > self.orphan_grace_seconds
+                and evictable(document)
+            ):
+                self.evict(document["file_path"])
+                report["uploads_removed"].append(document["document"])
+                total -= document["upload_bytes"]
+
+        # Least recently used first.
+        candidates = [
+            d for d in reversed(inventory["documents"])
+            if d["indexed"] and evictable(d)
+        ]
+        for document in candidates:
+            idle = now - document["last_access"]
+            over_age = self.max_idle_seconds is not None and idle > self.max_idle_seconds
+            over_quota = self.quota_bytes is not None and total > self.quota_bytes
+            if not (over_age or over_quota):
+                continue
+            self.evict(document["file_path"])
+            report["evicted"].append(document["document"])
+            total -= document["upload_bytes"] + document["index_bytes"]
+
+        report["bytes_after"] = self.inventory()["total_bytes"]
+        return report
+
+    def start(self, interval: float, protected: Callable[[], Iterable[str]] = tuple) -> None:
+        """
+        Collect garbage every `interval` seconds in a background thread.
+
+        Args:
+            interval (float): Seconds between collections.
+            protected (Callable[[], Iterable[str]], optional): Returns the file paths to keep at each collection. Defaults to none.
+        """
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.collect_garbage(protected())
+                except Exception:
+                    logger.warning("Index garbage collection failed", exc_info=True)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
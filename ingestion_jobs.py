@@ -0,0 +1,211 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from filelock import FileLock
+from langchain_core.documents import Document
+from retriever_with_reranker import RetrieveWithReranker
+
+JOBS_FILE = "ingestion_jobs.json"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IngestionJobQueue:
+    """Background PDF ingestion with persistent, resumable job state.
+
+    Pages are indexed in page order, `pages_per_commit` at a time. After each batch the
+    job records how many pages are committed, so questions can be answered from the
+    partial index and a restarted process resumes where the previous one stopped.
+
+    The job file is shared by every process using it, e.g., the workers of the HTTP
+    API: changes are made under a file lock, and a process claims a job before
+    running it, so each job runs in one process at a time. A job whose process died
+    is claimed again by the next process that polls.
+    """
+
+    def __init__(
+        self,
+        retriever_factory: Callable[[str], RetrieveWithReranker],
+        jobs_file: str = JOBS_FILE,
+        pages_per_commit: int = 8,
+        poll_interval: float = 5.0,
+        stale_after: float = 600.0,
+    ):
+        """
+        Initialize an IngestionJobQueue and resume unfinished jobs.
+
+        Args:
+            retriever_factory (Callable[[str], RetrieveWithReranker]): Opens a retriever for a file without ingesting it.
+            jobs_file (str, optional): The JSON file holding the job state. Defaults to "ingestion_jobs.json".
+            pages_per_commit (int, optional): The number of pages indexed per increment. Defaults to 8.
+            poll_interval (float, optional): Seconds between checks for jobs left by other processes. Defaults to 5.0.
+            stale_after (float, optional): Seconds without progress after which a running job on another host is presumed dead. Defaults to 600.0.
+        """
+        self.retriever_factory = retriever_factory
+        self.jobs_file = jobs_file
+        self.pages_per_commit = pages_per_commit
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = FileLock(f"{jobs_file}.lock")
+        self._queue = queue.Queue()
+        # Resume jobs left unfinished when the last process stopped.
+        self._queue.put(None)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _load(self) -> Dict[str, dict]:
+        if os.path.exists(self.jobs_file):
+            with open(self.jobs_file, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+                if content:
+                    return json.loads(content)
+        return {}
+
+    def _save(self, jobs: Dict[str, dict]) -> None:
+        tmp = f"{self.jobs_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(jobs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.jobs_file)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Dict[str, dict]]:
+        """Yield the current jobs for changing and save them, all under the file lock."""
+        with self._lock:
+            jobs = self._load()
+            yield jobs
+            self._save(jobs)
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._transaction() as jobs:
+            jobs[job_id].update(fields, updated_at=time.time())
+
+    def submit(self, file_path: str, finalize_only: bool = False) -> str:
+        """
+        Queue a file for ingestion, unless it is already queued or being ingested.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            finalize_only (bool, optional): Only build the whole-document indexes of a file whose pages are all indexed, e.g., one indexed before the keyphrase index existed. Defaults to False.
+
+        Returns:
+            str: The job ID, of the existing job if there is one.
+        """
+        now = time.time()
+        with self._transaction() as jobs:
+            for job in jobs.values():
+                if job["file_path"] == file_path and job["status"] in (QUEUED, RUNNING):
+                    return job["id"]
+            job_id = uuid.uuid4().hex
+            jobs[job_id] = {
+                "id": job_id,
+                "file_path": file_path,
+                "status": QUEUED,
+                "owner": None,
+                "pages_done": 0,
+                "pages_total": None,
+                "chunks": 0,
+                "error": None,
+                "finalize_only": finalize_only,
+                "created_at": now,
+                "updated_at": now,
+            }
+        self._queue.put(job_id)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Return a copy of the job's state, or None if the job is unknown."""
+        # The file is replaced atomically, so reads need no lock.
+        return self._load().get(job_id)
+
+    def latest_job(self, file_path: str) -> Optional[dict]:
+        """Return a copy of the most recent job for a file, or None."""
+        jobs = [j for j in self._load().values() if j["file_path"] == file_path]
+        return max(jobs, key=lambda j: j["created_at"]) if jobs else None
+
+    def _claimable(self, job: dict) -> bool:
+        """Whether this process may run the job: queued, or running in a process that died."""
+        if job["status"] == QUEUED:
+            return True
+        if job["status"] != RUNNING or job.get("owner") == self.owner:
+            return False
+        if not job.get("owner"):
+            return True
+        host, _, pid = job["owner"].rpartition(":")
+        if host == socket.gethostname() and pid.isdigit():
+            return not _process_alive(int(pid))
+        return time.time() - job["updated_at"] > self.stale_after
+
+    def _claim(self, job_id: Optional[str] = None) -> Optional[dict]:
+        """Mark a claimable job, the given one or the oldest, as running in this process."""
+        with self._transaction() as jobs:
+            candidates = [jobs[job_id]] if job_id in jobs else []
+            if job_id is None:
+                candidates = sorted(jobs.values(), key=lambda j: j["created_at"])
+            for job in candidates:
+                if self._claimable(job):
+                    job.update(status=RUNNING, owner=self.owner, updated_at=time.time())
+                    return dict(job)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                # Pick up jobs submitted elsewhere or left behind by a stopped process.
+                job_id = None
+            job = self._claim(job_id)
+            while job is not None:
+                self._process(job)
+                job = self._claim()
+
+    def _process(self, job: dict) -> None:
+        job_id = job["id"]
+        try:
+            retriever = self.retriever_factory(job["file_path"])
+            pages_total = retriever.loader.page_count()
+            pages_done = job["pages_done"]
+            chunks = job["chunks"]
+            if job.get("finalize_only"):
+                pages_done = pages_total
+                chunks = len(retriever.search_index.chunks)
+            self._update(
+                job_id, pages_total=pages_total, pages_done=pages_done, chunks=chunks
+            )
+            batch: List[Document] = []
+            for page in retriever.loader.lazy_load_pages(pages_done):
+                batch.append(page)
+                if len(batch) == self.pages_per_commit:
+                    chunks += retriever.ingest_pages(batch)
+                    pages_done += len(batch)
+                    batch = []
+                    self._update(job_id, pages_done=pages_done, chunks=chunks)
+            if batch:
+                chunks += retriever.ingest_pages(batch)
+                pages_done += len(batch)
+                self._update(job_id, pages_done=pages_done, chunks=chunks)
+            retriever.finalize_ingest()
+            self._update(job_id, status=DONE)
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=str(e))
@@ -0,0 +1,29 @@
+from typing import List
+
+import numpy as np
+from keybert.backend import BaseEmbedder
+from langchain_core.embeddings import Embeddings
+
+
+class FastEmbedBackend(BaseEmbedder):
+    """KeyBERT embedding backend running on an already-loaded embedding model.
+
+    Passing this to `KeyBERT(model=...)` stops KeyBERT from loading its default
+    sentence-transformers model, so the FastEmbed ONNX model used for ingestion also
+    serves keyword extraction.
+    """
+
+    def __init__(self, embedding: Embeddings):
+        """
+        Initialize a FastEmbedBackend.
+
+        Args:
+            embedding (Embeddings): The embedding model to use, e.g., FastEmbedEmbeddings.
+        """
+        super().__init__(embedding_model=embedding)
+        self.embedding = embedding
+
+    def embed(self, documents: List[str], verbose: bool = False) -> np.ndarray:
+        return np.asarray(
+            self.embedding.embed_documents(list(documents)), dtype=np.float32
+        )
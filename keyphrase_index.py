@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from numpy_vector_store import mmr_select
+
+KEYPHRASES_FILE = "keyphrases.json"
+KEYPHRASE_EMBEDDINGS_FILE = "keyphrases.npy"
+
+STOP_WORDS = frozenset(
+    """a about above after again against all also am an and any are as at be because
+    been before being below between both but by can could did do does doing down during
+    each either etc few for from further had has have having he her here hers him his how
+    i if in into is it its itself just may me might more most must my no nor not of off on
+    once only or other our ours out over own per same shall she should so some such than
+    that the their theirs them then there these they this those through thus to too under
+    until up upon us very via was we were what when where which while who whom why will
+    with within without would yet you your yours""".split()
+)
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9\-']*[a-z0-9]|[a-z]")
+
+
+def _tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _ngrams(tokens: List[str], ngram_range: Tuple[int, int]) -> List[str]:
+    """Return n-grams that neither start nor end with a stop word."""
+    ngrams = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(tokens) - n + 1):
+            gram = tokens[i : i + n]
+            if gram[0] in STOP_WORDS or gram[-1] in STOP_WORDS:
+                continue
+            if any(t.isdigit() for t in gram):
+                continue
+            ngrams.append(" ".join(gram))
+    return ngrams
+
+
+class KeyphraseIndex:
+    """Keyphrase vocabulary of a document with precomputed phrase embeddings.
+
+    The vocabulary is built once from the document's chunks, so picking keywords
+    for a question is a dictionary lookup plus one matrix-vector product instead of
+    a KeyBERT extraction and a cross-encoder pass.
+    """
+
+    def __init__(
+        self,
+        phrases: List[str],
+        vectors: np.ndarray,
+        embedding: Embeddings,
+        ngram_range: Tuple[int, int] = (2, 3),
+    ):
+        """
+        Initialize a KeyphraseIndex.
+
+        Args:
+            phrases (List[str]): The vocabulary phrases.
+            vectors (np.ndarray): The normalized phrase embeddings, one row per phrase.
+            embedding (Embeddings): The embedding model used for questions.
+            ngram_range (Tuple[int, int], optional): The phrase lengths in words. Defaults to (2, 3).
+        """
+        self.phrases = phrases
+        self.vectors = vectors
+        self.embedding = embedding
+        self.ngram_range = tuple(ngram_range)
+        self.lookup = {p: i for i, p in enumerate(phrases)}
+        self._last_query: Optional[Tuple[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        ngram_range: Tuple[int, int] = (2, 3),
+        max_phrases: int = 5000,
+        min_df: int = 2,
+    ) -> "KeyphraseIndex":
+        """
+        Build the vocabulary from a document's chunks.
+
+        Phrases are ranked by TF-IDF over the chunks; phrases occurring in fewer than
+        `min_df` chunks are dropped unless the document is too small to have any.
+
+        Args:
+            texts (List[str]): The chunk texts.
+            embedding (Embeddings): The embedding model to use.
+            ngram_range (Tuple[int, int], optional): The phrase lengths in words. Defaults to (2, 3).
+            max_phrases (int, optional): The vocabulary size. Defaults to 5000.
+            min_df (int, optional): The minimum number of chunks a phrase must occur in. Defaults to 2.
+
+        Returns:
+            KeyphraseIndex: The built index.
+        """
+        term_freqs = Counter()
+        doc_freqs = Counter()
+        for text in texts:
+            grams = _ngrams(_tokenize(text), ngram_range)
+            term_freqs.update(grams)
+            doc_freqs.update(set(grams))
+        n_docs = max(len(texts), 1)
+        eligible = [p for p, df in doc_freqs.items() if df >= min_df] or list(doc_freqs)
+        scored = sorted(
+            eligible,
+            key=lambda p: term_freqs[p] * math.log(1 + n_docs / doc_freqs[p]),
+            reverse=True,
+        )
+        phrases = scored[:max_phrases]
+        vectors = np.zeros((0, 0), dtype=np.float32)
+        if phrases:
+            vectors = np.asarray(embedding.embed_documents(phrases), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(phrases, vectors, embedding, ngram_range)
+
+    @classmethod
+    def load(cls, directory: str, embedding: Embeddings) -> Optional["KeyphraseIndex"]:
+        """Load a persisted index, or return None if there is none."""
+        directory = Path(directory)
+        if not (directory / KEYPHRASE_EMBEDDINGS_FILE).exists():
+            return None
+        with open(directory / KEYPHRASES_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        vectors = np.load(directory / KEYPHRASE_EMBEDDINGS_FILE)
+        return cls(data["phrases"], vectors, embedding, data["ngram_range"])
+
+    def save(self, directory: str) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / KEYPHRASES_FILE, "w", encoding="utf-8") as f:
+            json.dump(
+                {"phrases": self.phrases, "ngram_range": list(self.ngram_range)},
+                f,
+                ensure_ascii=False,
+            )
+        tmp = directory / f"{KEYPHRASE_EMBEDDINGS_FILE}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.vectors)
+        os.replace(tmp, directory / KEYPHRASE_EMBEDDINGS_FILE)
+
+    def _embed(self, text: str) -> np.ndarray:
+        # Keyword extraction and keyword ranking usually embed the same question back to back.
+        with self._lock:
+            if self._last_query and self._last_query[0] == text:
+                return self._last_query[1]
+        vector = np.asarray(self.embedding.embed_query(text), dtype=np.float32)
+        vector /= max(np.linalg.norm(vector), 1e-12)
+        with self._lock:
+            self._last_query = (text, vector)
+        return vector
+
+    def extract(self, question: str, top_n: int = 5, diversity: float = 0.7) -> List[str]:
+        """
+        Pick keyphrases from the vocabulary for a question.
+
+        Phrases that occur literally in the question come first; the rest are chosen
+        by maximal marginal relevance against the question embedding.
+
+        Args:
+            question (str): The question.
+            top_n (int, optional): The number of keyphrases to return. Defaults to 5.
+            diversity (float, optional): 0 for pure relevance, 1 for pure diversity. Defaults to 0.7.
+
+        Returns:
+            List[str]: The keyphrases.
+        """
+        if not self.phrases:
+            return []
+        lexical = list(
+            dict.fromkeys(
+                self.lookup[g]
+                for g in _ngrams(_tokenize(question), self.ngram_range)
+                if g in self.lookup
+            )
+        )[:top_n]
+        remaining = top_n - len(lexical)
+        if remaining <= 0:
+            return [self.phrases[i] for i in lexical]
+
+        query_vector = self._embed(question)
+        scores = self.vectors @ query_vector
+        scores[lexical] = -np.inf
+        n_candidates = min(len(scores) - len(lexical), max(4 * top_n, 20))
+        if n_candidates <= 0:
+            return [self.phrases[i] for i in lexical]
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        selected = mmr_select(
+            query_vector, self.vectors[candidates], k=remaining, lambda_mult=1 - diversity
+        )
+        return [self.phrases[i] for i in lexical + [int(candidates[j]) for j in selected]]
+
+    def rank(self, query: str, keywords: List[str], top_n: int = 2) -> Optional[List[str]]:
+        """
+        Order keywords by similarity to the query.
+
+        Returns None if a keyword is not in the vocabulary, so callers can fall back
+        to another ranking.
+        """
+        indices = [self.lookup.get(k) for k in keywords]
+        if any(i is None for i in indices):
+            return None
+        scores = self.vectors[indices] @ self._embed(query)
+        order = np.argsort(-scores)[:top_n]
+        return [keywords[i] for i in order if scores[i] > 0]
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from filelock import FileLock
+from langchain_core.embeddings import Embeddings
+
+MEMO_FILE = "knowledge_memo.json"
+
+
+class KnowledgeMemo:
+    """Observations of sub-questions already answered on one document.
+
+    The decomposing and reasoning subgraphs answer sub-questions such as "What is a
+    database schema?" with a retrieve, grade and answer cycle, and later questions
+    on the same document often decompose into the same sub-questions. The memo
+    keeps each graded observation with the embedding of its sub-question, and a
+    sub-question whose embedding is close enough to a remembered one reuses its
+    observation instead of running the cycle again.
+
+    Entries are stamped with the index version they were answered from and are
+    dropped when it changes, e.g., when the document is re-ingested. The memo is a
+    JSON file in the document's index directory, written under a file lock so the
+    workers of the HTTP API share it.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        embedding: Embeddings,
+        version: Callable[[], list],
+        threshold: float = 0.95,
+        max_entries: int = 500,
+    ):
+        """
+        Initialize a KnowledgeMemo.
+
+        Args:
+            directory (str): The document's index directory.
+            embedding (Embeddings): The embedding model used to compare sub-questions.
+            version (Callable[[], list]): Returns a stamp of the indexed content, see `RetrieveWithReranker.index_version`.
+            threshold (float, optional): The cosine similarity at which a sub-question matches a remembered one. Defaults to 0.95.
+            max_entries (int, optional): The number of observations kept; the oldest are dropped first. Defaults to 500.
+        """
+        self.path = Path(directory) / MEMO_FILE
+        self.embedding = embedding
+        self.version = version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = FileLock(f"{self.path}.lock")
+        # (file mtime, index version, entries, normalized question vectors) of the last load.
+        self._cache = (None, None, [], np.zeros((0, 0), dtype=np.float32))
+        self._cache_lock = threading.Lock()
+
+    def _current_version(self) -> list:
+        # Round-trip through JSON so tuples compare equal to the stored lists.
+        return json.loads(json.dumps(self.version()))
+
+    def _read(self) -> dict:
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+                if content:
+                    return json.loads(content)
+        return {"version": None, "entries": []}
+
+    def _entries(self):
+        """Return the entries valid for the current index and their vectors, reloading the file if it changed."""
+        mtime = self.path.stat().st_mtime_ns if self.path.exists() else None
+        with self._cache_lock:
+            if mtime != self._cache[0]:
+                data = self._read()
+                entries = data["entries"]
+                vectors = np.asarray([e["vector"] for e in entries], dtype=np.float32)
+                self._cache = (mtime, data["version"], entries, vectors.reshape(len(entries), -1))
+            _, version, entries, vectors = self._cache
+        # Entries answered from an earlier index, e.g., before a re-ingest, are stale.
+        if not entries or version != self._current_version():
+            return [], None
+        return entries, vectors
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(question), dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        Return the observation of the most similar remembered sub-question, or None if none is close enough.
+
+        Args:
+            question (str): The sub-question.
+
+        Returns:
+            Optional[str]: The remembered observation.
+        """
+        entries, vectors = self._entries()
+        if not entries:
+            return None
+        similarities = vectors @ self._embed(question)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return entries[best]["observation"]
+
+    def add(self, question: str, observation: str) -> None:
+        """Remember the observation of a sub-question answered from the current index."""
+        vector = self._embed(question)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            version = self._current_version()
+            data = self._read()
+            entries = data["entries"] if data["version"] == version else []
+            entries = [e for e in entries if e["thought"] != question]
+            entries.append(
+                {
+                    "thought": question,
+                    "observation": observation,
+                    "vector": [round(float(x), 6) for x in vector],
+                }
+            )
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": version, "entries": entries[-self.max_entries :]},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp, self.path)
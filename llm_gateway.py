@@ -0,0 +1,252 @@
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple, Type
+
+import httpx
+import openai
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate to the LLM provider."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize a TokenBucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens, i.e. the allowed burst size.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class GatewayMetrics:
+    """Counters describing how requests moved through the gateway."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    def record_start(self, queue_delay: float) -> None:
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.queue_delay_total += queue_delay
+            self.queue_delay_max = max(self.queue_delay_max, queue_delay)
+
+    def record_end(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+    def record_retry(self) -> None:
+        with self.lock:
+            self.retries += 1
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+
+    def snapshot(self) -> dict:
+        """Return a copy of the current counters."""
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "in_flight": self.in_flight,
+                "queue_delay_avg": (
+                    self.queue_delay_total / self.requests if self.requests else 0.0
+                ),
+                "queue_delay_max": self.queue_delay_max,
+            }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the provider's Retry-After hint, in seconds, from an API error."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        llm_config: dict,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        max_connections: int = 10,
+        timeout: float = 120.0,
+    ):
+        """
+        Initialize an LLMGateway.
+
+        Args:
+            llm_config (dict): Configuration for the ChatOpenAI, e.g., model, base_url, api_key.
+            max_concurrency (int, optional): Maximum number of requests in flight. Defaults to 4.
+            requests_per_minute (float, optional): Token-bucket rate limit. Defaults to None (unlimited).
+            burst (int, optional): Token-bucket capacity. Defaults to max_concurrency.
+            max_retries (int, optional): Retries on rate limits, timeouts and server errors. Defaults to 5.
+            backoff_base (float, optional): Base delay in seconds for exponential backoff. Defaults to 1.0.
+            backoff_max (float, optional): Upper bound in seconds for a single backoff. Defaults to 30.0.
+            max_connections (int, optional): Size of the pooled HTTP connection pool. Defaults to 10.
+            timeout (float, optional): HTTP timeout in seconds. Defaults to 120.0.
+        """
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+        # Retries are handled here so they count against the concurrency limit.
+        self.llm = ChatOpenAI(**llm_config, http_client=self.http_client, max_retries=0)
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = (
+            TokenBucket(requests_per_minute / 60, burst or max_concurrency)
+            if requests_per_minute
+            else None
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = GatewayMetrics()
+        self._chains = {}
+        self._chains_lock = threading.Lock()
+
+    def _get_chain(
+        self, messages: List[Tuple[str, str]], schema: Optional[Type[BaseModel]]
+    ):
+        key = (tuple(messages), schema)
+        with self._chains_lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                prompt = ChatPromptTemplate.from_messages(messages)
+                llm = (
+                    self.llm.with_structured_output(schema, method="json_mode")
+                    if schema
+                    else self.llm
+                )
+                chain = prompt | llm
+                self._chains[key] = chain
+            return chain
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        # Full jitter keeps concurrent retries from hitting the provider in lockstep.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def invoke(
+        self,
+        messages: List[Tuple[str, str]],
+        variables: dict,
+        schema: Optional[Type[BaseModel]] = None,
+    ):
+        """
+        Format a prompt and send it to the LLM under the gateway's limits.
+
+        Args:
+            messages (List[Tuple[str, str]]): (role, template) pairs for ChatPromptTemplate.
+            variables (dict): Values for the template variables.
+            schema (Type[BaseModel], optional): Parse the response into this model using JSON mode. Defaults to None.
+
+        Returns:
+            The AIMessage, or an instance of `schema` if given.
+        """
+        chain = self._get_chain(messages, schema)
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            with self.semaphore:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire()
+                self.metrics.record_start(time.monotonic() - queued_at)
+                try:
+                    return chain.invoke(variables)
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        self.metrics.record_failure()
+                        raise
+                    delay = self._backoff_delay(attempt, e)
+                finally:
+                    self.metrics.record_end()
+            # Sleep without holding a concurrency slot.
+            self.metrics.record_retry()
+            time.sleep(delay)
+            attempt += 1
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_llm_gateway(llm_config: dict, gateway_config: Optional[dict] = None) -> LLMGateway:
+    """Return the process-wide LLMGateway for the given configuration."""
+    gateway_config = gateway_config or {}
+    # A canonical serialization, since config values such as `stop` or `model_kwargs` are unhashable.
+    key = json.dumps([llm_config, gateway_config], sort_keys=True, default=repr)
+    with _gateways_lock:
+        if key not in _gateways:
+            _gateways[key] = LLMGateway(llm_config, **gateway_config)
+        return _gateways[key]
@@ -0,0 +1,180 @@
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+# Mersenne prime used by the universal hash family of the MinHash permutations.
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _normalize_line(line: str) -> str:
+    """Collapse whitespace and page numbers, so "Page 3 of 40" matches "Page 4 of 40"."""
+    return re.sub(r"\d+", "#", re.sub(r"\s+", " ", line).strip().lower())
+
+
+def _edge_lines(lines: List[str], edge_lines: int) -> List[str]:
+    """Return the first and last `edge_lines` non-empty lines of a page."""
+    non_empty = [line for line in lines if line.strip()]
+    return non_empty[:edge_lines] + non_empty[-edge_lines:]
+
+
+def find_boilerplate(
+    page_texts: Iterable[str],
+    edge_lines: int = 2,
+    min_fraction: float = 0.2,
+    min_pages: int = 3,
+) -> Set[str]:
+    """
+    Find the page headers and footers repeated across a document.
+
+    Args:
+        page_texts (Iterable[str]): The text of every page.
+        edge_lines (int, optional): The number of lines at the top and bottom of a page that may be a header or footer. Defaults to 2.
+        min_fraction (float, optional): The share of pages a line must repeat on. Defaults to 0.2.
+        min_pages (int, optional): The number of pages a line must repeat on. Defaults to 3.
+
+    Returns:
+        Set[str]: The normalized header and footer lines.
+    """
+    counts = Counter()
+    pages = 0
+    for text in page_texts:
+        pages += 1
+        counts.update(set(_normalize_line(line) for line in _edge_lines(text.splitlines(), edge_lines)))
+    threshold = max(min_pages, min_fraction * pages)
+    return {line for line, count in counts.items() if line and count >= threshold}
+
+
+def strip_boilerplate(text: str, boilerplate: Set[str], edge_lines: int = 2) -> str:
+    """Remove header and footer lines from the top and bottom of a page, keeping its body intact."""
+    lines = text.splitlines()
+    start, end = 0, len(lines)
+    for _ in range(edge_lines):
+        while start < end and not lines[start].strip():
+            start += 1
+        if start < end and _normalize_line(lines[start]) in boilerplate:
+            start += 1
+    for _ in range(edge_lines):
+        while end > start and not lines[end - 1].strip():
+            end -= 1
+        if end > start and _normalize_line(lines[end - 1]) in boilerplate:
+            end -= 1
+    if start == 0 and end == len(lines):
+        return text
+    return "\n".join(lines[start:end])
+
+
+class MinHasher:
+    """MinHash signatures over word shingles."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        """
+        Initialize a MinHasher.
+
+        Args:
+            num_perm (int, optional): The signature length. Defaults to 64.
+            shingle_size (int, optional): The number of words per shingle. Defaults to 3.
+            seed (int, optional): Seeds the hash permutations; signatures compare only under the same seed. Defaults to 1.
+        """
+        rng = np.random.default_rng(seed)
+        # Below 2**32, so a * hash + b cannot overflow uint64 for 32-bit hashes.
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def shingles(self, text: str) -> Set[str]:
+        words = re.findall(r"\w+", text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {
+            " ".join(words[i : i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in self.shingles(text)), dtype=np.uint64
+        )
+        permuted = (np.outer(hashes, self.a) + self.b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """Locality-sensitive hashing over MinHash signatures to find near-duplicate chunks.
+
+    Signatures are cut into bands, and chunks sharing any band are candidates;
+    a candidate is a near duplicate if the share of equal signature values, an
+    estimate of the shingle Jaccard similarity, reaches `threshold`.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16):
+        """
+        Initialize a NearDuplicateIndex.
+
+        Args:
+            threshold (float, optional): The estimated Jaccard similarity at which two chunks are near duplicates. Defaults to 0.8.
+            num_perm (int, optional): The MinHash signature length. Defaults to 64.
+            bands (int, optional): The number of LSH bands; `num_perm` must be a multiple. Defaults to 16.
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """Return the ID of the most similar indexed chunk at or above the threshold, or None."""
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for buckets, key in zip(self.buckets, self._band_keys(signature)):
+            for chunk_id in buckets.get(key, ()):
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                similarity = float(np.mean(self.signatures[chunk_id] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = chunk_id, similarity
+        return best
+
+    def add(self, chunk_id: str, signature: np.ndarray) -> None:
+        if chunk_id in self.signatures:
+            return
+        self.signatures[chunk_id] = signature
+        for buckets, key in zip(self.buckets, self._band_keys(signature)):
+            buckets.setdefault(key, []).append(chunk_id)
+
+    def canonical(self, chunk_id: str, text: str) -> str:
+        """
+        Return the chunk that `text` duplicates, indexing it as its own canonical chunk if there is none.
+
+        A chunk already indexed under `chunk_id`, e.g., a page ingested again, is its own canonical chunk.
+        """
+        if chunk_id in self.signatures:
+            return chunk_id
+        signature = self.hasher.signature(text)
+        match = self.find(signature)
+        if match is not None:
+            return match
+        self.add(chunk_id, signature)
+        return chunk_id
+
+    def extend(self, chunk_ids: Sequence[str], texts: Iterable[str]) -> None:
+        """Index chunks that are already stored, e.g., when resuming an ingestion."""
+        for chunk_id, text in zip(chunk_ids, texts):
+            self.add(chunk_id, self.hasher.signature(text))
@@ -0,0 +1,318 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from chunk_store import ChunkStore, _append_rows, _appendable
+
+EMBEDDINGS_FILE = "embeddings.npy"
+# Chunk texts and metadata as written before ChunkStore, read for older indexes.
+CHUNKS_FILE = "chunks.json"
+# Rows upcast at a time when scoring a float16 matrix.
+SCORE_BLOCK_SIZE = 8192
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(
+    query_vector: np.ndarray,
+    candidates: np.ndarray,
+    *,
+    k: int = 4,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Select `k` diverse, relevant candidates by maximal marginal relevance.
+
+    `k` and `lambda_mult` are keyword-only: LangChain's `maximal_marginal_relevance`
+    takes them positionally in the opposite order.
+
+    The candidate-to-candidate similarity matrix is computed once, and the greedy
+    loop only updates a running maximum similarity to the selected set, so each
+    step is a few vector operations over the candidates.
+
+    Args:
+        query_vector (np.ndarray): The normalized query embedding.
+        candidates (np.ndarray): The normalized candidate embeddings, one per row.
+        k (int, optional): The number of candidates to select. Defaults to 4.
+        lambda_mult (float, optional): 1 for pure relevance, 0 for pure diversity. Defaults to 0.5.
+
+    Returns:
+        List[int]: Row indices of the selected candidates, in selection order.
+    """
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    query_similarity = candidates @ query_vector
+    relevance = lambda_mult * query_similarity
+    similarity = (1 - lambda_mult) * (candidates @ candidates.T)
+    # The most similar candidate comes first whatever `lambda_mult`, as in LangChain.
+    selected = [int(np.argmax(query_similarity))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+    for _ in range(1, k):
+        scores = np.where(available, relevance - max_similarity, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact, in-process vector store for the chunks of a single document.
+
+    Normalized chunk embeddings are kept in a memory-mapped `.npy` matrix next to a
+    memory-mapped ChunkStore, so cosine similarity for every chunk is a single
+    matrix-vector product and several processes share the same pages. Row `n` of
+    the matrix is chunk `n` of the store.
+    """
+
+    def __init__(
+        self, directory: Optional[str], embedding: Embeddings, dtype: str = "float32"
+    ):
+        """
+        Initialize a NumpyVectorStore, loading any index already persisted in `directory`.
+
+        Args:
+            directory (str, optional): The directory holding the embedding matrix and the chunks. If None, the store lives in memory only.
+            embedding (Embeddings): The embedding model to use.
+            dtype (str, optional): Storage dtype of the matrix, "float32" or "float16". Defaults to "float32".
+        """
+        self.directory = Path(directory) if directory else None
+        self.embedding = embedding
+        self.dtype = np.dtype(dtype)
+        self.matrix = None
+        self.chunks = ChunkStore.build([], [], [])
+        if self.directory and (self.directory / EMBEDDINGS_FILE).exists():
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def ids(self) -> List[str]:
+        return self.chunks.ids
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def version(self):
+        """Return a stamp that changes whenever the persisted index is rewritten."""
+        if self.directory is None:
+            return len(self.chunks)
+        path = self.directory / EMBEDDINGS_FILE
+        return path.stat().st_mtime_ns if path.exists() else None
+
+    def reload(self) -> None:
+        """Reload the index after another process or store instance rewrote it."""
+        if self.directory and (self.directory / EMBEDDINGS_FILE).exists():
+            self._load()
+
+    def _load(self) -> None:
+        self.matrix = np.load(self.directory / EMBEDDINGS_FILE, mmap_mode="r")
+        chunks = ChunkStore.load(self.directory)
+        if chunks is None:
+            with open(self.directory / CHUNKS_FILE, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            chunks = ChunkStore.build(
+                [c["page_content"] for c in legacy],
+                [c["metadata"] for c in legacy],
+                [c["id"] for c in legacy],
+            )
+        self.chunks = chunks
+
+    def _save(self, matrix: np.ndarray, chunks: ChunkStore):
+        if self.directory is None:
+            self.matrix, self.chunks = matrix, chunks
+            return
+        # The matrix is replaced last and is the version stamp, so a reader that sees
+        # it also sees the chunks; rows only ever grow or keep their position.
+        chunks.save(self.directory)
+        tmp_embeddings = self.directory / f"{EMBEDDINGS_FILE}.tmp"
+        with open(tmp_embeddings, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_embeddings, self.directory / EMBEDDINGS_FILE)
+        self._load()
+
+    def get(self) -> dict:
+        """Return the stored chunks in the same shape as `Chroma.get()`."""
+        return {
+            "ids": list(self.ids),
+            "documents": list(self.chunks.texts()),
+            "metadatas": [self.chunks.metadata(n) for n in range(len(self.chunks))],
+        }
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        return self.add_embeddings(
+            self.embedding.embed_documents(texts), texts, metadatas, ids
+        )
+
+    def add_embeddings(
+        self,
+        vectors: np.ndarray,
+        texts: List[str],
+        metadatas: List[dict],
+        ids: List[str],
+    ) -> List[str]:
+        """
+        Add chunks whose embeddings were already computed, e.g., by another store.
+
+        Chunks whose IDs are already stored are replaced in place, new ones are
+        appended, so existing integer chunk IDs keep pointing at the same chunk.
+        When all chunks are new, only their rows are written to a persisted index.
+        """
+        ids = list(ids)
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32)).astype(self.dtype)
+        if self.matrix is None or len(self.matrix) == 0:
+            self._save(vectors, ChunkStore.build(list(texts), list(metadatas), ids))
+            return ids
+        if self._append(vectors, list(texts), list(metadatas), ids):
+            return ids
+        chunks = self.chunks.upsert(list(texts), list(metadatas), ids)
+        # Zeros for chunks stored without an embedding, e.g., by an interrupted write.
+        matrix = np.zeros((len(chunks), self.matrix.shape[1]), dtype=self.dtype)
+        matrix[: len(self.matrix)] = self.matrix
+        for vector, chunk_id in zip(vectors, ids):
+            matrix[chunks.positions[chunk_id]] = vector
+        self._save(matrix, chunks)
+        return ids
+
+    def _append(
+        self, vectors: np.ndarray, texts: List[str], metadatas: List[dict], ids: List[str]
+    ) -> bool:
+        """Append new chunks to the persisted index in place; False if it must be rewritten instead."""
+        if (
+            self.directory is None
+            or len(set(ids)) != len(ids)
+            or len(self.matrix) != len(self.chunks)
+            or not _appendable(self.directory / EMBEDDINGS_FILE, vectors, len(self.matrix))
+            or not self.chunks.append(self.directory, texts, metadatas, ids)
+        ):
+            return False
+        # The matrix grows last and is the version stamp, as in `_save`.
+        _append_rows(self.directory / EMBEDDINGS_FILE, vectors, len(self.matrix))
+        self._load()
+        return True
+
+    def delete_collection(self) -> None:
+        """Remove the persisted index."""
+        if self.directory is not None:
+            for name in (EMBEDDINGS_FILE, CHUNKS_FILE):
+                path = self.directory / name
+                if path.exists():
+                    path.unlink()
+            ChunkStore.delete(self.directory)
+        self.matrix = None
+        self.chunks = ChunkStore.build([], [], [])
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        return _normalize(np.asarray(self.embedding.embed_query(query), dtype=np.float32))
+
+    def _scores(self, query_vector: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return self.matrix @ query_vector
+        # numpy has no float16 BLAS path, so upcast in bounded blocks.
+        return np.concatenate(
+            [
+                self.matrix[i : i + SCORE_BLOCK_SIZE].astype(np.float32) @ query_vector
+                for i in range(0, len(self.matrix), SCORE_BLOCK_SIZE)
+            ]
+        )
+
+    def _top_k(self, query_vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.matrix is None or k <= 0:
+            return np.array([], dtype=int), np.array([], dtype=np.float32)
+        scores = self._scores(query_vector)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        indices, scores = self._top_k(self._embed_query(query), k)
+        return [(self.chunks.document(i), float(s)) for i, s in zip(indices, scores)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            self.chunks.document(n)
+            for n in self.max_marginal_relevance_ids(query, k, fetch_k, lambda_mult)
+        ]
+
+    def max_marginal_relevance_ids(
+        self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5
+    ) -> List[int]:
+        """Like `max_marginal_relevance_search`, but return integer chunk IDs."""
+        return [
+            n
+            for n, _ in self.max_marginal_relevance_by_vector(
+                self._embed_query(query), k, fetch_k, lambda_mult
+            )
+        ]
+
+    def max_marginal_relevance_by_vector(
+        self,
+        query_vector: np.ndarray,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[Tuple[int, float]]:
+        """Select chunks by maximal marginal relevance to a normalized query vector, returning integer chunk IDs with their cosine similarity."""
+        indices, _ = self._top_k(query_vector, fetch_k)
+        if len(indices) == 0:
+            return []
+        # Sorted row order keeps reads from the memory map sequential.
+        candidate_ids = np.sort(indices)
+        candidates = np.asarray(self.matrix[candidate_ids], dtype=np.float32)
+        selected = mmr_select(
+            query_vector, candidates, lambda_mult=lambda_mult, k=k
+        )
+        return [
+            (int(candidate_ids[i]), float(candidates[i] @ query_vector)) for i in selected
+        ]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        directory: str = "./vector_indexes/default",
+        dtype: str = "float32",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(directory=directory, embedding=embedding, dtype=dtype)
+        store.add_texts(texts, metadatas=metadatas)
+        return store
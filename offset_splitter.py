@@ -0,0 +1,146 @@
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+# The separators RecursiveCharacterTextSplitter uses by default, coarsest first.
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+
+Span = Tuple[int, int]
+
+
+class PageSpan(NamedTuple):
+    """A chunk as a character range of one page's text."""
+
+    page: int
+    start: int
+    end: int
+
+
+class OffsetTextSplitter:
+    """Split text into chunks represented as (start, end) offsets.
+
+    Produces exactly the chunks of `RecursiveCharacterTextSplitter` with the same
+    `chunk_size`, `chunk_overlap` and default separators, but every piece, merge
+    and whitespace strip is an offset pair into the original text: each separator
+    level scans its spans once with `str.find`, and no string is allocated until
+    `slice` is called for the final chunks.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 150,
+        separators: Sequence[str] = DEFAULT_SEPARATORS,
+    ):
+        """
+        Initialize an OffsetTextSplitter.
+
+        Args:
+            chunk_size (int, optional): The maximum chunk length in characters. Defaults to 2000.
+            chunk_overlap (int, optional): The maximum overlap between consecutive chunks in characters. Defaults to 150.
+            separators (Sequence[str], optional): Split points to try, coarsest first; "" splits between characters. Defaults to paragraphs, lines, words, characters.
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"chunk_overlap ({chunk_overlap}) must not exceed chunk_size ({chunk_size})"
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+
+    def split_spans(self, text: str, start: int = 0, end: Optional[int] = None) -> List[Span]:
+        """
+        Return the chunk offsets of `text[start:end]`, relative to `text`.
+
+        Args:
+            text (str): The text to split, e.g., a page.
+            start (int, optional): The start of the range to split. Defaults to 0.
+            end (int, optional): The end of the range to split. Defaults to the end of the text.
+
+        Returns:
+            List[Span]: The (start, end) offsets of the chunks, whitespace-stripped, in text order.
+        """
+        end = len(text) if end is None else end
+        return self._split(text, start, end, self.separators)
+
+    def split_pages(self, texts: Sequence[str]) -> List[PageSpan]:
+        """Split each text and return its chunks as (index of the text, start, end)."""
+        return [
+            PageSpan(page, start, end)
+            for page, text in enumerate(texts)
+            for start, end in self.split_spans(text)
+        ]
+
+    @staticmethod
+    def slice(texts: Sequence[str], spans: Sequence[PageSpan]) -> List[str]:
+        """Materialize the chunk texts of `spans`."""
+        return [texts[span.page][span.start : span.end] for span in spans]
+
+    def _split(self, text: str, lo: int, hi: int, separators: List[str]) -> List[Span]:
+        separator, finer = separators[-1], []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, lo, hi) != -1:
+                separator, finer = candidate, separators[i + 1 :]
+                break
+
+        chunks, good = [], []
+        for piece in self._pieces(text, lo, hi, separator):
+            if piece[1] - piece[0] < self.chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                chunks.extend(self._merge(text, good))
+                good = []
+            if finer:
+                chunks.extend(self._split(text, piece[0], piece[1], finer))
+            else:
+                chunks.append(piece)
+        if good:
+            chunks.extend(self._merge(text, good))
+        return chunks
+
+    @staticmethod
+    def _pieces(text: str, lo: int, hi: int, separator: str) -> List[Span]:
+        """Cut the range before each occurrence of `separator`, which starts the next piece."""
+        if not separator:
+            return [(i, i + 1) for i in range(lo, hi)]
+        pieces, start = [], lo
+        found = text.find(separator, lo, hi)
+        while found != -1:
+            if found > start:
+                pieces.append((start, found))
+            start = found
+            found = text.find(separator, found + len(separator), hi)
+        if hi > start:
+            pieces.append((start, hi))
+        return pieces
+
+    def _merge(self, text: str, pieces: List[Span]) -> List[Span]:
+        """Greedily join adjacent pieces up to chunk_size, carrying up to chunk_overlap into the next chunk."""
+        chunks = []
+        first, total = 0, 0
+        for i, (start, end) in enumerate(pieces):
+            length = end - start
+            if total + length > self.chunk_size and i > first:
+                chunk = self._strip(text, pieces[first][0], pieces[i - 1][1])
+                if chunk is not None:
+                    chunks.append(chunk)
+                while total > self.chunk_overlap or (
+                    total + length > self.chunk_size and total > 0
+                ):
+                    total -= pieces[first][1] - pieces[first][0]
+                    first += 1
+            total += length
+        chunk = self._strip(text, pieces[first][0], pieces[-1][1])
+        if chunk is not None:
+            chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Optional[Span]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if end > start else None
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
+from pydantic import PrivateAttr
+
+# Environment variables read by ONNX Runtime and the BLAS/OpenMP libraries it may load.
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_worker_model = None
+
+
+def _init_worker(model_kwargs: dict, threads: int) -> None:
+    # Set before fastembed, and so ONNX Runtime, is imported in the worker. numpy is
+    # already loaded by unpickling this function and keeps its own thread pool, but
+    # workers use it only to stack the embeddings.
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    from fastembed import TextEmbedding
+
+    global _worker_model
+    _worker_model = TextEmbedding(**model_kwargs, threads=threads)
+
+
+def _embed_batch(texts: List[str], passage: bool) -> np.ndarray:
+    embed = _worker_model.passage_embed if passage else _worker_model.embed
+    return np.stack(list(embed(texts, batch_size=len(texts))))
+
+
+class ParallelFastEmbedEmbeddings(FastEmbedEmbeddings):
+    """FastEmbedEmbeddings that embeds documents on a pool of worker processes.
+
+    Each worker holds its own ONNX session with a fixed thread count, and
+    documents are split into one batch per worker, at most `batch_size` texts
+    each, and returned in input order, so even the few chunks of an ingestion
+    commit use every worker. The pool starts on first use and lives as long as
+    the object, so ingesting page batches does not reload the model. Queries and
+    single texts are embedded in-process. With `workers=None` this behaves
+    exactly like FastEmbedEmbeddings, including its own `parallel` option.
+    """
+
+    workers: Optional[int] = None
+    """The number of worker processes for document embedding, 0 for one per core,
+    None to embed in-process."""
+
+    worker_threads: Optional[int] = None
+    """ONNX Runtime threads per worker. Defaults to the cores divided by the workers."""
+
+    _pool: Optional[ProcessPoolExecutor] = PrivateAttr(default=None)
+    _pool_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _workers(self) -> int:
+        return self.workers or os.cpu_count() or 1
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                workers = self._workers()
+                threads = self.worker_threads or max(1, (os.cpu_count() or 1) // workers)
+                model_kwargs = {
+                    "model_name": self.model_name,
+                    "max_length": self.max_length,
+                    "cache_dir": self.cache_dir,
+                    "providers": self.providers,
+                }
+                # Spawned workers start without the parent's ONNX sessions and threads.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(model_kwargs, threads),
+                )
+        return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, spreading batches across the worker pool when workers is set.
+
+        Args:
+            texts: The list of texts to embed.
+
+        Returns:
+            List of embeddings, one for each text, in input order.
+        """
+        texts = list(texts)
+        if self.workers is None or len(texts) <= 1:
+            return super().embed_documents(texts)
+        size = min(self.batch_size, -(-len(texts) // self._workers()))
+        batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+        passage = self.doc_embed_type == "passage"
+        # Executor.map yields results in submission order.
+        results = self._get_pool().map(_embed_batch, batches, [passage] * len(batches))
+        return [row.tolist() for batch in results for row in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query in-process; a worker round-trip would only add latency.
+
+        Args:
+            text: The text to embed.
+
+        Returns:
+            Embeddings for the text.
+        """
+        return next(self.model.query_embed(text, batch_size=self.batch_size)).tolist()
+
+    def close(self) -> None:
+        """Stop the worker pool."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
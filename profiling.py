@@ -0,0 +1,191 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+PROFILE_DIR = "profiles"
+# Leaf frames of threads parked on a lock, queue or selector, left out of the hotspots.
+IDLE_FRAMES = ("wait (threading.py", "_worker (thread.py", "select (selectors.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    # ";" separates frames in the collapsed format.
+    return label.replace(";", ":")
+
+
+class StackSampler:
+    """Sample the Python stacks of every thread at a fixed interval.
+
+    Samples are counted as collapsed stacks ("thread;outer;...;inner"), the input
+    format of flamegraph.pl, speedscope and similar viewers. Unlike cProfile this
+    sees the worker threads a request fans out to, e.g., the LLM gateway and the
+    retriever executors, and its overhead does not depend on the number of calls.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Initialize a StackSampler.
+
+        Args:
+            interval (float, optional): Seconds between samples. Defaults to 0.005.
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the collapsed stack counts."""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    """Profile individual requests on demand or at a sampled rate.
+
+    A profiled request writes three files to `output_dir`:
+    - `<name>.collapsed`: sampled stacks of all threads, for a flamegraph viewer;
+    - `<name>.txt`: the top-N hotspots by sampled self time and by cProfile time;
+    - `<name>.prof`: the raw cProfile stats of the request thread, e.g., for snakeviz.
+
+    Only one request is profiled at a time; others run unprofiled meanwhile.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = PROFILE_DIR,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        top_n: int = 30,
+    ):
+        """
+        Initialize a RequestProfiler.
+
+        Args:
+            output_dir (str, optional): The directory the profiles are written to. Defaults to "profiles".
+            sample_rate (float, optional): The fraction of requests profiled without being asked to. Defaults to 0.0.
+            interval (float, optional): Seconds between stack samples. Defaults to 0.005.
+            top_n (int, optional): The number of hotspots listed in the summary. Defaults to 30.
+        """
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.top_n = top_n
+        self.last_profile: Optional[Dict[str, str]] = None
+        self._busy = threading.Lock()
+
+    def should_profile(self, force: bool = False) -> bool:
+        """Return whether to profile the next request, either forced or by sampling."""
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, name: str, enabled: bool = True) -> Iterator[None]:
+        """
+        Profile the enclosed block when `enabled` and no other profile is running.
+
+        Args:
+            name (str): Included in the file names, e.g., the handler method.
+            enabled (bool, optional): Whether to profile this block. Defaults to True.
+        """
+        if not enabled or not self._busy.acquire(blocking=False):
+            yield
+            return
+        sampler = StackSampler(self.interval)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            sampler.start()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                stacks = sampler.stop()
+            self.last_profile = self._write(
+                name, profiler, stacks, sampler.samples, time.perf_counter() - start
+            )
+        finally:
+            self._busy.release()
+
+    def _write(
+        self,
+        name: str,
+        profiler: cProfile.Profile,
+        stacks: Counter,
+        samples: int,
+        elapsed: float,
+    ) -> Dict[str, str]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.join(
+            self.output_dir,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-"
+            f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}",
+        )
+        paths = {
+            "collapsed": f"{stem}.collapsed",
+            "summary": f"{stem}.txt",
+            "pstats": f"{stem}.prof",
+        }
+        with open(paths["collapsed"], "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        profiler.dump_stats(paths["pstats"])
+        with open(paths["summary"], "w", encoding="utf-8") as f:
+            f.write(self._summary(profiler, stacks, samples, elapsed))
+        return paths
+
+    def _summary(
+        self, profiler: cProfile.Profile, stacks: Counter, samples: int, elapsed: float
+    ) -> str:
+        out = io.StringIO()
+        out.write(
+            f"wall time {elapsed * 1000:.1f} ms, "
+            f"{samples} samples every {self.interval * 1000:g} ms\n\n"
+        )
+        self_samples: Counter = Counter()
+        for stack, count in stacks.items():
+            _, _, frames = stack.partition(";")
+            leaf = frames.rsplit(";", 1)[-1]
+            if frames and not leaf.startswith(IDLE_FRAMES):
+                self_samples[leaf] += count
+        out.write(f"Top {self.top_n} frames by sampled self time (all threads, idle waits excluded)\n")
+        total = sum(self_samples.values()) or 1
+        for label, count in self_samples.most_common(self.top_n):
+            out.write(f"{count / total:7.1%} {count:7d}  {label}\n")
+        out.write(f"\nTop {self.top_n} functions by own time (request thread, cProfile)\n")
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats("tottime").print_stats(self.top_n)
+        out.write(f"Top {self.top_n} functions by cumulative time (request thread, cProfile)\n")
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+        return out.getvalue()
@@ -279,4 +279,38 @@ Explanation: The previous thought established what a NoSQL database is. The next
 
 # Output Format:
 - Generate only one thought as a concise question.
-- Keep it clear and directly relevant to the main question."""
\ No newline at end of file
+- Keep it clear and directly relevant to the main question."""
+candidate_thoughts_prompt = """You are a structured reasoning assistant designed to break down complex questions into smaller, logical steps. Your goal is to propose several candidate next thoughts based on the main question and previous thoughts and observations. The candidates are investigated at the same time, so none of them may depend on the answer of another.
+
+# Instructions:
+1. Focus on the main question and carefully review the provided thoughts and observations.
+2. Propose at most {candidates} new thoughts, fewer if fewer unexplored aspects remain.
+3. If no previous thoughts exist, start with the most fundamental concepts in the main question, e.g., define each term that the question compares.
+4. If previous thoughts and observations exist, use them to determine the next logical thoughts.
+5. AVOID DUPLICATION, do not ask about concepts already covered in previous thoughts or in another candidate.
+6. Each thought must introduce only one concept—do not ask about multiple ideas or attempt to rephrase the main question directly.
+7. Use observations when applicable—if a previous observation reveals new knowledge, explore it further to build towards answering the main question.
+
+## IMPORTANT: Pay extra attention to point 5. Avoiding duplication is the highest priority.
+
+# Output Format:
+- Respond in the following JSON format without any additional explanation: {{"thoughts": ["Thought 1", "Thought 2", ...]}}
+- Each thought is a concise question, clear and directly relevant to the main question.
+
+# EXAMPLE:
+{example}"""
+section_summarizer_prompt = """You are an expert technical writer building a summary index of a document. The summaries are retrieved later to answer broad questions about the document, such as "Summarize chapter 3" or "Compare X and Y".
+
+# TASK:
+Summarize the following part of the document, pages {first_page} to {last_page}. The text is either the pages themselves or summaries of consecutive parts of the document.
+
+# INSTRUCTIONS:
+- Start with the titles of the chapters and sections the text covers, exactly as written.
+- Cover every main topic, definition, comparison and conclusion, in document order.
+- Keep the technical terms and names used in the text so that keyword search can find the summary.
+- Use only the given text; do not add outside knowledge.
+- Write at most {max_words} words of plain text, without preamble.
+
+TEXT:
+{text}
+"""
@@ -1,12 +1,24 @@
-from langchain_openai import ChatOpenAI
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import uuid
+from typing import Iterator, List, Optional, Tuple
 from typing_extensions import TypedDict
-from langchain_core.prompts import ChatPromptTemplate
 from fastembed.rerank.cross_encoder import TextCrossEncoder
-from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
+from parallel_embeddings import ParallelFastEmbedEmbeddings
 from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel
-from retriever_with_reranker import RetrieveWithReranker
-from keybert import KeyBERT
+from retriever_with_reranker import RetrieveWithReranker, SearchResult, format_documents
+from federated_retriever import FederatedRetriever
+from knowledge_memo import KnowledgeMemo
+from llm_gateway import get_llm_gateway
+from section_summaries import build_section_summarizer
+from routing_classifier import GRADE, ROUTE, RoutingLog, load_router, routing_features
+from singleflight import SingleFlight
+from speculation import Speculator
 from decomposing_question_handler import DecomposingQuestionHandler
 from reasoning_question_handler import ReasoningQuestionHandler
 from pydantic import BaseModel, Field
@@ -19,6 +31,42 @@ from prompts import (
     knowledge_evaluator_prompt,
 )
 
+# Shared across handlers so identical questions on the same file coalesce.
+_question_flight = SingleFlight()
+
+# Checkpoint savers by path, shared across handlers, which are rebuilt per upload
+# and per document, so each process opens a checkpoint file once.
+_checkpoints = {}
+_checkpoints_lock = threading.Lock()
+
+
+def _open_checkpoints(path: str) -> tuple:
+    """Return the process-wide checkpoint saver of a SQLite file, with the connection and lock for its failed runs."""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    path = os.path.abspath(path)
+    with _checkpoints_lock:
+        if path not in _checkpoints:
+            # SqliteSaver serializes access to the connection itself.
+            connection = sqlite3.connect(path, check_same_thread=False)
+            # Failed runs waiting to be resumed, shared by every process using the file.
+            runs = sqlite3.connect(
+                path, check_same_thread=False, isolation_level=None, timeout=30
+            )
+            runs.execute(
+                "CREATE TABLE IF NOT EXISTS failed_runs "
+                "(thread_id TEXT PRIMARY KEY, question_id TEXT NOT NULL)"
+            )
+            _checkpoints[path] = (SqliteSaver(connection), runs, threading.Lock())
+        return _checkpoints[path]
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so that trivially different phrasings share a key."""
+    question = re.sub(r"\s+", " ", question).strip().lower()
+    return question.rstrip("?!. ")
+
+
 class SubQuestions(BaseModel):
     """a list of sub-questions to systematically gather knowledge needed to answer a given main question."""
 
@@ -31,16 +79,32 @@ class QuestionHandlerConfig(BaseModel):
     """Configuration for the QuestionHandler.
 
     Args:
-        file_path (str): The path to the PDF file.
+        file_path (str): The path to the PDF file, or a directory to search all of its PDFs together.
         llm_config (dict): Configuration for the ChatOpenAI, e.g., model, base_url, api_key.
-        embedding_config (dict): Configuration for the FastEmbed embedding model, e.g., model_name, max_length, batch_size.
+        embedding_config (dict): Configuration for the FastEmbed embedding model, e.g., model_name, max_length, batch_size, workers.
         reranker_config (dict): Configuration for the FastEmbed TextCrossEncoder, e.g., model_name.
+        llm_gateway_config (dict, optional): Configuration for the shared LLMGateway, e.g., max_concurrency, requests_per_minute.
+        retriever_config (dict, optional): Extra arguments for RetrieveWithReranker, e.g., vector_store, index_dtype.
+        memo_config (dict, optional): Configuration for the per-document KnowledgeMemo of sub-question observations, e.g., enabled, threshold.
+        reasoning_config (dict, optional): Extra arguments for ReasoningQuestionHandler, e.g., candidate_thoughts.
+        routing_config (dict, optional): Configuration for the local routing classifier, e.g., log_path, model_path, confidence.
+        summary_config (dict, optional): Configuration for the ingest-time SectionSummarizer, e.g., enabled, pages_per_section.
+        speculation_config (dict, optional): Configuration for the Speculator, e.g., enabled, max_calls_per_run.
+        checkpoint_path (str, optional): The SQLite file for durable graph checkpoints, so a failed question resumes where it stopped. Defaults to None (no checkpoints).
     """
 
     file_path: str
     llm_config: dict
     embedding_config: dict
     reranker_config: dict
+    llm_gateway_config: dict = Field(default_factory=dict)
+    retriever_config: dict = Field(default_factory=dict)
+    memo_config: dict = Field(default_factory=dict)
+    reasoning_config: dict = Field(default_factory=dict)
+    routing_config: dict = Field(default_factory=dict)
+    summary_config: dict = Field(default_factory=dict)
+    speculation_config: dict = Field(default_factory=dict)
+    checkpoint_path: Optional[str] = None
 
 
 class State(TypedDict):
@@ -51,40 +115,259 @@ class State(TypedDict):
     document: str
     final_answer: str
     max_retries: int
+    question_embedding: Optional[list]
+    routing_features: Optional[list]
+    run_id: str
 
 
 class QuestionHandler:
-    def __init__(self, config: QuestionHandlerConfig):
+    def __init__(self, config: QuestionHandlerConfig, embedding=None, reranker=None):
         """
         Initialize a QuestionHandler instance.
 
         Args:
             config (QuestionHandlerConfig): A configuration object with the necessary parameters.
+            embedding (optional): An embedding model shared with other handlers. Defaults to one built from `config.embedding_config`.
+            reranker (optional): A reranker model shared with other handlers. Defaults to one built from `config.reranker_config`.
         """
 
         self.config = config
         self.llm = self._init_llm()
+        self.embedding = embedding or ParallelFastEmbedEmbeddings(
+            **self.config.embedding_config
+        )
+        self.reranker = reranker or TextCrossEncoder(**self.config.reranker_config)
         self.retriever = self._init_retriever()
+        self.memo = self._init_memo()
         self.decomposing_question_handler = DecomposingQuestionHandler(
-            self.llm, self.retriever
+            self.llm, self.retriever, self.memo
         ).build_graph()
         self.reasoning_question_handler = ReasoningQuestionHandler(
-            self.llm, self.retriever
+            self.llm, self.retriever, self.memo, **self.config.reasoning_config
         ).build_graph()
-        self.kw_model = KeyBERT()
+        # The retriever's ingest-time keyphrase index replaces KeyBERT when enabled.
+        self.kw_model = (
+            None if self.retriever.keyphrase_index_enabled else self._init_kw_model()
+        )
+        self.speculator = Speculator(
+            **self.config.speculation_config, has_capacity=self._llm_has_capacity
+        )
+        self._init_routing()
+        self.checkpointer = self._init_checkpointer()
+        self.app = self.build_graph(self.checkpointer)
+
+    def invoke(self, input: dict, run_id: Optional[str] = None) -> dict:
+        """
+        Run the question handler graph on the input.
+
+        Concurrent invocations with the same file and normalized question share a
+        single graph execution and each receive a copy of its result, unless they
+        pass their own `run_id`. With checkpoints enabled, a run that failed part-way
+        is recorded, and the next run of the same question claims it and resumes
+        from its last completed node, including the completed steps of its
+        subgraphs. Checkpoints are deleted once a run succeeds.
+
+        Args:
+            input (dict): The initial graph state, e.g., question, max_retries.
+            run_id (str, optional): Identifies the run in the checkpoints, resuming it if it stopped part-way. Defaults to the ID of a failed run of the same question, or a new unique ID.
+
+        Returns:
+            dict: The final graph state.
+        """
+        key = self._flight_key(input)
+        if run_id is not None:
+            # The caller owns this run, so it is never merged into another caller's.
+            return self._invoke(input, key, run_id)
+        return _question_flight.do(key, self._invoke, input, key, run_id)
+
+    def stream(self, input: dict, run_id: Optional[str] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Run the question handler graph like `invoke`, reporting progress as it goes.
+
+        Streamed runs are checkpointed and resumed like `invoke`, but are not coalesced
+        with concurrent identical questions.
+
+        Args:
+            input (dict): The initial graph state, e.g., question, max_retries.
+            run_id (str, optional): Identifies the run in the checkpoints. Defaults to the ID of a failed run of the same question, or a new unique ID.
+
+        Yields:
+            Tuple[str, dict]: The name and state update of each node as it finishes, then ("final", the final graph state).
+        """
+        key = self._flight_key(input)
+        graph_input, config, thread_id = self._start_run(input, key, run_id)
+        final = None
+        try:
+            for mode, chunk in self.app.stream(
+                graph_input, config, stream_mode=["updates", "values"]
+            ):
+                if mode == "values":
+                    final = chunk
+                    continue
+                for node, update in chunk.items():
+                    yield node, update or {}
+        except BaseException:
+            # Includes a client closing the stream early.
+            self._run_failed(key, run_id, config)
+            raise
+        else:
+            self._run_finished(config)
+        finally:
+            self.speculator.finish(thread_id)
+        yield "final", final
+
+    def _flight_key(self, input: dict) -> tuple:
+        return (
+            self.config.file_path,
+            normalize_question(input["question"]),
+            input.get("max_retries"),
+        )
+
+    @staticmethod
+    def _question_id(key: tuple) -> str:
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32]
+
+    def _start_run(
+        self, input: dict, key: tuple, run_id: Optional[str]
+    ) -> Tuple[Optional[dict], Optional[dict], str]:
+        """
+        Return the graph input, config and ID of a run.
+
+        Without an explicit `run_id`, a live run never shares its ID, which keys its
+        checkpoint thread and its speculative calls: it claims a failed run of the
+        same question, which no other run can claim again, or else gets a new ID.
+        """
+        if run_id is None and self.checkpointer is not None:
+            run_id = self._claim_failed_run(key)
+        run_id = run_id or uuid.uuid4().hex
+        graph_input = {**input, "run_id": run_id}
+        if self.checkpointer is None:
+            return graph_input, None, run_id
+        config = {"configurable": {"thread_id": run_id}}
+        resume = bool(self.app.get_state(config).next)
+        return (None if resume else graph_input), config, run_id
+
+    def _claim_failed_run(self, key: tuple) -> Optional[str]:
+        with self._runs_lock:
+            # An immediate transaction keeps other processes from claiming the same run.
+            self._runs.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._runs.execute(
+                    "SELECT thread_id FROM failed_runs WHERE question_id = ? LIMIT 1",
+                    (self._question_id(key),),
+                ).fetchone()
+                if row is not None:
+                    self._runs.execute("DELETE FROM failed_runs WHERE thread_id = ?", row)
+                self._runs.execute("COMMIT")
+            except BaseException:
+                self._runs.execute("ROLLBACK")
+                raise
+        return None if row is None else row[0]
+
+    def _run_failed(self, key: tuple, run_id: Optional[str], config: Optional[dict]) -> None:
+        """Record a run that stopped part-way so the next run of its question resumes it."""
+        # Callers passing their own run_id resume it themselves.
+        if config is None or run_id is not None:
+            return
+        with self._runs_lock:
+            self._runs.execute(
+                "INSERT OR REPLACE INTO failed_runs (thread_id, question_id) VALUES (?, ?)",
+                (config["configurable"]["thread_id"], self._question_id(key)),
+            )
+
+    def _run_finished(self, config: Optional[dict]) -> None:
+        if config is not None:
+            self.checkpointer.delete_thread(config["configurable"]["thread_id"])
+
+    def _invoke(self, input: dict, key: tuple, run_id: Optional[str]) -> dict:
+        graph_input, config, thread_id = self._start_run(input, key, run_id)
+        try:
+            result = self.app.invoke(graph_input, config)
+        except BaseException:
+            self._run_failed(key, run_id, config)
+            raise
+        finally:
+            self.speculator.finish(thread_id)
+        self._run_finished(config)
+        return result
+
+    def speculation_stats(self) -> dict:
+        """Return how many speculative calls were started, used and wasted, and the hit rate."""
+        return self.speculator.stats.snapshot()
+
+    def _llm_has_capacity(self) -> bool:
+        # Speculate only while a gateway slot is free, so regular calls never queue behind it.
+        return self.llm.metrics.snapshot()["in_flight"] < self.llm.max_concurrency
 
     def _init_llm(self):
-        return ChatOpenAI(**self.config.llm_config)
+        return get_llm_gateway(
+            self.config.llm_config, self.config.llm_gateway_config
+        )
+
+    def _init_routing(self):
+        routing = self.config.routing_config
+        self.embedding_model = getattr(self.embedding, "model_name", None)
+        log_path, model_path = routing.get("log_path"), routing.get("model_path")
+        self.routing_log = RoutingLog(log_path) if log_path else None
+        self.router = load_router(model_path, self.embedding_model) if model_path else None
+        self.routing_confidence = routing.get("confidence", 0.9)
+        self.routing_audit_rate = routing.get("audit_rate", 0.0)
+
+    def _init_checkpointer(self):
+        if not self.config.checkpoint_path:
+            return None
+        checkpointer, self._runs, self._runs_lock = _open_checkpoints(self.config.checkpoint_path)
+        return checkpointer
 
     def _init_retriever(self):
+        summarizer = build_section_summarizer(
+            self.config.llm_config,
+            self.config.llm_gateway_config,
+            self.config.summary_config,
+        )
+        if os.path.isdir(self.config.file_path):
+            return FederatedRetriever(
+                directory=self.config.file_path,
+                reranker=self.reranker,
+                embedding=self.embedding,
+                summarizer=summarizer,
+                **self.config.retriever_config,
+            )
         return RetrieveWithReranker(
             file_path=self.config.file_path,
-            reranker=TextCrossEncoder(**self.config.reranker_config),
-            embedding=FastEmbedEmbeddings(**self.config.embedding_config),
+            reranker=self.reranker,
+            embedding=self.embedding,
+            summarizer=summarizer,
+            **self.config.retriever_config,
+        )
+
+    def _init_memo(self):
+        options = dict(self.config.memo_config)
+        # The memo is per document; the library of all documents has none.
+        if not options.pop("enabled", False) or isinstance(self.retriever, FederatedRetriever):
+            return None
+        return KnowledgeMemo(
+            self.retriever.index_path,
+            self.embedding,
+            self.retriever.index_version,
+            **options,
         )
 
+    def _init_kw_model(self):
+        # Imported lazily: keybert loads sentence-transformers (and torch) on import.
+        from keybert import KeyBERT
+        from keybert_backend import FastEmbedBackend
+
+        return KeyBERT(model=FastEmbedBackend(self.embedding))
+
     def _extract_keywords(self, state: State):
         question = state["question"]
+        if self.retriever.keyphrase_index_enabled:
+            keyphrase_index = self.retriever.keyphrase_index
+            # Keyphrases are built once ingestion completes; until then only the vector leg runs.
+            return {
+                "keywords": keyphrase_index.extract(question) if keyphrase_index else []
+            }
         return {
             "keywords": [
                 k[0]
@@ -97,13 +380,11 @@ class QuestionHandler:
     def _retrieve(self, state: State):
         query = state.get("transformed_question", state["question"])
         keywords = state["keywords"]
-        result = self.retriever.search(query, keywords)
-        if len(result) == 0:
-            return {"document": ""}
-        document = ""
-        for i, r in enumerate(result):
-            document += f"Document {i+1}: {r.page_content}\n\n"
-        return {"document": document}
+        result = self.retriever.search_scored(query, keywords)
+        document = format_documents(result.documents) if result.documents else ""
+        if self.router is None and self.routing_log is None:
+            return {"document": document}
+        return {"document": document, **self._routing_state(state, query, result, document)}
 
     def _grade_document(self, state: State):
         question = state["question"]
@@ -135,41 +416,103 @@ class QuestionHandler:
         - Your response: NO
         - Explanation: "The document provides a definition of a transaction but does not mention update operations, which are necessary to fully answer the question. Since the question explicitly asks for a comparison, and one side of the comparison is missing, the retrieved information is insufficient."
         """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    knowledge_evaluator_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        result = chain.invoke(
-            {"knowledge": knowledge, "question": question, "examples": examples}
-        )
-        if "YES" in result.content.upper() or not state["document"]:
-            return "Generate answer"
+        features = state.get("routing_features")
+        sufficient = self._local_decision(GRADE, features)
+        if sufficient is None:
+            self._speculate_grading_branches(state)
+            result = self.llm.invoke(
+                [("human", knowledge_evaluator_prompt)],
+                {"knowledge": knowledge, "question": question, "examples": examples},
+            )
+            sufficient = "YES" in result.content.upper()
+            self._log_decision(GRADE, sufficient, features, question)
+        if sufficient or not state["document"]:
+            decision = "Generate answer"
         elif state["max_retries"] <= 0:
-            return "Decompose question"
+            decision = "Decompose question"
+        else:
+            decision = "Regenerate question"
+        self.speculator.resolve(state["run_id"], keep=self._branch_key(decision, state))
+        return decision
+
+    def _routing_state(
+        self, state: State, query: str, result: SearchResult, document: str
+    ) -> dict:
+        """Compute the routing classifier's features of a retrieval once, from the scores it already computed."""
+        if not document:
+            return {"routing_features": None}
+        question = state["question"]
+        embedding = state.get("question_embedding")
+        if embedding is None:
+            # The first retrieval searches with the question itself.
+            if query == question:
+                embedding = result.query_vector.tolist()
+            else:
+                embedding = self.embedding.embed_query(question)
+        return {
+            "question_embedding": embedding,
+            "routing_features": routing_features(embedding, result.score, question, document),
+        }
+
+    def _local_decision(self, stage: str, features: Optional[List[float]]) -> Optional[bool]:
+        """Predict the LLM's decision locally, or return None to ask the LLM."""
+        if self.router is None or features is None:
+            return None
+        # A share of confident decisions still goes to the LLM to keep the log representative.
+        if random.random() < self.routing_audit_rate:
+            return None
+        return self.router.decide(stage, features, self.routing_confidence)
+
+    def _log_decision(
+        self, stage: str, decision: bool, features: Optional[List[float]], question: str
+    ) -> None:
+        if self.routing_log is not None and features is not None:
+            self.routing_log.append(stage, decision, features, question, self.embedding_model)
+
+    def _branch_key(self, branch: str, state: State) -> tuple:
+        """Identify a branch after grading by the inputs its LLM call depends on."""
+        if branch == "Generate answer":
+            return ("answer", state["document"])
+        if branch == "Regenerate question":
+            query = state.get("transformed_question", state["question"])
+            return ("regenerate", query, state["max_retries"])
+        return ("decompose",)
+
+    def _speculate_grading_branches(self, state: State):
+        """Draft the answer, and rewrite or decompose the question, while the grader runs."""
+        run = state["run_id"]
+        state = dict(state)
+        self.speculator.speculate(
+            run, self._branch_key("Generate answer", state), self._draft_answer, state
+        )
+        if state["max_retries"] <= 0:
+            self.speculator.speculate(
+                run, self._branch_key("Decompose question", state), self._decompose, state
+            )
         else:
-            return "Regenerate question"
+            self.speculator.speculate(
+                run,
+                self._branch_key("Regenerate question", state),
+                self._rewrite_question,
+                state,
+            )
 
     def _regenerate_question(self, state: State):
-        query = state.get("transformed_question", state["question"])
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    question_regenerator_prompt,
-                )
-            ]
+        return self.speculator.take_or_run(
+            state["run_id"],
+            self._branch_key("Regenerate question", state),
+            self._rewrite_question,
+            state,
         )
-        chain = prompt | self.llm
-        result = chain.invoke(
+
+    def _rewrite_question(self, state: State):
+        query = state.get("transformed_question", state["question"])
+        result = self.llm.invoke(
+            [("human", question_regenerator_prompt)],
             {
                 "original_query": query,
                 "main_query": state["question"],
-            }
+            },
         )
         return {
             "transformed_question": result.content,
@@ -177,39 +520,45 @@ class QuestionHandler:
         }
 
     def _generate_answer(self, state: State):
+        return self.speculator.take_or_run(
+            state["run_id"],
+            self._branch_key("Generate answer", state),
+            self._draft_answer,
+            state,
+        )
+
+    def _draft_answer(self, state: State):
         question = state["question"]
         context = state["document"]
         if not context:
             return {
                 "final_answer": "The question seems to be not related to the current document or cannot be answered. Please try a different question."
             }
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    answer_generator_prompt,
-                )
-            ]
+        result = self.llm.invoke(
+            [("human", answer_generator_prompt)],
+            {"question": question, "context": context},
         )
-        chain = prompt | self.llm
-        result = chain.invoke({"question": question, "context": context})
         return {"final_answer": result.content}
 
     def _generate_sub_questions(self, state: State):
+        return self.speculator.take_or_run(
+            state["run_id"],
+            self._branch_key("Decompose question", state),
+            self._decompose,
+            state,
+        )
+
+    def _decompose(self, state: State):
         question = state["question"]
         example = f"""
                 Main Question: "What are the difference between database schema and database state?"
                 Your response: {SubQuestions(sub_questions=["What is a database schema?", "What is a database state?"]).model_dump_json()}
         """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("human", decomposer_prompt),
-            ]
-        )
-        chain = prompt | self.llm.with_structured_output(
-            SubQuestions, method="json_mode"
+        result = self.llm.invoke(
+            [("human", decomposer_prompt)],
+            {"question": question, "example": example},
+            schema=SubQuestions,
         )
-        result = chain.invoke({"question": question, "example": example})
         return {"sub_questions": result.sub_questions}
 
     def _decomposing_question_handler_node(self, state: State):
@@ -218,6 +567,9 @@ class QuestionHandler:
             "keywords": state["keywords"],
             "sub_questions": state["sub_questions"],
             "max_retries": 1,
+            "prefetched": self.speculator.take_or_run(
+                state["run_id"], self._prefetch_key(state), dict
+            ),
         }
         result = self.decomposing_question_handler.invoke(input)
         return {"final_answer": result["final_answer"]}
@@ -236,43 +588,54 @@ class QuestionHandler:
         if not state["document"]:
             return {"final_answer": state["final_answer"]}
         final_answer = state["final_answer"]
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    answer_reformatter_prompt,
-                )
-            ]
+        result = self.llm.invoke(
+            [("human", answer_reformatter_prompt)],
+            {"text": final_answer},
         )
-        chain = prompt | self.llm
-        result = chain.invoke({"text": final_answer})
         return {"final_answer": result.content}
 
     def _route_node(self, state: State):
         sub_questions = "\n".join(state["sub_questions"])
         question = state["question"]
 
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    sub_questions_evaluator_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        score = chain.invoke(
-            {
-                "main_question": question,
-                "sub_questions": sub_questions,
-            }
-        )
-        if "YES" in score.content.upper():
+        features = state.get("routing_features")
+        decomposable = self._local_decision(ROUTE, features)
+        if decomposable is None:
+            # Retrieval for the decomposing subgraph costs no LLM call, so run it during routing.
+            self.speculator.speculate(
+                state["run_id"],
+                self._prefetch_key(state),
+                self._prefetch,
+                state["sub_questions"],
+                state["keywords"],
+                cost=0,
+            )
+            score = self.llm.invoke(
+                [("human", sub_questions_evaluator_prompt)],
+                {
+                    "main_question": question,
+                    "sub_questions": sub_questions,
+                },
+            )
+            decomposable = "YES" in score.content.upper()
+            self._log_decision(ROUTE, decomposable, features, question)
+        if decomposable:
+            self.speculator.resolve(state["run_id"], keep=self._prefetch_key(state))
             return "Decomposing approach can solve the question"
         else:
+            self.speculator.resolve(state["run_id"])
             return "Another approach"
 
-    def build_graph(self):
+    def _prefetch_key(self, state: State) -> tuple:
+        return ("prefetch", tuple(state["sub_questions"]))
+
+    def _prefetch(self, sub_questions: list, keywords: list) -> dict:
+        """Retrieve documents for every sub-question, formatted as the decomposing subgraph expects."""
+        sub_questions = list(dict.fromkeys(sub_questions))
+        results = self.retriever.search_many(sub_questions, keywords)
+        return {q: format_documents(r) for q, r in zip(sub_questions, results)}
+
+    def build_graph(self, checkpointer=None):
         """
         Constructs a state graph for the question handler.
 
@@ -300,6 +663,10 @@ class QuestionHandler:
         - reformat_final_answer -> END
 
         The graph is compiled into an application using the `compile` method of the `StateGraph` class.
+        The subgraphs run inside its nodes and share its checkpointer.
+
+        Args:
+            checkpointer (optional): A LangGraph checkpointer persisting the state after every node. Defaults to None.
 
         Returns:
             The compiled state machine application.
@@ -341,5 +708,5 @@ class QuestionHandler:
         workflow.add_edge("generate_final_answer", "reformat_final_answer")
         workflow.add_edge("reasoning_question_handler_node", "reformat_final_answer")
         workflow.add_edge("reformat_final_answer", END)
-        app = workflow.compile()
+        app = workflow.compile(checkpointer=checkpointer)
         return app
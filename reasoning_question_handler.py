@@ -1,11 +1,16 @@
-from langchain_openai import ChatOpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from pydantic import BaseModel, Field
 from typing_extensions import TypedDict, Annotated
-from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, START, END
-from retriever_with_reranker import RetrieveWithReranker
+from retriever_with_reranker import RetrieveWithReranker, format_documents
+from knowledge_memo import KnowledgeMemo
+from llm_gateway import LLMGateway
 import operator
 from prompts import (
     answer_generator_prompt,
+    candidate_thoughts_prompt,
     document_grader_prompt,
     question_regenerator_prompt,
     knowledge_evaluator_prompt,
@@ -18,34 +23,84 @@ class State(TypedDict):
     keywords: list
     knowledge: Annotated[list, operator.add]
     current_thought: str
+    candidate_thoughts: list
+    recalled: bool
     document: str
     final_answer: str
     max_retries: int
     max_generations: int
 
 
+PREVIOUS_THOUGHTS_TEMPLATE = """ Main Question:  
+                {question}  
+
+                Previous Thoughts and Observations:  
+                {previous}
+                """
+
+
+# Process-wide executors by size, shared by every handler so none is left running
+# when a handler is dropped.
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _thought_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Return the process-wide executor investigating up to `max_workers` candidate thoughts at once."""
+    with _executors_lock:
+        if max_workers not in _executors:
+            _executors[max_workers] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="candidate-thoughts"
+            )
+        return _executors[max_workers]
+
+
+class CandidateThoughts(BaseModel):
+    """candidate next thoughts that can be investigated independently of each other."""
+
+    thoughts: list[str] = Field(description="the list of candidate thoughts")
+
+
 class ReasoningQuestionHandler:
 
-    def __init__(self, llm: ChatOpenAI, retriever: RetrieveWithReranker):
+    def __init__(
+        self,
+        llm: LLMGateway,
+        retriever: RetrieveWithReranker,
+        memo: Optional[KnowledgeMemo] = None,
+        candidate_thoughts: int = 1,
+    ):
         """
         Initialize a ReasoningQuestionHandler.
 
         Args:
-            llm (ChatOpenAI): A configured langchain OpenAI chat model.
+            llm (LLMGateway): The shared gateway to the chat model.
             retriever (RetrieveWithReranker): A configured langchain retriever with reranker.
+            memo (KnowledgeMemo, optional): Observations of sub-questions answered by earlier questions on the document. Defaults to None.
+            candidate_thoughts (int, optional): The number of next thoughts proposed per step. Above 1, they are retrieved in one batch and graded and answered concurrently. Defaults to 1.
         """
+        if candidate_thoughts < 1:
+            raise ValueError("candidate_thoughts must be >= 1")
         self.llm = llm
         self.retriever = retriever
+        self.memo = memo
+        self.candidate_thoughts = candidate_thoughts
+        # The gateway still bounds the LLM calls in flight across all questions.
+        self._executor = (
+            _thought_executor(candidate_thoughts) if candidate_thoughts > 1 else None
+        )
 
-    def _generate_sub_question(self, state: State):
+    def _format_knowledge(self, state: State) -> str:
         reformatted_knowledge = ""
         if state["knowledge"]:
             for k in state["knowledge"]:
                 reformatted_knowledge += (
                     f"- Thought: {k['thought']}\n- Observation: {k['observation']}\n"
                 )
+        return reformatted_knowledge
 
-        prompt = ChatPromptTemplate.from_messages(
+    def _generate_sub_question(self, state: State):
+        sub_question = self.llm.invoke(
             [
                 (
                     "system",
@@ -53,32 +108,116 @@ class ReasoningQuestionHandler:
                 ),
                 (
                     "human",
-                    """ Main Question:  
-                {question}  
-
-                Previous Thoughts and Observations:  
-                {previous}
-                """,
+                    PREVIOUS_THOUGHTS_TEMPLATE,
                 ),
-            ]
-        )
-        chain = prompt | self.llm
-        sub_question = chain.invoke(
-            {"question": state["question"], "previous": reformatted_knowledge}
+            ],
+            {"question": state["question"], "previous": self._format_knowledge(state)},
         )
         return {"current_thought": sub_question.content}
 
+    def _generate_candidate_thoughts(self, state: State):
+        example = f"""
+                Main Question: "What is the difference between a database schema and a database state?"
+                Previous Thoughts and Observations:
+                Your response: {CandidateThoughts(thoughts=["What is a database schema?", "What is a database state?"]).model_dump_json()}
+        """
+        result = self.llm.invoke(
+            [
+                ("system", candidate_thoughts_prompt),
+                ("human", PREVIOUS_THOUGHTS_TEMPLATE),
+            ],
+            {
+                "question": state["question"],
+                "previous": self._format_knowledge(state),
+                "candidates": self.candidate_thoughts,
+                "example": example,
+            },
+            schema=CandidateThoughts,
+        )
+        thoughts = [t.strip() for t in result.thoughts if t.strip()]
+        return {"candidate_thoughts": list(dict.fromkeys(thoughts))[: self.candidate_thoughts]}
+
+    def _explore(self, state: State):
+        """Investigate the candidate thoughts together and keep the observation of every one that found a useful document."""
+        thoughts = state["candidate_thoughts"]
+        results = {}
+        pending = []
+        for thought in thoughts:
+            observation = self.memo.lookup(thought) if self.memo else None
+            if observation is None:
+                pending.append(thought)
+            else:
+                results[thought] = (thought, observation)
+        if pending:
+            documents = self.retriever.search_many(pending, state["keywords"])
+            futures = {
+                thought: self._executor.submit(
+                    self._investigate, state, thought, format_documents(result)
+                )
+                for thought, result in zip(pending, documents)
+            }
+            for thought, future in futures.items():
+                results[thought] = future.result()
+        knowledge = [
+            {"thought": result[0], "observation": result[1]}
+            for result in (results[thought] for thought in thoughts)
+            if result is not None
+        ]
+        if not knowledge:
+            return {"max_generations": state["max_generations"] - 1}
+        elif state["max_generations"] >= 2:
+            return {"knowledge": knowledge}
+        else:
+            return {"knowledge": knowledge, "max_generations": state["max_generations"] + 1}
+
+    def _investigate(
+        self, state: State, thought: str, document: str
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Grade the document retrieved for a candidate thought and answer it, rewriting the thought while retries remain.
+
+        Returns:
+            Optional[Tuple[str, str]]: The (possibly rewritten) thought and its observation, or None if no useful document was found.
+        """
+        for retry in range(state["max_retries"] + 1):
+            if retry:
+                thought = self._rewrite(thought, state["question"])
+                document = format_documents(
+                    self.retriever.search(thought, state["keywords"])
+                )
+            if self._is_relevant(thought, document):
+                observation = self._answer(thought, document)
+                # Only observations graded sufficient on the first retrieval are remembered.
+                if self.memo is not None and not retry:
+                    self.memo.add(thought, observation)
+                return thought, observation
+        return None
+
+    def _recall(self, state: State):
+        observation = self.memo.lookup(state["current_thought"]) if self.memo else None
+        if observation is None:
+            return {"recalled": False}
+        return {**self._add_observation(state, observation), "recalled": True}
+
+    def _after_recall(self, state: State):
+        if state["recalled"]:
+            return self._should_continue(state)
+        return "Retrieve"
+
     def _retrieve(self, state: State):
         query = state["current_thought"]
         keywords = state["keywords"]
         result = self.retriever.search(query, keywords)
-        document = ""
-        for i, r in enumerate(result):
-            document += f"Document {i+1}: {r.page_content}\n\n"
-        return {"document": document}
+        return {"document": format_documents(result)}
 
     def _grade_document(self, state: State):
-        query = state["current_thought"]
+        relevant = self._is_relevant(state["current_thought"], state["document"])
+        if relevant or state["max_retries"] <= 0:
+            return "Generate answer"
+        else:
+            return "Regenerate thought"
+
+    def _is_relevant(self, query: str, document: str) -> bool:
         examples = f"""
         # Case 1: 
         Question: What is the definition of database?
@@ -91,61 +230,45 @@ class ReasoningQuestionHandler:
         Response: YES
         Explanation: The document directly provides the necessary information to answer the question.
         """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    document_grader_prompt,
-                )
-            ]
+        result = self.llm.invoke(
+            [("human", document_grader_prompt)],
+            {"question": query, "document": document, "examples": examples},
         )
-        chain = prompt | self.llm
-        result = chain.invoke(
-            {"question": query, "document": state["document"], "examples": examples}
-        )
-        if  "YES" in result.content.upper() or state["max_retries"] <= 0:
-            return "Generate answer"
-        else:
-            return "Regenerate thought"
+        return "YES" in result.content.upper()
 
     def _regenerate_question(self, state: State):
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    question_regenerator_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        result = chain.invoke(
-            {
-                "original_query": state["current_thought"],
-                "main_query": state["question"],
-            }
-        )
         return {
-            "current_thought": result.content,
+            "current_thought": self._rewrite(state["current_thought"], state["question"]),
             "max_retries": state["max_retries"] - 1,
         }
 
+    def _rewrite(self, thought: str, question: str) -> str:
+        result = self.llm.invoke(
+            [("human", question_regenerator_prompt)],
+            {"original_query": thought, "main_query": question},
+        )
+        return result.content
+
+    def _answer(self, question: str, context: str) -> str:
+        result = self.llm.invoke(
+            [("human", answer_generator_prompt)],
+            {"question": question, "context": context},
+        )
+        return result.content
+
     def _generate_answer(self, state: State):
         current_sub_question = state["current_thought"]
-        context = state["document"]
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    answer_generator_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        result = chain.invoke({"question": current_sub_question, "context": context})
+        observation = self._answer(current_sub_question, state["document"])
+        # Only observations graded sufficient on the first retrieval are remembered.
+        if self.memo is not None and state["max_retries"] > 0:
+            self.memo.add(current_sub_question, observation)
+        return self._add_observation(state, observation)
+
+    def _add_observation(self, state: State, observation: str):
         if state["max_retries"] <= 0:
             return {
                 "knowledge": [
-                    {"thought": state["current_thought"], "observation": result.content}
+                    {"thought": state["current_thought"], "observation": observation}
                 ],
                 "max_retries": 1,
                 "max_generations": state["max_generations"] - 1,
@@ -153,14 +276,14 @@ class ReasoningQuestionHandler:
         elif state["max_generations"] >= 2:
             return {
                 "knowledge": [
-                    {"thought": state["current_thought"], "observation": result.content}
+                    {"thought": state["current_thought"], "observation": observation}
                 ],
                 "max_retries": 1,
             }
         else:
             return {
                 "knowledge": [
-                    {"thought": state["current_thought"], "observation": result.content}
+                    {"thought": state["current_thought"], "observation": observation}
                 ],
                 "max_retries": 1,
                 "max_generations": state["max_generations"] + 1,
@@ -184,17 +307,9 @@ class ReasoningQuestionHandler:
         knowledge = "\n".join(
             [k["observation"] for k in state.get("knowledge", []) if k["observation"]]
         )
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    knowledge_evaluator_prompt,
-                )
-            ]
-        )
-        chain = prompt | self.llm
-        result = chain.invoke(
-            {"knowledge": knowledge, "question": question, "examples": examples}
+        result = self.llm.invoke(
+            [("human", knowledge_evaluator_prompt)],
+            {"knowledge": knowledge, "question": question, "examples": examples},
         )
         if "YES" in result.content.upper() or state["max_generations"] <= 0:
             return "Enough knowledge"
@@ -210,25 +325,20 @@ class ReasoningQuestionHandler:
             [k["observation"] for k in state.get("knowledge", []) if k["observation"]]
         )
         question = state["question"]
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    answer_generator_prompt,
-                )
-            ]
+        result = self.llm.invoke(
+            [("human", answer_generator_prompt)],
+            {"question": question, "context": knowledge},
         )
-        chain = prompt | self.llm
-        result = chain.invoke({"question": question, "context": knowledge})
         return {"final_answer": result.content}
 
-    def build_graph(self):
+    def build_graph(self, checkpointer=None):
         """
         Builds a state graph for reasoning question handler.
 
         The graph consists of the following nodes and edges:
 
         - generate_thought: generates a sub-question based on the input question
+        - recall: takes the sub-question's observation from the memo if it is there
         - retrieve: retrieves relevant documents based on the sub-question
         - generate_answer: generates an answer based on the retrieved documents
         - regenerate_thought: regenerates a new sub-question based on the input question
@@ -239,7 +349,10 @@ class ReasoningQuestionHandler:
         The graph is connected by the following edges:
 
         - START -> generate_thought
-        - generate_thought -> retrieve
+        - generate_thought -> recall
+        - recall -> generate_final_answer (if the memo had the observation and the knowledge is enough)
+        - recall -> generate_thought (if the memo had the observation and more knowledge is needed)
+        - recall -> retrieve (if the memo did not have the observation)
         - retrieve -> generate_answer (if the document is graded high enough)
         - retrieve -> regenerate_thought (if the document is graded low enough)
         - generate_answer -> generate_final_answer (if enough knowledge is generated)
@@ -247,19 +360,59 @@ class ReasoningQuestionHandler:
         - regenerate_thought -> retrieve
         - generate_final_answer -> END
 
+        With `candidate_thoughts` above 1, generate_thought proposes several
+        thoughts at once and a single explore node recalls, retrieves, grades and
+        answers them all before the knowledge is evaluated:
+
+        - START -> generate_thought
+        - generate_thought -> explore
+        - explore -> generate_final_answer (if enough knowledge is generated)
+        - explore -> generate_thought (if not enough knowledge is generated)
+        - generate_final_answer -> END
+
         The graph is compiled into a state machine app using the `compile` method of the `StateGraph` class.
+        When invoked from a QuestionHandler node it inherits the parent graph's checkpointer.
+
+        Args:
+            checkpointer (optional): A LangGraph checkpointer for standalone use. Defaults to None.
 
         Returns:
             The compiled state machine app.
         """
         workflow = StateGraph(State)
+        if self.candidate_thoughts > 1:
+            workflow.add_node("generate_thought", self._generate_candidate_thoughts)
+            workflow.add_node("explore", self._explore)
+            workflow.add_node("generate_final_answer", self._generate_final_answer)
+            workflow.add_edge(START, "generate_thought")
+            workflow.add_edge("generate_thought", "explore")
+            workflow.add_conditional_edges(
+                "explore",
+                self._should_continue,
+                {
+                    "Enough knowledge": "generate_final_answer",
+                    "Need more knowledge": "generate_thought",
+                },
+            )
+            workflow.add_edge("generate_final_answer", END)
+            return workflow.compile(checkpointer=checkpointer)
         workflow.add_node("generate_thought", self._generate_sub_question)
+        workflow.add_node("recall", self._recall)
         workflow.add_node("retrieve", self._retrieve)
         workflow.add_node("generate_answer", self._generate_answer)
         workflow.add_node("regenerate_thought", self._regenerate_question)
         workflow.add_node("generate_final_answer", self._generate_final_answer)
         workflow.add_edge(START, "generate_thought")
-        workflow.add_edge("generate_thought", "retrieve")
+        workflow.add_edge("generate_thought", "recall")
+        workflow.add_conditional_edges(
+            "recall",
+            self._after_recall,
+            {
+                "Enough knowledge": "generate_final_answer",
+                "Need more knowledge": "generate_thought",
+                "Retrieve": "retrieve",
+            },
+        )
         workflow.add_edge("regenerate_thought", "retrieve")
         workflow.add_conditional_edges(
             "generate_answer",
@@ -278,5 +431,5 @@ class ReasoningQuestionHandler:
             },
         )
         workflow.add_edge("generate_final_answer", END)
-        app = workflow.compile()
+        app = workflow.compile(checkpointer=checkpointer)
         return app
@@ -1,22 +1,60 @@
 import dotenv
-from typing import List
+import itertools
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import numpy as np
+import pymupdf
 from langchain_core.documents import Document
 from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_community.retrievers import BM25Retriever
+from rank_bm25 import BM25Okapi
 import re
+from chunk_store import ChunkStore
+from keyphrase_index import KEYPHRASE_EMBEDDINGS_FILE, KeyphraseIndex
+from near_duplicates import NearDuplicateIndex, find_boilerplate, strip_boilerplate
+from numpy_vector_store import NumpyVectorStore
+from offset_splitter import OffsetTextSplitter, PageSpan
+from section_summaries import SUMMARY_ID_PREFIX, SectionSummarizer, is_summary
+from singleflight import SingleFlight
 
 dotenv.load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def delete_collection(file_path: str, persist_directory: str = "./chromadb") -> None:
-    """Delete the Chroma collection associated with the file path."""
-    collection_name = reformat_collection_name(file_path)
-    vector_store = Chroma(
-        collection_name=collection_name, persist_directory=persist_directory
-    )
-    vector_store.delete_collection()
+PARENTS_FILE = "parents.json"
+# Pages of the near-duplicate chunks collapsed into each canonical chunk.
+DUPLICATES_FILE = "duplicates.json"
+# Chunks per Chroma upsert when adding precomputed embeddings.
+CHROMA_BATCH_SIZE = 1000
+
+
+def delete_collection(
+    file_path: str,
+    persist_directory: str = "./chromadb",
+    index_directory: str = "./vector_indexes",
+) -> None:
+    """
+    Delete every index of the file path.
+
+    This removes its flat and parent/child Chroma collections and their index
+    directories: the numpy index or Chroma mirror, parents, keyphrases,
+    near-duplicates and knowledge memo.
+    """
+    for collection_name in collection_names(file_path):
+        vector_store = Chroma(
+            collection_name=collection_name, persist_directory=persist_directory
+        )
+        vector_store.delete_collection()
+        path = Path(index_directory) / collection_name
+        if path.is_dir():
+            shutil.rmtree(path)
 
 
 def reformat_collection_name(name: str) -> str:
@@ -28,24 +66,426 @@ def reformat_collection_name(name: str) -> str:
     return name.ljust(3, "x")[:63] if len(name) < 3 or len(name) > 63 else name
 
 
+def collection_names(file_path: str) -> List[str]:
+    """Return the names of the collections a file may be indexed in, flat and parent/child."""
+    name = reformat_collection_name(file_path)
+    return [name, f"{name[:60]}_pc"]
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Hashable]], k: int = 60
+) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked lists of chunk IDs by reciprocal rank."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+def format_documents(documents: List[Document]) -> str:
+    """Format retrieved documents for a prompt, naming their source file in federated search."""
+    text = ""
+    for i, doc in enumerate(documents):
+        source = ""
+        first_page = doc.metadata.get("page", 0) + 1
+        if is_summary(doc.metadata):
+            pages = f"pages {first_page}-{doc.metadata['last_page'] + 1}"
+            origin = f"{doc.metadata['document']}, " if "document" in doc.metadata else ""
+            source = f" (summary of {origin}{pages})"
+        elif "pages" in doc.metadata:
+            pages = ", ".join(str(page + 1) for page in doc.metadata["pages"])
+            origin = f"{doc.metadata['document']}, " if "document" in doc.metadata else ""
+            source = f" (from {origin}pages {pages})"
+        elif "document" in doc.metadata:
+            source = f" (from {doc.metadata['document']}, page {first_page})"
+        text += f"Document {i+1}{source}: {doc.page_content}\n\n"
+    return text
+
+
+def _save_parents(path: Path, parents: Dict[str, Document]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                parent_id: {"page_content": d.page_content, "metadata": d.metadata}
+                for parent_id, d in parents.items()
+            },
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp, path)
+
+
+def _load_parents(path: Path) -> Dict[str, Document]:
+    with open(path, "r", encoding="utf-8") as f:
+        return {parent_id: Document(**d) for parent_id, d in json.load(f).items()}
+
+
+def _save_duplicates(path: Path, duplicates: Dict[str, List[int]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(duplicates, f)
+    os.replace(tmp, path)
+
+
+def _load_duplicates(path: Path) -> Dict[str, List[int]]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _chunk_ids(documents: List[Document]) -> List[str]:
+    """Number chunks within their page so re-ingesting a page yields the same IDs."""
+    counters = {}
+    ids = []
+    for doc in documents:
+        page = doc.metadata.get("page", 0)
+        n = counters.get(page, 0)
+        counters[page] = n + 1
+        ids.append(f"{page}-{n}")
+    return ids
+
+
+def _top_scored(items: List, scores, top_k: int) -> List:
+    """Return the top_k items by score, dropping those with a score <= 0."""
+    ranked = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)
+    return [items[i] for i, score in ranked[:top_k] if score > 0]
+
+
+class BM25Index:
+    """BM25 over chunk texts that returns integer chunk IDs instead of Documents."""
+
+    def __init__(self, texts: Iterable[str], k: int = 5):
+        """
+        Initialize a BM25Index.
+
+        Args:
+            texts (Iterable[str]): The chunk texts, in chunk ID order.
+            k (int, optional): The number of chunk IDs returned per search. Defaults to 5.
+        """
+        self.bm25 = BM25Okapi([text.split() for text in texts])
+        self.k = k
+        self._nd = None
+
+    def extend(self, texts: Iterable[str]) -> "BM25Index":
+        """
+        Return a new index over the indexed chunks followed by `texts`.
+
+        Only the new texts are tokenized; the term frequencies of the indexed chunks
+        are shared with this index, which stays valid for searches in flight. The
+        result scores exactly like an index built over all the texts.
+        """
+        old = self.bm25
+        bm25 = BM25Okapi.__new__(BM25Okapi)
+        bm25.tokenizer = None
+        bm25.k1, bm25.b, bm25.epsilon = old.k1, old.b, old.epsilon
+        bm25.doc_freqs = list(old.doc_freqs)
+        bm25.doc_len = list(old.doc_len)
+        document_frequencies = dict(self._document_frequencies())
+        for text in texts:
+            frequencies = {}
+            for word in text.split():
+                frequencies[word] = frequencies.get(word, 0) + 1
+            bm25.doc_freqs.append(frequencies)
+            bm25.doc_len.append(sum(frequencies.values()))
+            for word in frequencies:
+                document_frequencies[word] = document_frequencies.get(word, 0) + 1
+        bm25.corpus_size = len(bm25.doc_len)
+        bm25.avgdl = sum(bm25.doc_len) / bm25.corpus_size
+        bm25.idf = {}
+        bm25._calc_idf(document_frequencies)
+        index = BM25Index.__new__(BM25Index)
+        index.bm25 = bm25
+        index.k = self.k
+        index._nd = document_frequencies
+        return index
+
+    def _document_frequencies(self) -> Dict[str, int]:
+        """Return the number of chunks containing each term, which BM25Okapi does not keep."""
+        if self._nd is None:
+            nd = {}
+            for frequencies in self.bm25.doc_freqs:
+                for word in frequencies:
+                    nd[word] = nd.get(word, 0) + 1
+            self._nd = nd
+        return self._nd
+
+    def search(self, query: str) -> List[int]:
+        scores = self.bm25.get_scores(query.split())
+        return [int(n) for n in np.argsort(scores)[::-1][: self.k]]
+
+    def search_scored(self, query: str) -> List[Tuple[int, float]]:
+        """
+        Like `search`, but also return each chunk's score as a share of the best score the query can reach in this index.
+
+        Raw BM25 scores depend on the term statistics of the indexed chunks, so they
+        cannot be compared across documents. A term contributes at most
+        `idf * (k1 + 1)` to a score; terms missing from the index are given the idf
+        of a term found in a single chunk, so an index that lacks a query term
+        cannot reach a full score.
+        """
+        terms = query.split()
+        bm25 = self.bm25
+        scores = bm25.get_scores(terms)
+        missing_idf = math.log((bm25.corpus_size - 0.5) / 1.5) if bm25.corpus_size > 1 else 0.0
+        bound = (bm25.k1 + 1) * sum(
+            max(bm25.idf.get(term, missing_idf), 0.0) for term in terms
+        )
+        top = np.argsort(scores)[::-1][: self.k]
+        if bound <= 0:
+            return [(int(n), 0.0) for n in top]
+        return [(int(n), float(scores[n] / bound)) for n in top]
+
+    def stats(self) -> dict:
+        """Return the term statistics, enough to rebuild the index without the texts."""
+        bm25 = self.bm25
+        return {
+            "k1": bm25.k1,
+            "b": bm25.b,
+            "epsilon": bm25.epsilon,
+            "corpus_size": bm25.corpus_size,
+            "avgdl": bm25.avgdl,
+            "average_idf": bm25.average_idf,
+            "doc_len": bm25.doc_len,
+            "doc_freqs": bm25.doc_freqs,
+            "idf": bm25.idf,
+        }
+
+    @classmethod
+    def from_stats(cls, stats: dict, k: int = 5) -> "BM25Index":
+        """Rebuild an index from `stats` without tokenizing the texts again."""
+        bm25 = BM25Okapi.__new__(BM25Okapi)
+        bm25.tokenizer = None
+        for name, value in stats.items():
+            setattr(bm25, name, value)
+        index = cls.__new__(cls)
+        index.bm25 = bm25
+        index.k = k
+        index._nd = None
+        return index
+
+
+class SearchIndex(NamedTuple):
+    """The structures one search runs on, swapped as a whole when the index changes."""
+
+    chunks: ChunkStore
+    bm25: Optional[BM25Index]
+    dense: object
+
+
+class SearchResult(NamedTuple):
+    """The documents one search returns, with what it computed to find them."""
+
+    documents: List[Document]
+    # The cross-encoder score of the best candidate, None if there was none.
+    score: Optional[float]
+    # The normalized query embedding, None if the index was empty.
+    query_vector: Optional[np.ndarray]
+
+
 class CustomDocumentLoader:
-    def __init__(self, file_path: str):
+    def __init__(
+        self,
+        file_path: str,
+        splitter: str = "recursive",
+        strip_boilerplate: bool = False,
+        dedup_threshold: Optional[float] = None,
+    ):
+        """
+        Initialize a CustomDocumentLoader.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            splitter (str, optional): "recursive" for RecursiveCharacterTextSplitter, "offsets" for OffsetTextSplitter, which yields the same chunks without intermediate strings. Defaults to "recursive".
+            strip_boilerplate (bool, optional): Remove the page headers and footers repeated across the document before splitting. Defaults to False.
+            dedup_threshold (float, optional): Collapse chunks whose estimated Jaccard similarity to an earlier chunk reaches this, see `deduplicate`. Defaults to None (keep every chunk).
+        """
+        if splitter not in ("recursive", "offsets"):
+            raise ValueError(f"Unknown splitter: {splitter}")
+        self.file_path = file_path
+        self.splitter = splitter
         self.loader = PyMuPDFLoader(file_path)
+        self.strip_boilerplate = strip_boilerplate
+        self._boilerplate = None
+        self.near_duplicates = (
+            NearDuplicateIndex(dedup_threshold) if dedup_threshold is not None else None
+        )
+
+    def page_count(self) -> int:
+        """Return the number of pages in the PDF."""
+        with pymupdf.open(self.file_path) as pdf:
+            return pdf.page_count
+
+    def lazy_load_pages(self, start_page: int = 0) -> Iterator[Document]:
+        """Yield one Document per page, starting at `start_page`, without headers and footers if stripping is on."""
+        pages = itertools.islice(self.loader.lazy_load(), start_page, None)
+        if not self.strip_boilerplate:
+            return pages
+        boilerplate = self.boilerplate()
+        return (
+            Document(
+                page_content=strip_boilerplate(page.page_content, boilerplate),
+                metadata=page.metadata,
+            )
+            for page in pages
+        )
+
+    def boilerplate(self) -> Set[str]:
+        """Return the normalized header and footer lines of the PDF, found on first use."""
+        if self._boilerplate is None:
+            # Headers and footers repeat across the whole document, so every page is
+            # scanned once, even when pages are ingested in batches.
+            with pymupdf.open(self.file_path) as pdf:
+                self._boilerplate = find_boilerplate(page.get_text() for page in pdf)
+        return self._boilerplate
+
+    def deduplicate(
+        self, documents: List[Document], ids: List[str]
+    ) -> Tuple[List[Document], List[str], Dict[str, List[int]]]:
+        """
+        Drop chunks that nearly duplicate a chunk seen before, e.g., repeated notices or tables.
+
+        Chunks are compared by MinHash/LSH over word shingles against every chunk
+        seen by this loader, including those of earlier batches.
+
+        Args:
+            documents (List[Document]): The chunks.
+            ids (List[str]): The chunk IDs.
+
+        Returns:
+            Tuple[List[Document], List[str], Dict[str, List[int]]]: The chunks to index, their IDs, and the pages of the dropped chunks by the ID of the chunk they duplicate.
+        """
+        kept, kept_ids, duplicates = [], [], {}
+        for doc, chunk_id in zip(documents, ids):
+            canonical = self.near_duplicates.canonical(chunk_id, doc.page_content)
+            if canonical == chunk_id:
+                kept.append(doc)
+                kept_ids.append(chunk_id)
+            else:
+                duplicates.setdefault(canonical, []).append(doc.metadata.get("page", 0))
+        return kept, kept_ids, duplicates
 
     def split_and_create_documents(
-        self, chunk_size: int = 2000, chunk_overlap: int = 150
+        self,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 150,
+        pages: List[Document] = None,
     ) -> List[Document]:
-        """Split document into chunks and return Document objects."""
-        docs = self.loader.load()
+        """Split document (or the given pages) into chunks and return Document objects."""
+        docs = list(self.lazy_load_pages()) if pages is None else pages
+        if self.splitter == "offsets":
+            splitter = OffsetTextSplitter(chunk_size, chunk_overlap)
+            spans = splitter.split_pages([doc.page_content for doc in docs])
+            return self._span_documents(docs, spans)
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size, chunk_overlap=chunk_overlap
         )
         return splitter.split_documents(docs)
 
+    @staticmethod
+    def _span_documents(docs: List[Document], spans: List[PageSpan]) -> List[Document]:
+        # Page metadata holds only scalars, so a shallow copy per chunk is enough.
+        return [
+            Document(
+                page_content=docs[span.page].page_content[span.start : span.end],
+                metadata=dict(docs[span.page].metadata),
+            )
+            for span in spans
+        ]
+
+    def split_parent_child(
+        self,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 150,
+        child_chunk_size: int = 400,
+        child_chunk_overlap: int = 50,
+        pages: List[Document] = None,
+    ) -> Tuple[List[Document], Dict[str, Document]]:
+        """
+        Split document (or the given pages) into parent chunks and the small child chunks inside them.
+
+        Parents are identified by page and position within the page, and each child's
+        metadata holds its parent's ID in `parent_id`.
+
+        Returns:
+            Tuple[List[Document], Dict[str, Document]]: The child chunks and the parent chunks by ID.
+        """
+        if self.splitter == "offsets":
+            return self._split_parent_child_offsets(
+                chunk_size, chunk_overlap, child_chunk_size, child_chunk_overlap, pages
+            )
+        parents = self.split_and_create_documents(chunk_size, chunk_overlap, pages)
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=child_chunk_size, chunk_overlap=child_chunk_overlap
+        )
+        children = []
+        parents_by_id = {}
+        for parent_id, parent in zip(_chunk_ids(parents), parents):
+            parents_by_id[parent_id] = parent
+            for child in splitter.split_documents([parent]):
+                child.metadata["parent_id"] = parent_id
+                children.append(child)
+        return children, parents_by_id
+
+    def _split_parent_child_offsets(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        child_chunk_size: int,
+        child_chunk_overlap: int,
+        pages: List[Document] = None,
+    ) -> Tuple[List[Document], Dict[str, Document]]:
+        """Like `split_parent_child`, but children are split from the parent's range of the page text."""
+        docs = list(self.lazy_load_pages()) if pages is None else pages
+        parent_splitter = OffsetTextSplitter(chunk_size, chunk_overlap)
+        child_splitter = OffsetTextSplitter(child_chunk_size, child_chunk_overlap)
+        parent_spans = parent_splitter.split_pages([doc.page_content for doc in docs])
+        parents = self._span_documents(docs, parent_spans)
+        children = []
+        parents_by_id = {}
+        for parent_id, parent, span in zip(_chunk_ids(parents), parents, parent_spans):
+            parents_by_id[parent_id] = parent
+            text = docs[span.page].page_content
+            child_spans = [
+                PageSpan(span.page, start, end)
+                for start, end in child_splitter.split_spans(text, span.start, span.end)
+            ]
+            for child in self._span_documents(docs, child_spans):
+                child.metadata["parent_id"] = parent_id
+                children.append(child)
+        return children, parents_by_id
+
 
 class RetrieveWithReranker:
     def __init__(
-        self, file_path: str, reranker, embedding, persist_directory: str = "./chromadb"
+        self,
+        file_path: str,
+        reranker,
+        embedding,
+        persist_directory: str = "./chromadb",
+        vector_store: str = "chroma",
+        index_directory: str = "./vector_indexes",
+        index_dtype: str = "float32",
+        mmr: str = "vectorized",
+        k: int = 10,
+        fetch_k: int = 50,
+        rerank: str = "full",
+        cascade_size: int = 4,
+        cascade_margin: float = 0.3,
+        rrf_k: int = 60,
+        keyphrase_index: bool = True,
+        chunking: str = "flat",
+        child_chunk_size: int = 400,
+        child_chunk_overlap: int = 50,
+        splitter: str = "recursive",
+        strip_boilerplate: bool = False,
+        dedup_threshold: Optional[float] = None,
+        summarizer: Optional[SectionSummarizer] = None,
+        ingest: bool = True,
     ):
         """
         Initialize a RetrieveWithReranker instance.
@@ -55,38 +495,466 @@ class RetrieveWithReranker:
             reranker: The reranker model to use.
             embedding: The embedding model to use.
             persist_directory (str, optional): The directory to store the Chroma collection. Defaults to "./chromadb".
+            vector_store (str, optional): The vector store backend, "chroma" or "numpy". Defaults to "chroma".
+            index_directory (str, optional): The directory to store NumpyVectorStore indexes. Defaults to "./vector_indexes".
+            index_dtype (str, optional): The NumpyVectorStore matrix dtype, "float32" or "float16". Defaults to "float32".
+            mmr (str, optional): "vectorized" to run MMR over embeddings resident in memory, "store" to use the vector store's own MMR. Defaults to "vectorized".
+            k (int, optional): The number of documents returned by the MMR search. Defaults to 10.
+            fetch_k (int, optional): The number of candidates considered by the MMR search. Defaults to 50.
+            rerank (str, optional): "full" to cross-encode every candidate, "cascade" to cross-encode only the best candidates after reciprocal rank fusion. Defaults to "full".
+            cascade_size (int, optional): The number of fused candidates sent to the cross-encoder in cascade mode. Defaults to 4.
+            cascade_margin (float, optional): The normalized fusion margin above which only the first candidate is cross-encoded. Defaults to 0.3.
+            rrf_k (int, optional): The reciprocal rank fusion constant. Defaults to 60.
+            keyphrase_index (bool, optional): Build a keyphrase vocabulary at ingest for fast keyword extraction and selection. Defaults to True.
+            chunking (str, optional): "flat" to index 2000-character chunks, "parent_child" to index small child chunks and return their parent chunks. Defaults to "flat".
+            child_chunk_size (int, optional): The child chunk size in "parent_child" mode. Defaults to 400.
+            child_chunk_overlap (int, optional): The child chunk overlap in "parent_child" mode. Defaults to 50.
+            splitter (str, optional): "recursive" or "offsets", see CustomDocumentLoader. Both yield the same chunks. Defaults to "recursive".
+            strip_boilerplate (bool, optional): Remove repeated page headers and footers before splitting. Defaults to False.
+            dedup_threshold (float, optional): Index one canonical chunk for chunks whose estimated Jaccard similarity reaches this, e.g., 0.8, and record the pages of the others. Defaults to None (index every chunk).
+            summarizer (SectionSummarizer, optional): Builds a tree of section summaries at ingest, indexed alongside the chunks. Defaults to None (no summaries).
+            ingest (bool, optional): Ingest the whole PDF now if it is not indexed yet. If False, open whatever is indexed and let the caller add pages with `ingest_pages`. Defaults to True.
         """
+        if rerank not in ("full", "cascade"):
+            raise ValueError(f"Unknown rerank mode: {rerank}")
+        if chunking not in ("flat", "parent_child"):
+            raise ValueError(f"Unknown chunking mode: {chunking}")
+        if mmr not in ("vectorized", "store"):
+            raise ValueError(f"Unknown MMR mode: {mmr}")
+        self.file_path = file_path
         self.reranker = reranker
-        loader = CustomDocumentLoader(file_path)
-        self.collection_name = reformat_collection_name(file_path)
-        self.vector_store = Chroma(
-            collection_name=self.collection_name,
-            persist_directory=persist_directory,
-            embedding_function=embedding,
-        )
-        documents = loader.split_and_create_documents()
-        if not self.vector_store.get()["ids"]:
-            self.vector_store.add_documents(documents)
-        self.chroma_retriever = self.vector_store.as_retriever(
-            search_type="mmr", search_kwargs={"k": 10, "fetch_k": 50}
-        )
-        self.bm25_retriever = BM25Retriever.from_documents(documents)
-        self.bm25_retriever.k = 5 
-
-    def _rerank(self, query: str, documents: List, top_k: int = 1) -> List:
-        """Rerank documents or strings based on relevance to the query."""
-        contents = []
-        if not documents:
-            return []
-        if isinstance(documents[0], Document):
-            contents = [doc.page_content for doc in documents]
+        self.embedding = embedding
+        self.rerank_mode = rerank
+        self.cascade_size = cascade_size
+        self.cascade_margin = cascade_margin
+        self.rrf_k = rrf_k
+        self.mmr = mmr
+        self.k = k
+        self.fetch_k = fetch_k
+        self.chunking = chunking
+        self.child_chunk_size = child_chunk_size
+        self.child_chunk_overlap = child_chunk_overlap
+        self.loader = CustomDocumentLoader(
+            file_path, splitter, strip_boilerplate, dedup_threshold
+        )
+        # Child chunks live in their own collection so both modes can coexist.
+        flat_name, parent_child_name = collection_names(file_path)
+        self.collection_name = parent_child_name if chunking == "parent_child" else flat_name
+        self.index_path = Path(index_directory) / self.collection_name
+        self.vector_store = self._init_vector_store(
+            vector_store, embedding, persist_directory, index_directory, index_dtype
+        )
+        # A Chroma collection's chunks and embeddings are mirrored into memory-mapped
+        # files, so searches never copy the whole collection into every process.
+        self.chunk_mirror = (
+            None
+            if isinstance(self.vector_store, NumpyVectorStore)
+            else NumpyVectorStore(
+                directory=str(self.index_path), embedding=embedding, dtype=index_dtype
+            )
+        )
+        self.parents = None
+        if chunking == "parent_child":
+            parents_path = self.index_path / PARENTS_FILE
+            self.parents = _load_parents(parents_path) if parents_path.exists() else {}
+        self.duplicates = _load_duplicates(self.index_path / DUPLICATES_FILE)
+        self._near_duplicates_seeded = False
+        self.summarizer = summarizer
+        self.keyphrase_index_enabled = keyphrase_index
+        self.keyphrase_index = (
+            KeyphraseIndex.load(self.index_path, embedding) if keyphrase_index else None
+        )
+        self.search_index = SearchIndex(ChunkStore.build([], [], []), None, None)
+        self._version = None
+        self._ingest_lock = threading.Lock()
+        self._search_flight = SingleFlight()
+        if ingest and self._index_size() == 0:
+            self.ingest_pages(list(self.loader.lazy_load_pages()))
+            self.finalize_ingest()
         else:
-            contents = documents
-            
-        scores = self.reranker.rerank(query, contents)
-        ranked = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)
+            self._refresh()
+            if ingest and self.needs_finalize():
+                self.finalize_ingest()
+
+    def _index_size(self) -> int:
+        if isinstance(self.vector_store, NumpyVectorStore):
+            return len(self.vector_store)
+        return self.vector_store._collection.count()
 
-        return [documents[i] for i, score in ranked[:top_k] if score > 0]
+    def ingest_pages(self, pages: List[Document]) -> int:
+        """
+        Split, embed and index a batch of pages, then make them searchable.
+
+        Chunk IDs are derived from page numbers, so ingesting the same pages again
+        after an interruption replaces their chunks instead of duplicating them.
+        With deduplication on, chunks (parent chunks in "parent_child" mode) that
+        nearly duplicate an indexed chunk are not indexed; their pages are recorded
+        on the canonical chunk instead.
+
+        Args:
+            pages (List[Document]): One Document per page, as loaded by PyMuPDFLoader.
+
+        Returns:
+            int: The number of chunks indexed.
+        """
+        with self._ingest_lock:
+            if self.chunking == "parent_child":
+                documents, parents = self.loader.split_parent_child(
+                    child_chunk_size=self.child_chunk_size,
+                    child_chunk_overlap=self.child_chunk_overlap,
+                    pages=pages,
+                )
+                ids = [
+                    f"{doc.metadata['parent_id']}-{child_id}"
+                    for doc, child_id in zip(documents, _chunk_ids(documents))
+                ]
+                if self.loader.near_duplicates is not None:
+                    self._seed_near_duplicates()
+                    _, parent_ids, duplicates = self.loader.deduplicate(
+                        list(parents.values()), list(parents)
+                    )
+                    parents = {parent_id: parents[parent_id] for parent_id in parent_ids}
+                    kept = [
+                        (doc, chunk_id)
+                        for doc, chunk_id in zip(documents, ids)
+                        if doc.metadata["parent_id"] in parents
+                    ]
+                    documents = [doc for doc, _ in kept]
+                    ids = [chunk_id for _, chunk_id in kept]
+                    self._add_duplicates(duplicates)
+            else:
+                documents = self.loader.split_and_create_documents(pages=pages)
+                ids = _chunk_ids(documents)
+                if self.loader.near_duplicates is not None:
+                    self._seed_near_duplicates()
+                    documents, ids, duplicates = self.loader.deduplicate(documents, ids)
+                    self._add_duplicates(duplicates)
+            if documents:
+                texts = [doc.page_content for doc in documents]
+                self._store_chunks(
+                    self.embedding.embed_documents(texts),
+                    texts,
+                    [doc.metadata for doc in documents],
+                    ids,
+                )
+            if self.parents is not None:
+                self.parents = {**self.parents, **parents}
+                _save_parents(self.index_path / PARENTS_FILE, self.parents)
+            self._refresh()
+            return len(documents)
+
+    def _seed_near_duplicates(self) -> None:
+        """Let the loader compare new chunks with those indexed before, e.g., by an interrupted job."""
+        if self._near_duplicates_seeded:
+            return
+        self._near_duplicates_seeded = True
+        if self.parents is not None:
+            canonical = {
+                parent_id: parent.page_content
+                for parent_id, parent in self.parents.items()
+                if not is_summary(parent.metadata)
+            }
+        else:
+            chunks = self.search_index.chunks
+            canonical = {
+                chunks.ids[n]: chunks.get_text(n)
+                for n in range(len(chunks))
+                if not chunks.ids[n].startswith(SUMMARY_ID_PREFIX)
+            }
+        self.loader.near_duplicates.extend(list(canonical), canonical.values())
+
+    def _add_duplicates(self, duplicates: Dict[str, List[int]]) -> None:
+        if not duplicates:
+            return
+        merged = dict(self.duplicates)
+        for chunk_id, pages in duplicates.items():
+            merged[chunk_id] = sorted({*merged.get(chunk_id, []), *pages})
+        self.duplicates = merged
+        _save_duplicates(self.index_path / DUPLICATES_FILE, merged)
+
+    def with_pages(self, doc: Document, chunk_id: str) -> Document:
+        """Add the pages of the chunks collapsed into a canonical chunk to its metadata as `pages`."""
+        if chunk_id not in self.duplicates:
+            return doc
+        pages = sorted({doc.metadata.get("page", 0), *self.duplicates[chunk_id]})
+        return Document(page_content=doc.page_content, metadata={**doc.metadata, "pages": pages})
+
+    def add_embedded_chunks(
+        self,
+        vectors: np.ndarray,
+        texts: List[str],
+        metadatas: List[dict],
+        ids: List[str],
+        parents: Optional[Dict[str, Document]] = None,
+        keyphrase_index: Optional[KeyphraseIndex] = None,
+        bm25: Optional[BM25Index] = None,
+        duplicates: Optional[Dict[str, List[int]]] = None,
+    ) -> int:
+        """
+        Index chunks that were split and embedded elsewhere, e.g., imported from a bundle.
+
+        Args:
+            vectors (np.ndarray): The chunk embeddings, one row per chunk.
+            texts (List[str]): The chunk texts.
+            metadatas (List[dict]): The chunk metadata.
+            ids (List[str]): The chunk IDs; chunks already indexed under these IDs are replaced.
+            parents (Dict[str, Document], optional): The parent chunks by ID in "parent_child" mode. Defaults to None.
+            keyphrase_index (KeyphraseIndex, optional): A keyphrase index to save instead of building one. Defaults to None.
+            bm25 (BM25Index, optional): A BM25 index over exactly these chunks in this order, used if the index holds nothing else. Defaults to None.
+            duplicates (Dict[str, List[int]], optional): The pages of near-duplicate chunks by canonical chunk ID. Defaults to None.
+
+        Returns:
+            int: The number of chunks indexed.
+        """
+        with self._ingest_lock:
+            self._store_chunks(vectors, texts, metadatas, ids)
+            if parents and self.parents is not None:
+                self.parents = {**self.parents, **parents}
+                _save_parents(self.index_path / PARENTS_FILE, self.parents)
+            if keyphrase_index is not None and self.keyphrase_index_enabled:
+                keyphrase_index.save(self.index_path)
+                self.keyphrase_index = keyphrase_index
+            self._add_duplicates(duplicates)
+            self._refresh(bm25, ids)
+            return len(ids)
+
+    def _store_chunks(
+        self, vectors, texts: List[str], metadatas: List[dict], ids: List[str]
+    ) -> None:
+        """Write embedded chunks to the vector store and, for Chroma, to its mirror."""
+        if isinstance(self.vector_store, NumpyVectorStore):
+            self.vector_store.add_embeddings(vectors, texts, metadatas, ids)
+            return
+        self._sync_chunk_mirror()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for i in range(0, len(ids), CHROMA_BATCH_SIZE):
+            batch = slice(i, i + CHROMA_BATCH_SIZE)
+            self.vector_store._collection.upsert(
+                ids=ids[batch],
+                embeddings=vectors[batch].tolist(),
+                documents=texts[batch],
+                # Chroma rejects empty metadata dicts.
+                metadatas=[metadata or None for metadata in metadatas[batch]],
+            )
+        # Written after the collection: searches read the mirror.
+        self.chunk_mirror.add_embeddings(vectors, texts, metadatas, ids)
+
+    def _chunk_mirror_missing(self) -> bool:
+        """Whether a Chroma collection was indexed before its chunks were mirrored."""
+        return (
+            self.chunk_mirror is not None
+            and not len(self.chunk_mirror)
+            and self._index_size() > 0
+        )
+
+    def _sync_chunk_mirror(self) -> None:
+        """Copy a Chroma collection indexed before its chunks were mirrored into the mirror."""
+        if not self._chunk_mirror_missing():
+            return
+        data = self.vector_store.get(include=["embeddings", "documents", "metadatas"])
+        self.chunk_mirror.add_embeddings(
+            data["embeddings"],
+            data["documents"],
+            [metadata or {} for metadata in data["metadatas"]],
+            data["ids"],
+        )
+
+    def finalize_ingest(self) -> None:
+        """
+        Build the indexes that need the whole document, e.g., the keyphrase index and section summaries.
+
+        The keyphrase index is built first, from the document's own chunks. Section
+        summaries need LLM calls, so a failure leaves them missing without losing the
+        other indexes, and `needs_finalize` reports them for a later retry.
+        """
+        with self._ingest_lock:
+            if self._chunk_mirror_missing():
+                self._sync_chunk_mirror()
+                self._refresh()
+            if self.keyphrase_index_enabled:
+                chunks = self.search_index.chunks
+                keyphrase_index = KeyphraseIndex.build(
+                    [
+                        text
+                        for chunk_id, text in zip(chunks.ids, chunks.texts())
+                        if not chunk_id.startswith(SUMMARY_ID_PREFIX)
+                    ],
+                    self.embedding,
+                )
+                keyphrase_index.save(self.index_path)
+                self.keyphrase_index = keyphrase_index
+                self._version = self._index_version()
+            if self.summarizer is not None and not self.has_summaries():
+                try:
+                    self._add_section_summaries()
+                except Exception:
+                    logger.warning(
+                        "Section summaries of %s failed, will retry", self.file_path, exc_info=True
+                    )
+
+    def needs_finalize(self) -> bool:
+        """Whether indexed chunks lack the indexes built by `finalize_ingest`, e.g., a collection indexed before they existed."""
+        if self._chunk_mirror_missing():
+            return True
+        if not len(self.search_index.chunks):
+            return False
+        missing_keyphrases = self.keyphrase_index_enabled and self.keyphrase_index is None
+        missing_summaries = self.summarizer is not None and not self.has_summaries()
+        return missing_keyphrases or missing_summaries
+
+    def has_summaries(self) -> bool:
+        """Whether the index holds section summaries."""
+        return any(
+            chunk_id.startswith(SUMMARY_ID_PREFIX)
+            for chunk_id in self.search_index.chunks.ids
+        )
+
+    def _add_section_summaries(self) -> None:
+        """Summarize the whole document and index the summary nodes like chunks."""
+        nodes = self.summarizer.summarize(list(self.loader.lazy_load_pages()))
+        if not nodes:
+            return
+        if self.parents is not None:
+            # A summary node is its own parent, so it is returned whole.
+            for node in nodes:
+                node.metadata["parent_id"] = node.id
+            self.parents = {**self.parents, **{node.id: node for node in nodes}}
+            _save_parents(self.index_path / PARENTS_FILE, self.parents)
+        texts = [node.page_content for node in nodes]
+        self._store_chunks(
+            self.embedding.embed_documents(texts),
+            texts,
+            [node.metadata for node in nodes],
+            [node.id for node in nodes],
+        )
+        self._refresh()
+
+    def index_version(self) -> list:
+        """Return a stamp of the indexed content that changes whenever chunks are added or the PDF is replaced."""
+        source = os.stat(self.file_path).st_mtime_ns if os.path.exists(self.file_path) else None
+        return [source, *self._index_version()]
+
+    def _index_version(self) -> tuple:
+        if isinstance(self.vector_store, NumpyVectorStore):
+            store_version = self.vector_store.version()
+        else:
+            store_version = (
+                self.vector_store._collection.count(),
+                self.chunk_mirror.version(),
+            )
+        stamps = []
+        for path in (
+            self.index_path / PARENTS_FILE,
+            self.index_path / KEYPHRASE_EMBEDDINGS_FILE,
+            self.index_path / DUPLICATES_FILE,
+        ):
+            stamps.append(path.stat().st_mtime_ns if path.exists() else None)
+        return (store_version, *stamps)
+
+    def refresh_if_changed(self) -> None:
+        """Pick up chunks indexed since the last refresh, e.g., by a background ingestion job."""
+        if self._index_version() == self._version:
+            return
+        with self._ingest_lock:
+            if isinstance(self.vector_store, NumpyVectorStore):
+                self.vector_store.reload()
+            parents_path = self.index_path / PARENTS_FILE
+            if self.parents is not None and parents_path.exists():
+                self.parents = _load_parents(parents_path)
+            self.duplicates = _load_duplicates(self.index_path / DUPLICATES_FILE)
+            if self.keyphrase_index_enabled:
+                self.keyphrase_index = KeyphraseIndex.load(self.index_path, self.embedding)
+            self._refresh()
+
+    def _refresh(
+        self, bm25: Optional[BM25Index] = None, bm25_ids: Optional[List[str]] = None
+    ) -> None:
+        """Rebuild the in-memory search structures from the vector store.
+
+        A prebuilt `bm25` index is used only if `bm25_ids` matches the stored chunks.
+        """
+        version = self._index_version()
+        store = self.vector_store
+        if self.chunk_mirror is not None:
+            self.chunk_mirror.reload()
+        if isinstance(store, NumpyVectorStore):
+            chunks = store.chunks
+        elif len(self.chunk_mirror):
+            chunks = self.chunk_mirror.chunks
+            if self.mmr == "vectorized":
+                store = self.chunk_mirror
+        else:
+            # Not mirrored yet: copy the collection until `finalize_ingest` mirrors it.
+            include = ["documents", "metadatas"]
+            if self.mmr == "vectorized":
+                include.append("embeddings")
+            data = store.get(include=include)
+            metadatas = [metadata or {} for metadata in data["metadatas"]]
+            if self.mmr == "vectorized":
+                # Keep the collection's embeddings resident so MMR never round-trips to the store.
+                store = NumpyVectorStore(directory=None, embedding=self.embedding)
+                if data["ids"]:
+                    store.add_embeddings(
+                        data["embeddings"], data["documents"], metadatas, data["ids"]
+                    )
+                chunks = store.chunks
+            else:
+                chunks = ChunkStore.build(data["documents"], metadatas, data["ids"])
+        if bm25 is None or list(chunks.ids) != list(bm25_ids):
+            bm25 = self._bm25_index(chunks)
+        self.search_index = SearchIndex(chunks, bm25, store)
+        self._version = version
+
+    def _bm25_index(self, chunks: ChunkStore) -> Optional[BM25Index]:
+        """Return a BM25 index over `chunks`, extending the current one if they only append to its chunks."""
+        current = self.search_index
+        if not len(chunks):
+            return None
+        if (
+            current.bm25 is not None
+            and chunks.base is not None
+            and chunks.base == current.chunks.base
+            and len(chunks) >= len(current.chunks)
+        ):
+            if len(chunks) == len(current.chunks):
+                return current.bm25
+            return current.bm25.extend(
+                chunks.get_text(n) for n in range(len(current.chunks), len(chunks))
+            )
+        return BM25Index(chunks.texts())
+
+    def _init_vector_store(
+        self,
+        vector_store: str,
+        embedding,
+        persist_directory: str,
+        index_directory: str,
+        index_dtype: str,
+    ):
+        if vector_store == "chroma":
+            return Chroma(
+                collection_name=self.collection_name,
+                persist_directory=persist_directory,
+                embedding_function=embedding,
+            )
+        if vector_store == "numpy":
+            return NumpyVectorStore(
+                directory=f"{index_directory}/{self.collection_name}",
+                embedding=embedding,
+                dtype=index_dtype,
+            )
+        raise ValueError(f"Unknown vector store backend: {vector_store}")
+
+    def _rerank(
+        self, index: SearchIndex, query: str, chunk_ids: List[int], top_k: int = 1
+    ) -> Tuple[List[int], Optional[float]]:
+        """Rerank chunks based on relevance to the query, also returning the best score."""
+        if not chunk_ids:
+            return [], None
+        scores = list(
+            self.reranker.rerank(query, [index.chunks.get_text(n) for n in chunk_ids])
+        )
+        return _top_scored(chunk_ids, scores, top_k), max(scores)
 
     def search(
         self, query: str, keywords: List[str] = None, top_k: int = 1
@@ -107,22 +975,237 @@ class RetrieveWithReranker:
         Returns:
             List[Document]: The retrieved documents.
         """
-        bm25_docs = []
-        if keywords:
-            keyword_query = (
-                " ".join(self._rerank(query, keywords, top_k=2))
-                if len(keywords) > 1
-                else keywords[0]
-            )
-            bm25_docs = self.bm25_retriever.invoke(keyword_query)
+        return list(self.search_scored(query, keywords, top_k).documents)
+
+    def search_scored(
+        self, query: str, keywords: List[str] = None, top_k: int = 1
+    ) -> SearchResult:
+        """
+        Retrieve documents like `search`, also returning the best rerank score and the query embedding.
 
-        # Lấy tài liệu từ Chroma
-        chroma_docs = self.chroma_retriever.invoke(query)
+        Args:
+            query (str): The query string.
+            keywords (List[str], optional): The keywords to search for. Defaults to None.
+            top_k (int, optional): The number of documents to return. Defaults to 1.
 
-        # Gộp và loại trùng lặp
-        all_docs = list(
-            {doc.page_content: doc for doc in bm25_docs + chroma_docs}.values()
+        Returns:
+            SearchResult: The retrieved documents, the best cross-encoder score and the normalized query embedding.
+        """
+        self.refresh_if_changed()
+        # Identical searches already in flight share one execution.
+        key = (query, tuple(keywords or ()), top_k)
+        return self._search_flight.do(key, self._search, query, keywords, top_k)
+
+    def _search(
+        self, query: str, keywords: List[str] = None, top_k: int = 1
+    ) -> SearchResult:
+        index = self.search_index
+        query_vector = self._embed_query(query) if len(index.chunks) else None
+        bm25_ids, dense_ids = self._candidates(
+            index, query, keywords, query_vector=query_vector
         )
+        chunk_ids = self._merge_candidates(bm25_ids, dense_ids, top_k)
 
         # Rerank toàn bộ và trả về top_k
-        return self._rerank(query, all_docs, top_k=top_k)
+        ranked, score = self._rerank(
+            index, query, chunk_ids, top_k=self._rerank_top_k(chunk_ids, top_k)
+        )
+        return SearchResult(self._to_documents(index, ranked, top_k), score, query_vector)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def _rerank_top_k(self, chunk_ids: List[int], top_k: int) -> int:
+        # Several child hits can share a parent, so keep every child in parent_child mode.
+        return top_k if self.parents is None else len(chunk_ids)
+
+    def _to_documents(
+        self, index: SearchIndex, chunk_ids: List[int], top_k: int
+    ) -> List[Document]:
+        """Materialize the top_k ranked chunks, replacing child chunks by their distinct parents."""
+        if self.parents is None:
+            return [
+                self.with_pages(index.chunks.document(n), index.chunks.ids[n])
+                for n in chunk_ids[:top_k]
+            ]
+        parents = {}
+        for n in chunk_ids:
+            parent_id = index.chunks.metadata(n)["parent_id"]
+            parents.setdefault(parent_id, self.parents[parent_id])
+            if len(parents) == top_k:
+                break
+        return [self.with_pages(parent, parent_id) for parent_id, parent in parents.items()]
+
+    def search_many(
+        self,
+        queries: List[str],
+        keywords: List[str] = None,
+        top_k: int = 1,
+        batch_size: int = 256,
+    ) -> List[List[Document]]:
+        """
+        Retrieve documents for several queries, scoring them in one cross-encoder batch.
+
+        Candidates are gathered for every query as in `search`, duplicate
+        (query, chunk) pairs are scored once, and all pairs go through the
+        cross-encoder together instead of in one small batch per query.
+
+        Args:
+            queries (List[str]): The query strings.
+            keywords (List[str], optional): The keywords to search for. Defaults to None.
+            top_k (int, optional): The number of documents to return per query. Defaults to 1.
+            batch_size (int, optional): The cross-encoder batch size. Defaults to 256.
+
+        Returns:
+            List[List[Document]]: The retrieved documents for each query, in query order.
+        """
+        if not queries:
+            return []
+        self.refresh_if_changed()
+        keyword_queries = [None] * len(queries)
+        if keywords and len(keywords) > 1:
+            ranked = [
+                self.keyphrase_index.rank(q, keywords) if self.keyphrase_index else None
+                for q in queries
+            ]
+            unranked = [i for i, r in enumerate(ranked) if r is None]
+            scores = self._score_pairs(
+                [(queries[i], k) for i in unranked for k in keywords], batch_size
+            )
+            for n, i in enumerate(unranked):
+                query_scores = scores[n * len(keywords) : (n + 1) * len(keywords)]
+                ranked[i] = _top_scored(keywords, query_scores, 2)
+            keyword_queries = [" ".join(r) for r in ranked]
+        elif keywords:
+            keyword_queries = [keywords[0]] * len(queries)
+
+        index = self.search_index
+        candidates = []
+        for query, keyword_query in zip(queries, keyword_queries):
+            bm25_ids, dense_ids = self._candidates(
+                index, query, keyword_query=keyword_query
+            )
+            candidates.append(self._merge_candidates(bm25_ids, dense_ids, top_k))
+
+        pairs = list(
+            dict.fromkeys((q, n) for q, chunk_ids in zip(queries, candidates) for n in chunk_ids)
+        )
+        scores = self._score_pairs(
+            [(q, index.chunks.get_text(n)) for q, n in pairs], batch_size
+        )
+        pair_scores = dict(zip(pairs, scores))
+        return [
+            self._to_documents(
+                index,
+                _top_scored(
+                    chunk_ids,
+                    [pair_scores[(q, n)] for n in chunk_ids],
+                    self._rerank_top_k(chunk_ids, top_k),
+                ),
+                top_k,
+            )
+            for q, chunk_ids in zip(queries, candidates)
+        ]
+
+    def _score_pairs(self, pairs: List[Tuple[str, str]], batch_size: int) -> List[float]:
+        if not pairs:
+            return []
+        return list(self.reranker.rerank_pairs(pairs, batch_size=batch_size))
+
+    def _candidates(
+        self,
+        index: SearchIndex,
+        query: str,
+        keywords: List[str] = None,
+        keyword_query: str = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> Tuple[List[int], List[int]]:
+        """Return the ranked BM25 and vector store chunk IDs for the query."""
+        bm25_ids = []
+        if keyword_query is None and keywords:
+            keyword_query = " ".join(self._select_keywords(query, keywords))
+        if not len(index.chunks):
+            return [], []
+        if keyword_query is not None:
+            bm25_ids = self._bm25_ids(index, keyword_query)
+
+        # Lấy tài liệu từ vector store
+        if query_vector is None:
+            query_vector = self._embed_query(query)
+        dense_ids = self._dense_ids(index, query_vector)
+        return bm25_ids, dense_ids
+
+    def _bm25_ids(self, index: SearchIndex, keyword_query: str) -> List[int]:
+        return index.bm25.search(keyword_query)
+
+    def _dense_ids(self, index: SearchIndex, query_vector: np.ndarray) -> List[int]:
+        """Select chunks by maximal marginal relevance to a normalized query vector."""
+        if isinstance(index.dense, NumpyVectorStore):
+            return [
+                n
+                for n, _ in index.dense.max_marginal_relevance_by_vector(
+                    query_vector, k=self.k, fetch_k=self.fetch_k
+                )
+            ]
+        docs = index.dense.max_marginal_relevance_search_by_vector(
+            query_vector.tolist(), k=self.k, fetch_k=self.fetch_k
+        )
+        positions = index.chunks.positions
+        return [positions[doc.id] for doc in docs if doc.id in positions]
+
+    def _dense_scored(
+        self, index: SearchIndex, query_vector: np.ndarray
+    ) -> List[Tuple[int, float]]:
+        """Like `_dense_ids`, also returning each chunk's cosine similarity to the query vector."""
+        if isinstance(index.dense, NumpyVectorStore):
+            return index.dense.max_marginal_relevance_by_vector(
+                query_vector, k=self.k, fetch_k=self.fetch_k
+            )
+        positions = self._dense_ids(index, query_vector)
+        if not positions:
+            return []
+        ids = [index.chunks.ids[n] for n in positions]
+        stored = index.dense._collection.get(ids=ids, include=["embeddings"])
+        vectors = dict(zip(stored["ids"], stored["embeddings"]))
+        scored = []
+        for n, chunk_id in zip(positions, ids):
+            vector = np.asarray(vectors[chunk_id], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            scored.append((n, float(vector @ query_vector / norm) if norm else 0.0))
+        return scored
+
+    def _select_keywords(self, query: str, keywords: List[str]) -> List[str]:
+        """Pick the two keywords most relevant to the query for BM25."""
+        if len(keywords) == 1:
+            return keywords
+        ranked = None
+        if self.keyphrase_index:
+            ranked = self.keyphrase_index.rank(query, keywords, top_n=2)
+        if ranked is None:
+            ranked = _top_scored(keywords, self.reranker.rerank(query, keywords), 2)
+        return ranked
+
+    def _merge_candidates(
+        self, bm25_ids: List[int], dense_ids: List[int], top_k: int
+    ) -> List[int]:
+        if self.rerank_mode == "cascade":
+            return self._cascade_candidates(bm25_ids, dense_ids, top_k)
+        # Gộp và loại trùng lặp
+        return list(dict.fromkeys(bm25_ids + dense_ids))
+
+    def _cascade_candidates(
+        self, bm25_ids: List[int], dense_ids: List[int], top_k: int
+    ) -> List[int]:
+        """Pick the few fused candidates worth sending to the cross-encoder."""
+        rankings = [ids for ids in (bm25_ids, dense_ids) if ids]
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        if not fused:
+            return []
+        # Normalize by the best possible fused score so the margin is in [0, 1].
+        best_possible = len(rankings) / (self.rrf_k + 1)
+        margin = (fused[0][1] - (fused[1][1] if len(fused) > 1 else 0)) / best_possible
+        if top_k == 1 and margin >= self.cascade_margin:
+            # The cross-encoder still scores the winner so unrelated questions are rejected.
+            return [fused[0][0]]
+        return [n for n, _ in fused[: max(self.cascade_size, top_k)]]
@@ -0,0 +1,349 @@
+"""Local classifier for the routing decisions of QuestionHandler.
+
+QuestionHandler asks the LLM whether the first retrieved document answers the
+question (`knowledge_evaluator_prompt`) and, if not, whether sub-questions can
+answer it (`sub_questions_evaluator_prompt`). Every such decision is logged with
+its features: the question embedding from the loaded FastEmbed model and the
+cross-encoder score retrieval gave the document. A softmax regression trained on
+the log predicts "answer", "decompose" or "reason" in well under a millisecond,
+and the LLM is asked only when the prediction is not confident.
+
+Usage:
+    python routing_classifier.py train [--log routing_decisions.jsonl] [--model routing_model.npz]
+    python routing_classifier.py report [--log routing_decisions.jsonl] [--folds 5] [--confidence 0.9]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from filelock import FileLock
+
+ROUTES = ("answer", "decompose", "reason")
+ANSWER, DECOMPOSE, REASON = range(len(ROUTES))
+
+GRADE = "grade"
+ROUTE = "route"
+
+LOG_FILE = "routing_decisions.jsonl"
+MODEL_FILE = "routing_model.npz"
+
+
+def routing_features(
+    question_embedding: Sequence[float], rerank_score: float, question: str, document: str
+) -> List[float]:
+    """
+    Build the classifier features of a question and its retrieved document.
+
+    Args:
+        question_embedding (Sequence[float]): The question's embedding.
+        rerank_score (float): The cross-encoder score the retriever gave its best chunk for the query.
+        question (str): The question.
+        document (str): The retrieved document as formatted for the prompt.
+
+    Returns:
+        List[float]: The normalized embedding followed by the score and length features.
+    """
+    vector = np.asarray(question_embedding, dtype=np.float64)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return [
+        *vector.tolist(),
+        float(rerank_score),
+        math.log1p(len(question.split())),
+        math.log1p(len(document) / 1000),
+    ]
+
+
+class RoutingLog:
+    """Append-only JSONL log of the routing decisions made by the LLM.
+
+    Each line holds the stage ("grade" or "route"), the LLM's decision (True for
+    YES), the features and the embedding model that produced them. Appends are
+    made under a file lock, so the workers of the HTTP API can share one log.
+    """
+
+    def __init__(self, path: str = LOG_FILE):
+        self.path = path
+        self._lock = FileLock(f"{path}.lock")
+
+    def append(
+        self,
+        stage: str,
+        decision: bool,
+        features: List[float],
+        question: str,
+        embedding_model: Optional[str],
+    ) -> None:
+        record = {
+            "stage": stage,
+            "decision": decision,
+            "question": question,
+            "embedding_model": embedding_model,
+            "features": features,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def records(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _targets(records: Sequence[dict]) -> np.ndarray:
+    """Return the set of routes each decision allows, as a 0/1 mask per record.
+
+    A grader YES means "answer". A grader NO only rules out "answer": which of the
+    other routes the question needed is decided later by the router, if at all.
+    """
+    masks = np.zeros((len(records), len(ROUTES)))
+    for i, record in enumerate(records):
+        if record["stage"] == GRADE:
+            masks[i] = [1, 0, 0] if record["decision"] else [0, 1, 1]
+        else:
+            masks[i] = [0, 1, 0] if record["decision"] else [0, 0, 1]
+    return masks
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class SoftmaxRouter:
+    """Softmax regression over the three routes."""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        embedding_model: Optional[str] = None,
+    ):
+        """
+        Initialize a SoftmaxRouter. Use `fit` or `load` instead of calling this directly.
+
+        Args:
+            weights (np.ndarray): The (features, routes) weight matrix over standardized features.
+            bias (np.ndarray): The per-route bias.
+            mean (np.ndarray): The feature means used for standardization.
+            scale (np.ndarray): The feature standard deviations used for standardization.
+            embedding_model (str, optional): The embedding model the features were computed with. Defaults to None.
+        """
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.embedding_model = embedding_model
+
+    @classmethod
+    def fit(
+        cls,
+        features: np.ndarray,
+        targets: np.ndarray,
+        embedding_model: Optional[str] = None,
+        l2: float = 1e-3,
+        epochs: int = 500,
+        learning_rate: float = 0.5,
+    ) -> "SoftmaxRouter":
+        """
+        Train by full-batch gradient descent.
+
+        Args:
+            features (np.ndarray): One row of features per decision.
+            targets (np.ndarray): The 0/1 mask of the routes each decision allows; the likelihood of a row is the total probability of its allowed routes.
+            embedding_model (str, optional): The embedding model the features were computed with. Defaults to None.
+            l2 (float, optional): The L2 penalty on the weights. Defaults to 1e-3.
+            epochs (int, optional): The number of gradient steps. Defaults to 500.
+            learning_rate (float, optional): The gradient step size. Defaults to 0.5.
+
+        Returns:
+            SoftmaxRouter: The trained classifier.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        x = (features - mean) / scale
+        n = len(x)
+        weights = np.zeros((x.shape[1], len(ROUTES)))
+        bias = np.zeros(len(ROUTES))
+        for _ in range(epochs):
+            probs = _softmax(x @ weights + bias)
+            # Gradient of -log(sum of the allowed routes' probabilities).
+            allowed = probs * targets
+            allowed /= allowed.sum(axis=1, keepdims=True)
+            error = probs - allowed
+            weights -= learning_rate * (x.T @ error / n + l2 * weights)
+            bias -= learning_rate * error.mean(axis=0)
+        return cls(weights, bias, mean, scale, embedding_model)
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Return the route probabilities, one row per row of features."""
+        x = (np.atleast_2d(np.asarray(features, dtype=np.float64)) - self.mean) / self.scale
+        return _softmax(x @ self.weights + self.bias)
+
+    def decide(self, stage: str, features: Sequence[float], confidence: float) -> Optional[bool]:
+        """
+        Predict the LLM's YES/NO decision for a stage, or None if not confident enough.
+
+        Args:
+            stage (str): "grade" (is the document sufficient?) or "route" (can sub-questions answer it?).
+            features (Sequence[float]): The features from `routing_features`.
+            confidence (float): The minimum probability of the predicted decision.
+
+        Returns:
+            Optional[bool]: The predicted decision, or None to ask the LLM.
+        """
+        return _decide(stage, self.predict_proba(features)[0], confidence)
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            weights=self.weights,
+            bias=self.bias,
+            mean=self.mean,
+            scale=self.scale,
+            embedding_model=np.array(self.embedding_model or ""),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SoftmaxRouter":
+        with np.load(path) as data:
+            return cls(
+                data["weights"],
+                data["bias"],
+                data["mean"],
+                data["scale"],
+                str(data["embedding_model"]) or None,
+            )
+
+
+def _decide(stage: str, probs: np.ndarray, confidence: float) -> Optional[bool]:
+    if stage == GRADE:
+        p_yes = probs[ANSWER]
+    else:
+        # The grader already said NO; choose between the remaining routes.
+        p_yes = probs[DECOMPOSE] / max(probs[DECOMPOSE] + probs[REASON], 1e-12)
+    if p_yes >= confidence:
+        return True
+    if 1 - p_yes >= confidence:
+        return False
+    return None
+
+
+def load_router(path: str, embedding_model: Optional[str]) -> Optional[SoftmaxRouter]:
+    """Load a trained router, or return None if there is none for this embedding model."""
+    if not os.path.exists(path):
+        return None
+    router = SoftmaxRouter.load(path)
+    if router.embedding_model != embedding_model:
+        return None
+    return router
+
+
+def _dataset(log: RoutingLog) -> Tuple[List[dict], Optional[str]]:
+    """Return the logged decisions of the most recently used embedding model."""
+    records = list(log.records())
+    if not records:
+        raise SystemExit(f"No routing decisions logged in {log.path}")
+    model = records[-1]["embedding_model"]
+    return [r for r in records if r["embedding_model"] == model], model
+
+
+def train(log_path: str, model_path: str) -> SoftmaxRouter:
+    records, model = _dataset(RoutingLog(log_path))
+    features = np.array([r["features"] for r in records])
+    router = SoftmaxRouter.fit(features, _targets(records), embedding_model=model)
+    router.save(model_path)
+    return router
+
+
+def report(log_path: str, folds: int = 5, confidence: float = 0.9, seed: int = 0) -> dict:
+    """
+    Cross-validate the classifier against the logged LLM decisions.
+
+    Returns:
+        dict: Per stage, the number of decisions, the accuracy of every prediction,
+        and the share of decisions made confidently with their accuracy; the rest
+        would still go to the LLM.
+    """
+    records, _ = _dataset(RoutingLog(log_path))
+    features = np.array([r["features"] for r in records])
+    targets = _targets(records)
+    order = list(range(len(records)))
+    random.Random(seed).shuffle(order)
+    folds = max(2, min(folds, len(records)))
+    probs = np.zeros((len(records), len(ROUTES)))
+    for fold in range(folds):
+        test = order[fold::folds]
+        train_rows = sorted(set(order) - set(test))
+        router = SoftmaxRouter.fit(features[train_rows], targets[train_rows])
+        probs[test] = router.predict_proba(features[test])
+
+    result = {}
+    for stage in (GRADE, ROUTE):
+        rows = [i for i, r in enumerate(records) if r["stage"] == stage]
+        if not rows:
+            continue
+        truth = [records[i]["decision"] for i in rows]
+        best = [_decide(stage, probs[i], 0.5) for i in rows]
+        confident = [_decide(stage, probs[i], confidence) for i in rows]
+        decided = [(c, t) for c, t in zip(confident, truth) if c is not None]
+        result[stage] = {
+            "decisions": len(rows),
+            "llm_yes_rate": sum(truth) / len(rows),
+            "accuracy": sum(b == t for b, t in zip(best, truth)) / len(rows),
+            "coverage": len(decided) / len(rows),
+            "confident_accuracy": (
+                sum(c == t for c, t in decided) / len(decided) if decided else None
+            ),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="train the classifier on the decision log")
+    train_parser.add_argument("--log", default=LOG_FILE)
+    train_parser.add_argument("--model", default=MODEL_FILE)
+
+    report_parser = subparsers.add_parser("report", help="cross-validated accuracy against the LLM decisions")
+    report_parser.add_argument("--log", default=LOG_FILE)
+    report_parser.add_argument("--folds", type=int, default=5)
+    report_parser.add_argument("--confidence", type=float, default=0.9)
+
+    args = parser.parse_args()
+    if args.command == "train":
+        router = train(args.log, args.model)
+        print(f"trained on {args.log} ({router.embedding_model}), saved to {args.model}")
+        return
+    for stage, stats in report(args.log, args.folds, args.confidence).items():
+        confident = stats["confident_accuracy"]
+        print(
+            f"{stage:<6} {stats['decisions']:>6} decisions   LLM YES {stats['llm_yes_rate']:6.1%}   "
+            f"accuracy {stats['accuracy']:6.1%}   confident {stats['coverage']:6.1%} "
+            f"at {args.confidence:.0%}"
+            + (f", accuracy {confident:6.1%}" if confident is not None else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
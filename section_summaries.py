@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+from llm_gateway import get_llm_gateway
+from prompts import section_summarizer_prompt
+
+# Chunk IDs of summary nodes start with this, so they never collide with page chunks.
+SUMMARY_ID_PREFIX = "summary-"
+SUMMARY_KIND = "summary"
+
+
+def is_summary(metadata: dict) -> bool:
+    """Whether a chunk is a section summary rather than a piece of a page."""
+    return metadata.get("kind") == SUMMARY_KIND
+
+
+def summary_id(level: int, n: int) -> str:
+    return f"{SUMMARY_ID_PREFIX}{level}-{n}"
+
+
+class SectionSummarizer:
+    """Build a tree of summaries over a document at ingest time.
+
+    The leaves summarize groups of `pages_per_section` consecutive pages, and each
+    level above summarizes `branching` consecutive nodes of the level below, up to
+    a single summary of the whole document. The nodes are indexed like chunks, so a
+    broad question ("summarize chapter 3", "compare X and Y across the manual")
+    can be answered from one precomputed node instead of a chain of LLM calls.
+    """
+
+    def __init__(
+        self,
+        llm,
+        pages_per_section: int = 4,
+        branching: int = 4,
+        max_input_chars: int = 12000,
+        max_words: int = 250,
+        max_workers: int = 4,
+    ):
+        """
+        Initialize a SectionSummarizer.
+
+        Args:
+            llm: The LLMGateway used to write the summaries.
+            pages_per_section (int, optional): The number of pages summarized by each leaf. Defaults to 4.
+            branching (int, optional): The number of nodes summarized by each node of the level above. Defaults to 4.
+            max_input_chars (int, optional): The text of a group is truncated to this many characters. Defaults to 12000.
+            max_words (int, optional): The requested maximum length of a summary. Defaults to 250.
+            max_workers (int, optional): The number of summaries requested at once; the gateway still bounds the calls in flight. Defaults to 4.
+        """
+        if pages_per_section < 1 or branching < 2:
+            raise ValueError("pages_per_section must be >= 1 and branching >= 2")
+        self.llm = llm
+        self.pages_per_section = pages_per_section
+        self.branching = branching
+        self.max_input_chars = max_input_chars
+        self.max_words = max_words
+        self.max_workers = max_workers
+
+    def summarize(self, pages: Sequence[Document]) -> List[Document]:
+        """
+        Summarize a document's pages into a tree of summary nodes.
+
+        Args:
+            pages (Sequence[Document]): One Document per page, in page order, as loaded by PyMuPDFLoader.
+
+        Returns:
+            List[Document]: The summary nodes, leaves first, with `kind`, `level`, `page`
+            (the first page) and `last_page` in their metadata and their chunk ID in `id`.
+        """
+        pages = [page for page in pages if page.page_content.strip()]
+        if not pages:
+            return []
+        groups = [
+            pages[i : i + self.pages_per_section]
+            for i in range(0, len(pages), self.pages_per_section)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            level = self._summarize_level(executor, 0, groups)
+            nodes = list(level)
+            depth = 1
+            # A single leaf already covers the whole document.
+            while len(level) > 1:
+                groups = [
+                    level[i : i + self.branching]
+                    for i in range(0, len(level), self.branching)
+                ]
+                level = self._summarize_level(executor, depth, groups)
+                nodes.extend(level)
+                depth += 1
+        return nodes
+
+    def _summarize_level(
+        self, executor: ThreadPoolExecutor, level: int, groups: List[List[Document]]
+    ) -> List[Document]:
+        return list(
+            executor.map(
+                lambda n: self._summarize_group(level, n, groups[n]), range(len(groups))
+            )
+        )
+
+    def _summarize_group(self, level: int, n: int, group: List[Document]) -> Document:
+        first_page = group[0].metadata.get("page", 0)
+        last_page = group[-1].metadata.get("last_page", group[-1].metadata.get("page", 0))
+        # Each member gets an equal share, so a long first page cannot crowd out the rest.
+        share = self.max_input_chars // len(group)
+        text = "\n\n".join(doc.page_content[:share] for doc in group)
+        result = self.llm.invoke(
+            [("human", section_summarizer_prompt)],
+            {
+                "first_page": first_page + 1,
+                "last_page": last_page + 1,
+                "max_words": self.max_words,
+                "text": text,
+            },
+        )
+        return Document(
+            id=summary_id(level, n),
+            page_content=result.content.strip(),
+            metadata={
+                "kind": SUMMARY_KIND,
+                "level": level,
+                "page": first_page,
+                "last_page": last_page,
+            },
+        )
+
+
+def build_section_summarizer(
+    llm_config: dict, llm_gateway_config: dict, summary_config: dict
+) -> Optional[SectionSummarizer]:
+    """Return a SectionSummarizer on the shared LLMGateway, or None if `summary_config` disables it."""
+    options = dict(summary_config)
+    if not options.pop("enabled", False):
+        return None
+    return SectionSummarizer(get_llm_gateway(llm_config, llm_gateway_config), **options)
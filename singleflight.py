@@ -0,0 +1,59 @@
+import copy
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and receive a copy of its result (or its exception),
+    so no caller sees another mutate its result. Nothing is cached once the call
+    has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` unless a call with the same key is in flight.
+
+        Args:
+            key (Hashable): Identifies calls that may share a result.
+            fn (Callable): The function to run.
+
+        Returns:
+            The result of the leading call for this key, deep-copied for the callers that waited for it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
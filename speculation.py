@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class SpeculationStats:
+    """Counters describing how speculative calls were used."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    def record(self, **counts: int) -> None:
+        with self.lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def snapshot(self) -> dict:
+        """Return a copy of the current counters and the hit rate."""
+        with self.lock:
+            resolved = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / resolved if resolved else 0.0,
+            }
+
+
+class Speculator:
+    """Start likely next steps of a run before the decision that selects them.
+
+    Speculative calls are keyed by run (the run's unique ID) and by the step and its
+    inputs. Once the decision is known, `resolve` drops every other call of the run
+    and the chosen step picks up its result with `take_or_run`. Calls that have not
+    started yet are cancelled; calls already running finish in the background and
+    their result is discarded.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_calls_per_run: int = 2,
+        max_in_flight: int = 2,
+        has_capacity: Optional[Callable[[], bool]] = None,
+    ):
+        """
+        Initialize a Speculator.
+
+        Args:
+            enabled (bool, optional): Whether speculation runs at all. Defaults to False.
+            max_calls_per_run (int, optional): The number of speculative LLM calls a run may start. Defaults to 2.
+            max_in_flight (int, optional): The number of speculative calls running at once across runs. Defaults to 2.
+            has_capacity (Callable[[], bool], optional): Returns False when speculating would delay regular calls, e.g., when the LLM gateway is saturated. Defaults to None.
+        """
+        self.enabled = enabled
+        self.max_calls_per_run = max_calls_per_run
+        self.max_in_flight = max_in_flight
+        self.has_capacity = has_capacity
+        self.stats = SpeculationStats()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight) if enabled else None
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Dict[Hashable, Future]] = {}
+        self._spent: Dict[Hashable, int] = {}
+        # Submitted calls not finished yet, including dropped ones still running:
+        # they hold an executor worker until they return.
+        self._unfinished = 0
+
+    def _in_flight(self) -> int:
+        return self._unfinished
+
+    def _call_finished(self, future: Future) -> None:
+        with self._lock:
+            self._unfinished -= 1
+
+    def speculate(
+        self, run: Hashable, key: Hashable, fn: Callable, *args, cost: int = 1
+    ) -> bool:
+        """
+        Start `fn(*args)` in the background unless a cap is reached.
+
+        Args:
+            run (Hashable): Identifies the run, unique among the runs in flight.
+            key (Hashable): Identifies the step and its inputs.
+            fn (Callable): The step to run.
+            cost (int, optional): The number of LLM calls the step makes, counted against `max_calls_per_run`. Defaults to 1.
+
+        Returns:
+            bool: Whether the call is running.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            calls = self._calls.setdefault(run, {})
+            if key in calls:
+                return True
+            spent = self._spent.get(run, 0)
+            if (
+                spent + cost > self.max_calls_per_run
+                or self._in_flight() >= self.max_in_flight
+                or (cost and self.has_capacity and not self.has_capacity())
+            ):
+                self.stats.record(skipped=1)
+                return False
+            self._spent[run] = spent + cost
+            self._unfinished += 1
+            future = self._executor.submit(fn, *args)
+            calls[key] = future
+        # Outside the lock: the callback runs at once if the call already finished.
+        future.add_done_callback(self._call_finished)
+        self.stats.record(started=1)
+        return True
+
+    def resolve(self, run: Hashable, keep: Optional[Hashable] = None) -> None:
+        """Drop the run's speculative calls except `keep`, the step that will run next."""
+        with self._lock:
+            calls = self._calls.get(run, {})
+            losers = [calls.pop(key) for key in list(calls) if key != keep]
+        cancelled = sum(future.cancel() for future in losers)
+        self.stats.record(misses=len(losers), cancelled=cancelled)
+
+    def take_or_run(self, run: Hashable, key: Hashable, fn: Callable, *args) -> Any:
+        """Return the speculative result for `key`, or run `fn(*args)` if there is none."""
+        with self._lock:
+            future = self._calls.get(run, {}).pop(key, None)
+        if future is not None and future.cancel():
+            # Still queued behind other calls: running it now is faster than waiting.
+            self.stats.record(misses=1, cancelled=1)
+            future = None
+        if future is not None:
+            try:
+                result = future.result()
+            except Exception:
+                # A failed speculation is retried on the critical path.
+                self.stats.record(misses=1)
+            else:
+                self.stats.record(hits=1)
+                return result
+        return fn(*args)
+
+    def finish(self, run: Hashable) -> None:
+        """Drop whatever the run left behind and reset its budget."""
+        self.resolve(run)
+        with self._lock:
+            self._calls.pop(run, None)
+            self._spent.pop(run, None)
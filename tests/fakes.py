@@ -0,0 +1,156 @@
+"""Deterministic stand-ins for the embedding, reranker and LLM models, and a PDF builder."""
+
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pymupdf
+from langchain_core.embeddings import Embeddings
+
+from llm_gateway import GatewayMetrics
+
+WORDS = (
+    "column row schema key normalization integrity index table view entity update "
+    "transaction trigger join state query constraint widget install manual"
+).split()
+
+
+def _vector(text: str, dimension: int = 64) -> List[float]:
+    vector = np.zeros(dimension)
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode()) % dimension] += 1
+    return vector.tolist()
+
+
+class FakeEmbedding(Embeddings):
+    """Bag-of-words hashing embedding, so similar texts get similar vectors."""
+
+    model_name = "fake-embedding"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [_vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return _vector(text)
+
+
+def _overlap(query: str, document: str) -> float:
+    words = set(query.lower().split())
+    return len(words & set(document.lower().split())) / (1 + len(document) / 1000) - 0.5
+
+
+class FakeReranker:
+    """Scores a document by the words it shares with the query."""
+
+    def __init__(self):
+        self.pairs = 0
+
+    def rerank(self, query, documents, **kwargs):
+        documents = list(documents)
+        self.pairs += len(documents)
+        return [_overlap(query, d) for d in documents]
+
+    def rerank_pairs(self, pairs, **kwargs):
+        pairs = list(pairs)
+        self.pairs += len(pairs)
+        return [_overlap(q, d) for q, d in pairs]
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeLLM:
+    """Answers every prompt with a fixed text, or with `respond(variables)` if given."""
+
+    max_concurrency = 4
+
+    def __init__(self, content: str = "YES", respond=None, delay: float = 0.0):
+        self.content = content
+        self.respond = respond
+        self.delay = delay
+        self.calls = []
+        self.metrics = GatewayMetrics()
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, variables, schema=None):
+        with self._lock:
+            self.calls.append(variables)
+        self.metrics.record_start(0.0)
+        try:
+            time.sleep(self.delay)
+            if self.respond is not None:
+                return self.respond(variables)
+            return FakeMessage(self.content)
+        finally:
+            self.metrics.record_end()
+
+
+def make_handler(
+    monkeypatch, file_path: str, llm: FakeLLM, embedding=None, reranker=None, **config
+):
+    """Build a QuestionHandler on the fake models, answering every prompt with `llm`."""
+    import question_handler
+    from question_handler import QuestionHandler, QuestionHandlerConfig
+
+    monkeypatch.setattr(question_handler, "get_llm_gateway", lambda *args: llm)
+    retriever_config = {
+        "vector_store": "numpy",
+        "persist_directory": str(Path(file_path).parent / "chromadb"),
+        "index_directory": str(Path(file_path).parent / "vector_indexes"),
+        **config.pop("retriever_config", {}),
+    }
+    handler_config = QuestionHandlerConfig(
+        file_path=file_path,
+        llm_config={},
+        embedding_config={},
+        reranker_config={},
+        retriever_config=retriever_config,
+        **config,
+    )
+    return QuestionHandler(
+        handler_config,
+        embedding=embedding or FakeEmbedding(),
+        reranker=reranker or FakeReranker(),
+    )
+
+
+def make_retriever(file_path: str, embedding=None, reranker=None, **options):
+    """Build a RetrieveWithReranker on the fake models with a numpy index next to the PDF."""
+    from retriever_with_reranker import RetrieveWithReranker
+
+    options = {
+        "vector_store": "numpy",
+        "persist_directory": str(Path(file_path).parent / "chromadb"),
+        "index_directory": str(Path(file_path).parent / "vector_indexes"),
+        **options,
+    }
+    return RetrieveWithReranker(
+        file_path=file_path,
+        reranker=reranker or FakeReranker(),
+        embedding=embedding or FakeEmbedding(),
+        **options,
+    )
+
+
+def make_pdf(path: str, pages: int = 6, words_per_page: int = 400, seed: int = 0) -> str:
+    """Write a PDF of pseudo-random database vocabulary, with a repeated header on every page."""
+    rng = np.random.default_rng(seed)
+    document = pymupdf.open()
+    for n in range(pages):
+        page = document.new_page()
+        words = rng.choice(WORDS, size=words_per_page)
+        lines = [" ".join(words[i : i + 14]) for i in range(0, len(words), 14)]
+        text = "\n".join([f"Header Manual v1 page {n + 1}", *lines])
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=7)
+    document.save(path)
+    document.close()
+    return path
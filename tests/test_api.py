@@ -0,0 +1,33 @@
+import pytest
+
+api = pytest.importorskip("api")
+
+
+@pytest.mark.parametrize(
+    "argv, expected",
+    [
+        (["uvicorn", "api:app"], 1),
+        (["uvicorn", "api:app", "--workers", "4"], 4),
+        (["uvicorn", "api:app", "--workers=3"], 3),
+        (["gunicorn", "-w", "2", "api:app"], 2),
+        (["uvicorn", "api:app", "--reload"], 1),
+    ],
+)
+def test_server_workers_reads_the_command_line(argv, expected, monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert api.server_workers(argv) == expected
+
+
+def test_server_workers_defaults_to_web_concurrency(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "5")
+    assert api.server_workers(["uvicorn", "api:app"]) == 5
+    assert api.server_workers(["uvicorn", "api:app", "--workers", "2"]) == 2
+
+
+def test_document_names_outside_the_upload_directory_are_rejected(tmp_path):
+    service = api.QAService.__new__(api.QAService)
+    service.upload_dir = str(tmp_path)
+    assert service.document_path("file.pdf") == str(tmp_path / "file.pdf")
+    for name in ("../file.pdf", "sub/file.pdf", "file.txt"):
+        with pytest.raises(api.HTTPException):
+            service.document_path(name)
@@ -0,0 +1,46 @@
+import pytest
+
+from fakes import FakeReranker, make_pdf, make_retriever
+from retriever_with_reranker import reciprocal_rank_fusion
+
+QUESTION = "transaction trigger index join query"
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [n for n, _ in fused] == [1, 3, 2]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    return make_pdf(str(tmp_path_factory.mktemp("cascade") / "manual.pdf"))
+
+
+@pytest.fixture
+def retriever(pdf):
+    return make_retriever(pdf, rerank="cascade", cascade_size=3, cascade_margin=0.3)
+
+
+def test_a_clear_winner_is_the_only_candidate(retriever):
+    # First in both rankings, while the runner-up appears in only one.
+    assert retriever._cascade_candidates([7, 1, 2], [7, 3, 4], top_k=1) == [7]
+    # Still cross-encoded when more than one document is requested.
+    assert retriever._cascade_candidates([7, 1, 2], [7, 3, 4], top_k=2) == [7, 1, 3]
+
+
+def test_close_rankings_send_the_best_fused_candidates(retriever):
+    assert retriever._cascade_candidates([1, 2, 3, 4], [2, 1, 4, 3], top_k=1) == [1, 2, 3]
+    assert retriever._cascade_candidates([], [5, 6], top_k=1) == [5, 6]
+    assert retriever._cascade_candidates([], [], top_k=1) == []
+
+
+def test_cascade_cross_encodes_at_most_cascade_size_chunks(pdf):
+    full_reranker, cascade_reranker = FakeReranker(), FakeReranker()
+    full = make_retriever(pdf, reranker=full_reranker)
+    cascade = make_retriever(pdf, reranker=cascade_reranker, rerank="cascade", cascade_size=3)
+    full_reranker.pairs = cascade_reranker.pairs = 0
+    assert cascade.search(QUESTION, ["transaction", "trigger"])
+    assert full.search(QUESTION, ["transaction", "trigger"])
+    # Two keyword-selection pairs, then the cascade's candidates.
+    assert cascade_reranker.pairs <= 2 + 3 < full_reranker.pairs
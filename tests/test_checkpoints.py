@@ -0,0 +1,89 @@
+import pytest
+
+from fakes import FakeLLM, FakeMessage, make_handler, make_pdf
+
+
+def test_handlers_share_the_checkpoint_connections(tmp_path, monkeypatch):
+    pdf = make_pdf(str(tmp_path / "manual.pdf"))
+    checkpoint_path = str(tmp_path / "checkpoints.sqlite")
+    first = make_handler(monkeypatch, pdf, FakeLLM(), checkpoint_path=checkpoint_path)
+    second = make_handler(monkeypatch, pdf, FakeLLM(), checkpoint_path=checkpoint_path)
+    assert first.checkpointer is second.checkpointer
+    assert first._runs is second._runs
+
+
+QUESTION = "transaction trigger index join query"
+
+
+class FlakyLLM(FakeLLM):
+    """Fails the first answer generation, after the document was graded."""
+
+    def __init__(self):
+        super().__init__(respond=self._respond)
+        self.failures = 1
+
+    def _respond(self, variables):
+        if "context" in variables and self.failures:
+            self.failures -= 1
+            raise ConnectionError("provider reset the connection")
+        return FakeMessage("YES")
+
+
+def _gradings(llm: FakeLLM) -> int:
+    return sum("knowledge" in call for call in llm.calls)
+
+
+def _failed_runs(handler) -> list:
+    return handler._runs.execute("SELECT thread_id FROM failed_runs").fetchall()
+
+
+def test_a_failed_run_resumes_after_its_last_completed_node(tmp_path, monkeypatch):
+    llm = FlakyLLM()
+    handler = make_handler(
+        monkeypatch,
+        make_pdf(str(tmp_path / "manual.pdf")),
+        llm,
+        checkpoint_path=str(tmp_path / "checkpoints.sqlite"),
+    )
+    question = {"question": QUESTION, "max_retries": 1}
+    with pytest.raises(ConnectionError):
+        handler.invoke(dict(question))
+    [(thread_id,)] = _failed_runs(handler)
+    assert _gradings(llm) == 1
+
+    result = handler.invoke(dict(question))
+    assert result["final_answer"] == "YES"
+    assert result["run_id"] == thread_id
+    # The grading was not repeated, and the finished run left nothing behind.
+    assert _gradings(llm) == 1
+    assert _failed_runs(handler) == []
+    assert not handler.app.get_state({"configurable": {"thread_id": thread_id}}).values
+
+
+def test_a_failed_run_is_claimed_once(tmp_path, monkeypatch):
+    handler = make_handler(
+        monkeypatch,
+        make_pdf(str(tmp_path / "manual.pdf")),
+        FakeLLM(),
+        checkpoint_path=str(tmp_path / "checkpoints.sqlite"),
+    )
+    key = handler._flight_key({"question": QUESTION, "max_retries": 1})
+    handler._run_failed(key, None, {"configurable": {"thread_id": "failed"}})
+    assert handler._claim_failed_run(key) == "failed"
+    assert handler._claim_failed_run(key) is None
+
+
+def test_explicit_run_ids_are_resumed_by_their_caller(tmp_path, monkeypatch):
+    llm = FlakyLLM()
+    handler = make_handler(
+        monkeypatch,
+        make_pdf(str(tmp_path / "manual.pdf")),
+        llm,
+        checkpoint_path=str(tmp_path / "checkpoints.sqlite"),
+    )
+    question = {"question": QUESTION, "max_retries": 1}
+    with pytest.raises(ConnectionError):
+        handler.invoke(dict(question), run_id="mine")
+    assert _failed_runs(handler) == []
+    assert handler.invoke(dict(question), run_id="mine")["final_answer"] == "YES"
+    assert _gradings(llm) == 1
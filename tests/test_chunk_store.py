@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from chunk_store import ChunkStore
+from retriever_with_reranker import BM25Index
+
+TEXTS = ["première page", "", "second chunk ünïcode", "no page"]
+METADATAS = [
+    {"source": "a.pdf", "page": 0, "parent_id": "p0"},
+    {"source": "a.pdf", "page": 0, "parent_id": "p0"},
+    {"source": "a.pdf", "page": 1, "parent_id": "p1"},
+    {"source": "a.pdf"},
+]
+IDS = ["c0", "c1", "c2", "c3"]
+
+
+def _documents(store: ChunkStore) -> list:
+    return [(d.id, d.page_content, d.metadata) for d in map(store.document, range(len(store)))]
+
+
+def test_round_trip_through_memory_mapped_files(tmp_path):
+    store = ChunkStore.build(TEXTS, METADATAS, IDS)
+    # Same for every chunk: stored once; varying: a column.
+    assert store.shared == {"source": "a.pdf"} and list(store.columns) == ["parent_id"]
+    store.save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+    assert isinstance(loaded.text, np.memmap)
+    assert _documents(loaded) == list(zip(IDS, TEXTS, METADATAS))
+    assert loaded.base == store.base
+    assert ChunkStore.load(str(tmp_path / "missing")) is None
+
+
+def test_append_writes_new_rows_in_place(tmp_path):
+    ChunkStore.build(TEXTS, METADATAS, IDS).save(str(tmp_path))
+    store = ChunkStore.load(str(tmp_path))
+    new_metadatas = [{"source": "b.pdf", "page": 5}, {"source": "a.pdf", "page": 6, "kind": "summary"}]
+    assert store.append(str(tmp_path), ["appended one", "appended two"], new_metadatas, ["c4", "c5"])
+    appended = ChunkStore.load(str(tmp_path))
+    assert appended.base == store.base
+    assert _documents(appended) == list(
+        zip(IDS + ["c4", "c5"], TEXTS + ["appended one", "appended two"], METADATAS + new_metadatas)
+    )
+
+
+def test_append_refuses_stored_ids_and_foreign_files(tmp_path):
+    ChunkStore.build(TEXTS, METADATAS, IDS).save(str(tmp_path))
+    store = ChunkStore.load(str(tmp_path))
+    assert not store.append(str(tmp_path), ["again"], [{}], ["c0"])
+    # Files rewritten by someone else no longer hold this store.
+    ChunkStore.build(["other"], [{}], ["x"]).save(str(tmp_path))
+    assert not store.append(str(tmp_path), ["new"], [{}], ["c9"])
+    assert ChunkStore.load(str(tmp_path)).ids == ["x"]
+
+
+def test_upsert_replaces_in_place_and_appends():
+    store = ChunkStore.build(TEXTS, METADATAS, IDS).upsert(
+        ["replaced", "added"], [{"page": 3}, {"page": 4}], ["c1", "c9"]
+    )
+    assert store.ids == IDS + ["c9"]
+    assert store.get_text(1) == "replaced" and store.metadata(1) == {"page": 3}
+    assert store.get_text(4) == "added"
+
+
+@pytest.mark.parametrize("split", [1, 3, 5])
+def test_extended_bm25_scores_like_a_rebuilt_index(split):
+    texts = [
+        "transaction commit log",
+        "index lookup btree",
+        "join query planner join",
+        "commit rollback transaction",
+        "btree page split",
+        "query cache",
+    ]
+    extended = BM25Index(texts[:split]).extend(texts[split:])
+    rebuilt = BM25Index(texts)
+    for query in ["transaction commit", "btree", "join query", "missing"]:
+        assert np.allclose(
+            extended.bm25.get_scores(query.split()), rebuilt.bm25.get_scores(query.split())
+        )
+        assert extended.search(query) == rebuilt.search(query)
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pymupdf
+import pytest
+
+from fakes import FakeEmbedding, FakeReranker
+from federated_retriever import FederatedRetriever
+
+
+def _write_pdf(path, pages) -> str:
+    document = pymupdf.open()
+    for text in pages:
+        page = document.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=9)
+    document.save(str(path))
+    document.close()
+    return str(path)
+
+
+DATABASES = [
+    "transaction commit rollback durability log " * 20,
+    "index btree lookup scan planner " * 20,
+]
+GARDENING = [
+    "tomato seedling compost watering soil " * 20,
+    "pruning roses fertilizer mulch shade " * 20,
+]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    # Short relative paths, so that collection names of different uploads differ.
+    monkeypatch.chdir(tmp_path)
+    uploads = Path("uploads")
+    uploads.mkdir()
+    _write_pdf(uploads / "databases.pdf", DATABASES)
+    _write_pdf(uploads / "gardening.pdf", GARDENING)
+    return uploads
+
+
+def _federated(library, **options) -> FederatedRetriever:
+    return FederatedRetriever(
+        directory=str(library),
+        reranker=FakeReranker(),
+        embedding=FakeEmbedding(),
+        vector_store="numpy",
+        index_directory="indexes",
+        persist_directory="chromadb",
+        **options,
+    )
+
+
+def test_results_come_from_the_relevant_document(library):
+    retriever = _federated(library)
+    assert set(retriever.shards) == {"databases.pdf", "gardening.pdf"}
+    [tomato] = retriever.search("tomato compost soil")
+    assert tomato.metadata["document"] == "gardening.pdf"
+    [index] = retriever.search("btree index lookup", ["btree lookup"])
+    assert index.metadata["document"] == "databases.pdf"
+    assert index.metadata["page"] == 1
+
+
+def test_top_k_spans_documents(library):
+    documents = _federated(library).search("rollback log mulch shade", top_k=2)
+    assert {d.metadata["document"] for d in documents} == {"databases.pdf", "gardening.pdf"}
+
+
+def test_added_and_removed_files_are_picked_up(library):
+    retriever = _federated(library)
+    _write_pdf(library / "cooking.pdf", ["bake bread flour yeast oven " * 20])
+    (library / "gardening.pdf").unlink()
+    [bread] = retriever.search("bread yeast oven")
+    assert bread.metadata["document"] == "cooking.pdf"
+    assert set(retriever.shards) == {"databases.pdf", "cooking.pdf"}
+
+
+def test_a_failing_shard_is_left_out(library):
+    retriever = _federated(library)
+
+    def fail(*args):
+        raise OSError("index unreadable")
+
+    retriever.shards["databases.pdf"]._dense_scored = fail
+    [document] = retriever.search("tomato compost soil")
+    assert document.metadata["document"] == "gardening.pdf"
+
+
+def test_batched_search_matches_one_search_per_query(library):
+    retriever = _federated(library)
+    queries = ["tomato compost soil", "btree index lookup", "tomato compost soil"]
+    expected = [retriever.search(q, top_k=2) for q in queries]
+    assert retriever.search_many(queries, top_k=2) == expected
+
+
+def test_keyphrase_vocabularies_are_merged(library):
+    retriever = _federated(library)
+    phrases = set(retriever.keyphrase_index.phrases)
+    assert {"commit rollback", "compost watering"} <= phrases
@@ -0,0 +1,110 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+from fakes import FakeEmbedding, make_pdf, make_retriever
+from index_bundle import (
+    MANIFEST_FILE,
+    BundleError,
+    export_bundle,
+    extract_pdf,
+    import_bundle,
+    read_manifest,
+)
+
+QUESTION = "transaction trigger index join query"
+
+
+class OtherEmbedding(FakeEmbedding):
+    model_name = "other-embedding"
+
+
+@pytest.fixture
+def bundle(tmp_path, monkeypatch):
+    # Short relative paths, so that collection names of different nodes differ.
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("build")
+    pdf = make_pdf("build/manual.pdf")
+    source = make_retriever(pdf, index_directory="build/indexes")
+    export_bundle(source, "manual.ragbundle")
+    return source, "manual.ragbundle"
+
+
+def _rewrite(bundle_path: str, change) -> None:
+    """Rewrite a bundle after `change(members)` edits its members, a name -> bytes dict."""
+    with zipfile.ZipFile(bundle_path) as bundle:
+        members = {name: bundle.read(name) for name in bundle.namelist()}
+    change(members)
+    with zipfile.ZipFile(bundle_path, "w") as bundle:
+        for name, data in members.items():
+            bundle.writestr(name, data)
+
+
+def _edit_manifest(bundle_path: str, **fields) -> None:
+    def change(members):
+        manifest = json.loads(members[MANIFEST_FILE])
+        manifest.update(fields)
+        members[MANIFEST_FILE] = json.dumps(manifest).encode()
+
+    _rewrite(bundle_path, change)
+
+
+def _serving_node(pdf: str, **options):
+    return make_retriever(pdf, ingest=False, index_directory="serve/indexes", **options)
+
+
+def test_imported_index_searches_like_the_exported_one_without_embedding(bundle):
+    source, bundle_path = bundle
+    pdf = extract_pdf(bundle_path, "serve")
+    embedding = FakeEmbedding()
+    target = _serving_node(pdf, embedding=embedding)
+    manifest = import_bundle(target, bundle_path)
+
+    assert embedding.calls == 0
+    assert manifest["chunk_count"] == len(target.search_index.chunks)
+    assert target.search(QUESTION, ["trigger"], top_k=3) == source.search(QUESTION, ["trigger"], top_k=3)
+    assert target.keyphrase_index.phrases == source.keyphrase_index.phrases
+    assert not target.needs_finalize()
+
+
+def test_corrupt_files_are_rejected(bundle):
+    _, bundle_path = bundle
+    pdf = extract_pdf(bundle_path, "serve")
+
+    def corrupt(members):
+        members["embeddings.npy"] = members["embeddings.npy"][:-4] + b"\0\0\0\1"
+
+    _rewrite(bundle_path, corrupt)
+    with pytest.raises(BundleError, match="Checksum mismatch"):
+        import_bundle(_serving_node(pdf), bundle_path)
+
+
+@pytest.mark.parametrize("pdf", ["../manual.pdf", "/tmp/manual.pdf", "..", "manual.exe"])
+def test_pdf_names_outside_the_target_directory_are_rejected(bundle, pdf):
+    _, bundle_path = bundle
+    files = read_manifest(bundle_path)["files"]
+    _edit_manifest(bundle_path, pdf=pdf, files={**files, pdf: "0" * 64})
+    with pytest.raises(BundleError, match="invalid PDF"):
+        extract_pdf(bundle_path, "serve")
+
+
+def test_unexpected_members_are_rejected(bundle):
+    _, bundle_path = bundle
+    files = read_manifest(bundle_path)["files"]
+    _edit_manifest(bundle_path, files={**files, "../../.bashrc": "0" * 64})
+    with pytest.raises(BundleError, match="unexpected file"):
+        read_manifest(bundle_path)
+
+
+def test_incompatible_bundles_are_rejected(bundle):
+    _, bundle_path = bundle
+    pdf = extract_pdf(bundle_path, "serve")
+    with pytest.raises(BundleError, match="embedded with"):
+        import_bundle(_serving_node(pdf, embedding=OtherEmbedding()), bundle_path)
+    with pytest.raises(BundleError, match="chunking"):
+        import_bundle(_serving_node(pdf, chunking="parent_child"), bundle_path)
+    _edit_manifest(bundle_path, version=99)
+    with pytest.raises(BundleError, match="version"):
+        read_manifest(bundle_path)
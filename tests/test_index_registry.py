@@ -0,0 +1,101 @@
+import os
+import time
+
+import chromadb
+import pytest
+
+from index_registry import IndexRegistry
+from retriever_with_reranker import collection_names
+
+
+def _upload(registry: IndexRegistry, name: str, size: int = 1000, indexed: bool = True) -> str:
+    file_path = str(registry.upload_dir / name)
+    with open(file_path, "wb") as f:
+        f.write(os.urandom(size))
+    if indexed:
+        index = registry.index_directory / collection_names(file_path)[0]
+        index.mkdir(parents=True)
+        (index / "embeddings.npy").write_bytes(b"\0" * size)
+    return file_path
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    # Short relative paths, so that collection names of different uploads differ.
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("uploads")
+    return IndexRegistry(
+        upload_dir="uploads",
+        persist_directory="chromadb",
+        index_directory="indexes",
+        registry_file="registry.json",
+    )
+
+
+def test_least_recently_used_documents_are_evicted_over_quota(registry):
+    old, recent = _upload(registry, "old.pdf"), _upload(registry, "recent.pdf")
+    registry.touch(old)
+    time.sleep(0.01)
+    registry.touch(recent)
+    registry.quota_bytes = 3000
+    report = registry.collect_garbage()
+    assert report["evicted"] == ["old.pdf"]
+    assert not os.path.exists(old) and os.path.exists(recent)
+    assert not (registry.index_directory / collection_names(old)[0]).exists()
+    assert report["bytes_after"] <= 3000
+
+
+def test_idle_documents_are_evicted_and_protected_ones_kept(registry):
+    idle, kept = _upload(registry, "idle.pdf"), _upload(registry, "kept.pdf")
+    registry.max_idle_seconds = 0
+    time.sleep(0.01)
+    report = registry.collect_garbage(protected=[kept])
+    assert report["evicted"] == ["idle.pdf"]
+    assert os.path.exists(kept) and not os.path.exists(idle)
+
+
+def test_busy_documents_are_not_evicted(registry):
+    busy = _upload(registry, "busy.pdf")
+    registry.max_idle_seconds = 0
+    registry.is_busy = lambda file_path: file_path == busy
+    time.sleep(0.01)
+    assert registry.collect_garbage()["evicted"] == []
+
+
+def test_orphans_and_stale_unindexed_uploads_are_swept(registry):
+    fresh = _upload(registry, "fresh.pdf", indexed=False)
+    stale = _upload(registry, "stale.pdf", indexed=False)
+    os.utime(stale, (0, 0))
+    (registry.index_directory / "orphan").mkdir(parents=True)
+    report = registry.collect_garbage()
+    assert report["orphans_removed"] == ["orphan"]
+    assert report["uploads_removed"] == ["stale.pdf"]
+    assert os.path.exists(fresh)
+
+
+def test_chroma_collections_are_listed_and_deleted_through_the_client(registry):
+    document = _upload(registry, "manual.pdf", indexed=False)
+    client = chromadb.PersistentClient(path=str(registry.persist_directory))
+    for name in (collection_names(document)[0], "orphan_collection"):
+        client.create_collection(name).add(
+            ids=["a", "b"], embeddings=[[0.0, 1.0], [1.0, 0.0]], documents=["a", "b"]
+        )
+
+    inventory = registry.inventory()
+    assert inventory["documents"][0]["indexed"]
+    assert inventory["documents"][0]["index_bytes"] > 0
+    assert [o["name"] for o in inventory["orphans"]] == ["orphan_collection"]
+
+    registry.evict(document)
+    registry.collect_garbage()
+    assert client.list_collections() == []
+    assert registry.inventory()["documents"] == []
+
+
+def test_concurrent_collections_are_skipped(registry):
+    other = IndexRegistry(upload_dir="uploads", registry_file="registry.json")
+    other._gc_lock.acquire()
+    try:
+        assert registry.collect_garbage() == {"skipped": True}
+    finally:
+        other._gc_lock.release()
@@ -0,0 +1,92 @@
+import json
+import socket
+import time
+
+import pytest
+
+from fakes import make_pdf, make_retriever
+from ingestion_jobs import DONE, FAILED, RUNNING, IngestionJobQueue
+
+QUESTION = "transaction trigger index join query"
+
+
+def _wait(jobs: IngestionJobQueue, job_id: str, timeout: float = 20.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.status(job_id)
+        if job and job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish: {jobs.status(job_id)}")
+
+
+def _write_job(tmp_path, **fields) -> None:
+    now = time.time()
+    job = {
+        "file_path": None, "status": RUNNING, "owner": None, "pages_done": 0,
+        "pages_total": None, "chunks": 0, "error": None, "finalize_only": False,
+        "created_at": now, "updated_at": now, **fields,
+    }
+    (tmp_path / "jobs.json").write_text(json.dumps({job["id"]: job}))
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    return make_pdf(str(tmp_path / "manual.pdf"), pages=6)
+
+
+def _queue(tmp_path, factory=None) -> IngestionJobQueue:
+    return IngestionJobQueue(
+        factory or (lambda file_path: make_retriever(file_path, ingest=False)),
+        jobs_file=str(tmp_path / "jobs.json"),
+        pages_per_commit=2,
+        poll_interval=0.05,
+    )
+
+
+def test_a_job_indexes_every_page_and_finalizes(tmp_path, pdf):
+    jobs = _queue(tmp_path)
+    job = _wait(jobs, jobs.submit(pdf))
+    assert (job["status"], job["pages_done"], job["pages_total"]) == (DONE, 6, 6)
+    retriever = make_retriever(pdf, ingest=False)
+    assert job["chunks"] == len(retriever.search_index.chunks) > 0
+    assert retriever.keyphrase_index is not None and not retriever.needs_finalize()
+    assert jobs.latest_job(pdf)["id"] == job["id"]
+
+
+def test_a_file_already_queued_is_not_queued_twice(tmp_path, pdf):
+    # Running on another host and recently updated, so not claimable here.
+    _write_job(tmp_path, id="other", file_path=pdf, owner="elsewhere:1")
+    jobs = _queue(tmp_path)
+    assert jobs.submit(pdf) == "other"
+
+
+def test_a_job_of_a_dead_process_resumes_from_its_last_commit(tmp_path, pdf):
+    partial = make_retriever(pdf, ingest=False)
+    pages = list(partial.loader.lazy_load_pages())
+    chunks = partial.ingest_pages(pages[:2])
+    # Questions are answered from the pages indexed so far.
+    assert partial.search(QUESTION)
+    _write_job(
+        tmp_path, id="job", file_path=pdf, owner=f"{socket.gethostname()}:999999999",
+        pages_done=2, pages_total=6, chunks=chunks,
+    )
+    job = _wait(_queue(tmp_path), "job")
+    assert (job["status"], job["pages_done"]) == (DONE, 6)
+
+    resumed = make_retriever(pdf, ingest=False)
+    full = make_retriever(str(tmp_path / "manual.pdf"), index_directory=str(tmp_path / "full"))
+    assert list(resumed.search_index.chunks.texts()) == list(full.search_index.chunks.texts())
+    assert job["chunks"] == len(full.search_index.chunks)
+
+
+def test_failures_are_recorded(tmp_path, pdf):
+    def factory(file_path):
+        raise RuntimeError("disk full")
+
+    jobs = _queue(tmp_path, factory)
+    job = _wait(jobs, jobs.submit(pdf))
+    assert (job["status"], job["error"]) == (FAILED, "disk full")
+    # A failed job does not block a new one.
+    assert jobs.submit(pdf) != job["id"]
+    assert jobs.status("unknown") is None
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from fakes import FakeEmbedding, FakeLLM, make_handler, make_pdf
+
+keybert = pytest.importorskip("keybert")
+
+from keybert_backend import FastEmbedBackend  # noqa: E402
+
+
+def test_backend_embeds_with_the_given_model():
+    embedding = FakeEmbedding()
+    vectors = FastEmbedBackend(embedding).embed(["query planner", "transaction log"])
+    assert vectors.dtype == np.float32 and vectors.shape == (2, 64)
+    assert embedding.calls == 1
+
+
+def test_keybert_extracts_keywords_on_the_backend():
+    embedding = FakeEmbedding()
+    model = keybert.KeyBERT(model=FastEmbedBackend(embedding))
+    keywords = model.extract_keywords(
+        "How does the query planner choose a join order for a transaction?",
+        keyphrase_ngram_range=(2, 3),
+        top_n=3,
+    )
+    assert len(keywords) == 3 and embedding.calls > 0
+
+
+def test_handler_without_keyphrase_index_uses_the_loaded_embedding(tmp_path, monkeypatch):
+    embedding = FakeEmbedding()
+    handler = make_handler(
+        monkeypatch,
+        make_pdf(str(tmp_path / "manual.pdf")),
+        FakeLLM(),
+        embedding=embedding,
+        retriever_config={"keyphrase_index": False},
+    )
+    assert isinstance(handler.kw_model.model, FastEmbedBackend)
+    assert handler.kw_model.model.embedding is embedding
+    keywords = handler._extract_keywords({"question": "transaction trigger index join query"})
+    assert keywords["keywords"]
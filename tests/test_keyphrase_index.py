@@ -0,0 +1,60 @@
+import numpy as np
+
+from fakes import FakeEmbedding, make_pdf, make_retriever
+from keyphrase_index import KeyphraseIndex, _ngrams, _tokenize
+
+CHUNKS = [
+    "The transaction log records every database transaction.",
+    "A database transaction commits or rolls back; the transaction log keeps it durable.",
+    "Query planner statistics help the query planner choose a join order.",
+    "The query planner reads index statistics before every join.",
+    "Widget install manual, page 7.",
+]
+
+
+def test_phrases_skip_stop_word_edges_and_numbers():
+    grams = _ngrams(_tokenize("The query planner of page 7"), (2, 3))
+    # Stop words may only sit inside a phrase.
+    assert grams == ["query planner", "planner of page"]
+
+
+def test_frequent_phrases_form_the_vocabulary():
+    index = KeyphraseIndex.build(CHUNKS, FakeEmbedding())
+    assert {"transaction log", "query planner", "database transaction"} <= set(index.phrases)
+    # Phrases found in a single chunk are dropped.
+    assert "widget install manual" not in index.phrases
+    assert np.allclose(np.linalg.norm(index.vectors, axis=1), 1)
+
+
+def test_phrases_in_the_question_come_first():
+    index = KeyphraseIndex.build(CHUNKS, FakeEmbedding())
+    keywords = index.extract("How does the query planner use a transaction log?", top_n=3)
+    assert keywords[:2] == ["query planner", "transaction log"]
+    assert len(keywords) == 3 and len(set(keywords)) == 3
+
+
+def test_rank_orders_known_keywords_and_rejects_unknown_ones():
+    index = KeyphraseIndex.build(CHUNKS, FakeEmbedding())
+    assert index.rank("query planner join", ["transaction log", "query planner"], top_n=1) == [
+        "query planner"
+    ]
+    assert index.rank("query planner", ["query planner", "not a phrase"]) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = KeyphraseIndex.build(CHUNKS, FakeEmbedding())
+    index.save(str(tmp_path))
+    loaded = KeyphraseIndex.load(str(tmp_path), FakeEmbedding())
+    assert loaded.phrases == index.phrases
+    assert np.array_equal(loaded.vectors, index.vectors)
+    assert loaded.ngram_range == index.ngram_range
+    assert KeyphraseIndex.load(str(tmp_path / "missing"), FakeEmbedding()) is None
+
+
+def test_retriever_builds_and_reopens_the_index_at_ingest(tmp_path):
+    pdf = make_pdf(str(tmp_path / "manual.pdf"))
+    retriever = make_retriever(pdf)
+    assert retriever.keyphrase_index is not None and retriever.keyphrase_index.phrases
+    reopened = make_retriever(pdf, ingest=False)
+    assert reopened.keyphrase_index.phrases == retriever.keyphrase_index.phrases
+    assert make_retriever(str(tmp_path / "manual.pdf"), keyphrase_index=False).keyphrase_index is None
@@ -0,0 +1,134 @@
+from langchain_core.documents import Document
+
+from decomposing_question_handler import DecomposingQuestionHandler
+from fakes import FakeEmbedding, FakeLLM, FakeMessage, make_handler, make_pdf
+from knowledge_memo import MEMO_FILE, KnowledgeMemo
+
+SCHEMA = "what is a database schema"
+
+
+class _Version:
+    def __init__(self):
+        self.stamp = [1, (2, 3)]
+
+    def __call__(self):
+        return self.stamp
+
+
+def _memo(directory, version=None, **options) -> KnowledgeMemo:
+    return KnowledgeMemo(str(directory), FakeEmbedding(), version or _Version(), **options)
+
+
+def test_similar_sub_questions_reuse_the_observation(tmp_path):
+    memo = _memo(tmp_path, threshold=0.85)
+    assert memo.lookup(SCHEMA) is None
+    memo.add(SCHEMA, "A schema describes the database.")
+    assert memo.lookup(SCHEMA) == "A schema describes the database."
+    # One extra word: cosine 5 / sqrt(5 * 6) is about 0.91.
+    assert memo.lookup(f"{SCHEMA} exactly") == "A schema describes the database."
+    assert memo.lookup("what is a trigger") is None
+
+
+def test_entries_are_shared_through_the_file(tmp_path):
+    version = _Version()
+    writer, reader = _memo(tmp_path, version), _memo(tmp_path, version)
+    assert reader.lookup(SCHEMA) is None
+    writer.add(SCHEMA, "first")
+    assert reader.lookup(SCHEMA) == "first"
+    # Answering a sub-question again replaces its observation.
+    writer.add(SCHEMA, "second")
+    assert reader.lookup(SCHEMA) == "second"
+    assert (tmp_path / MEMO_FILE).exists()
+
+
+def test_oldest_entries_are_dropped_past_max_entries(tmp_path):
+    memo = _memo(tmp_path, max_entries=2)
+    for question in ("what is a trigger", "what is a view", SCHEMA):
+        memo.add(question, question.upper())
+    assert memo.lookup("what is a trigger") is None
+    assert memo.lookup("what is a view") == "WHAT IS A VIEW"
+    assert memo.lookup(SCHEMA) == SCHEMA.upper()
+
+
+def test_a_new_index_version_invalidates_the_entries(tmp_path):
+    version = _Version()
+    memo = _memo(tmp_path, version)
+    memo.add(SCHEMA, "old")
+    version.stamp = [1, (2, 4)]
+    assert memo.lookup(SCHEMA) is None
+    memo.add("what is a trigger", "new")
+    version.stamp = [1, (2, 3)]
+    # The stale entries were discarded by the add, not kept alongside.
+    assert memo.lookup(SCHEMA) is None
+
+
+class _Retriever:
+    def __init__(self):
+        self.queries = []
+
+    def search_many(self, queries, keywords):
+        self.queries.extend(queries)
+        return [[Document(page_content=f"notes on {q}", metadata={"page": 0})] for q in queries]
+
+
+def _answers(variables):
+    if "document" in variables:
+        return FakeMessage("YES")
+    return FakeMessage(f"answer to {variables['question']}")
+
+
+def _decompose(handler, sub_questions: list) -> dict:
+    return handler.build_graph().invoke(
+        {
+            "question": "How do schemas and triggers relate?",
+            "keywords": [],
+            "sub_questions": sub_questions,
+            "max_retries": 1,
+        }
+    )
+
+
+def test_decomposed_questions_recall_answered_sub_questions(tmp_path):
+    memo, retriever = _memo(tmp_path), _Retriever()
+    llm = FakeLLM(respond=_answers)
+    handler = DecomposingQuestionHandler(llm, retriever, memo)
+    _decompose(handler, [SCHEMA, "what is a trigger"])
+    assert retriever.queries == [SCHEMA, "what is a trigger"]
+
+    retriever.queries.clear()
+    llm.calls.clear()
+    result = _decompose(handler, [SCHEMA, "what is a view"])
+    # Only the new sub-question was retrieved, graded and answered.
+    assert retriever.queries == ["what is a view"]
+    assert len(llm.calls) == 3
+    assert [k["observation"] for k in result["knowledge"]] == [
+        f"answer to {SCHEMA}",
+        "answer to what is a view",
+    ]
+
+
+def test_sub_questions_answered_after_a_retry_are_not_remembered(tmp_path):
+    memo = _memo(tmp_path)
+    grades = iter(["NO", "YES"])
+
+    def respond(variables):
+        if "document" in variables:
+            return FakeMessage(next(grades))
+        if "original_query" in variables:
+            return FakeMessage(f"{variables['original_query']} rephrased")
+        return FakeMessage("weak answer")
+
+    handler = DecomposingQuestionHandler(FakeLLM(respond=respond), _Retriever(), memo)
+    _decompose(handler, [SCHEMA])
+    assert memo.lookup(SCHEMA) is None
+    assert memo.lookup(f"{SCHEMA} rephrased") is None
+
+
+def test_handler_memo_follows_the_config(tmp_path, monkeypatch):
+    pdf = make_pdf(str(tmp_path / "manual.pdf"))
+    assert make_handler(monkeypatch, pdf, FakeLLM()).memo is None
+    handler = make_handler(
+        monkeypatch, pdf, FakeLLM(), memo_config={"enabled": True, "threshold": 0.9}
+    )
+    assert handler.memo.threshold == 0.9
+    assert handler.memo.path.parent == handler.retriever.index_path
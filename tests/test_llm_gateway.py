@@ -0,0 +1,106 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+import llm_gateway
+from llm_gateway import LLMGateway, TokenBucket, _retry_after, get_llm_gateway
+
+LLM_CONFIG = {"model": "gpt-test", "api_key": "test-key", "base_url": "http://localhost:1"}
+
+
+def _rate_limit_error(headers=None) -> openai.RateLimitError:
+    request = httpx.Request("POST", "http://localhost:1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class _Chain:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def invoke(self, variables):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _rate_limit_error()
+        return "answer"
+
+
+def test_token_bucket_allows_burst_then_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two tokens come from the burst, the other two take 1/50 s each.
+    assert time.monotonic() - started >= 0.03
+
+
+def test_retry_after_reads_seconds_and_milliseconds():
+    assert _retry_after(_rate_limit_error({"retry-after": "3"})) == 3.0
+    assert _retry_after(_rate_limit_error({"retry-after-ms": "250"})) == 0.25
+    assert _retry_after(_rate_limit_error()) is None
+    assert _retry_after(ValueError("no response")) is None
+
+
+def test_backoff_is_bounded_and_honours_retry_after():
+    gateway = LLMGateway(LLM_CONFIG, backoff_base=1.0, backoff_max=4.0)
+    for attempt in range(10):
+        assert 0 <= gateway._backoff_delay(attempt, _rate_limit_error()) <= 4.0
+    delay = gateway._backoff_delay(0, _rate_limit_error({"retry-after": "7"}))
+    assert 7.0 <= delay <= 8.0
+
+
+def test_invoke_retries_retryable_errors(monkeypatch):
+    gateway = LLMGateway(LLM_CONFIG, max_retries=3, backoff_base=0.001)
+    chain = _Chain(failures=2)
+    monkeypatch.setattr(gateway, "_get_chain", lambda messages, schema: chain)
+    assert gateway.invoke([("human", "{q}")], {"q": "?"}) == "answer"
+    stats = gateway.metrics.snapshot()
+    assert chain.calls == 3
+    assert stats["retries"] == 2 and stats["failures"] == 0 and stats["in_flight"] == 0
+
+
+def test_invoke_gives_up_after_max_retries(monkeypatch):
+    gateway = LLMGateway(LLM_CONFIG, max_retries=1, backoff_base=0.001)
+    monkeypatch.setattr(gateway, "_get_chain", lambda messages, schema: _Chain(failures=5))
+    with pytest.raises(openai.RateLimitError):
+        gateway.invoke([("human", "{q}")], {"q": "?"})
+    assert gateway.metrics.snapshot()["failures"] == 1
+
+
+def test_invoke_limits_concurrency(monkeypatch):
+    gateway = LLMGateway(LLM_CONFIG, max_concurrency=2)
+    peak, running, lock = [0], [0], threading.Lock()
+
+    class SlowChain:
+        def invoke(self, variables):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return "answer"
+
+    monkeypatch.setattr(gateway, "_get_chain", lambda messages, schema: SlowChain())
+    threads = [
+        threading.Thread(target=gateway.invoke, args=([("human", "{q}")], {"q": "?"}))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_get_llm_gateway_is_shared_per_config(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_gateways", {})
+    config = {**LLM_CONFIG, "stop": ["\n\n"], "default_headers": {"X-Test": "1"}}
+    gateway = get_llm_gateway(config, {"max_concurrency": 2})
+    reordered = {"default_headers": {"X-Test": "1"}, **LLM_CONFIG, "stop": ["\n\n"]}
+    assert get_llm_gateway(reordered, {"max_concurrency": 2}) is gateway
+    assert get_llm_gateway(config, {"max_concurrency": 3}) is not gateway
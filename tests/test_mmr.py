@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from numpy_vector_store import _normalize, mmr_select
+
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.3, 0.5, 0.9])
+@pytest.mark.parametrize("k", [1, 4, 10])
+def test_selection_matches_langchain(k, lambda_mult):
+    rng = np.random.default_rng(k)
+    for _ in range(20):
+        candidates = _normalize(rng.normal(size=(30, 16)).astype(np.float32))
+        query = _normalize(rng.normal(size=16).astype(np.float32))
+        expected = maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=k)
+        assert mmr_select(query, candidates, k=k, lambda_mult=lambda_mult) == expected
+
+
+def test_pure_relevance_ranks_by_similarity():
+    rng = np.random.default_rng(0)
+    candidates = _normalize(rng.normal(size=(20, 8)))
+    query = _normalize(rng.normal(size=8))
+    assert mmr_select(query, candidates, k=5, lambda_mult=1.0) == list(
+        np.argsort(-(candidates @ query))[:5]
+    )
+
+
+def test_duplicates_are_passed_over():
+    query = np.array([1.0, 0.0])
+    candidates = _normalize(np.array([[1.0, 0.1], [1.0, 0.1], [0.6, 0.8]]))
+    assert mmr_select(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_k_is_capped_by_the_candidates():
+    candidates = np.eye(3)
+    assert sorted(mmr_select(np.ones(3) / 3**0.5, candidates, k=10)) == [0, 1, 2]
+    assert mmr_select(np.ones(3), candidates, k=0) == []
+    assert mmr_select(np.ones(3), np.zeros((0, 3)), k=3) == []
@@ -0,0 +1,94 @@
+import numpy as np
+import pymupdf
+import pytest
+
+from fakes import WORDS, make_pdf, make_retriever
+from near_duplicates import MinHasher, NearDuplicateIndex, find_boilerplate, strip_boilerplate
+
+NOTICE = (
+    "Warning: disconnect the power supply before opening the cover. Only qualified "
+    "service personnel may replace the fuse, the battery or the cooling fan of this unit."
+)
+
+
+def _page(n: int, body: str) -> str:
+    return f"ACME Widget Manual\n{body}\nPage {n} of 10"
+
+
+def test_repeated_headers_and_footers_are_found_and_stripped():
+    bodies = ["install the bracket", "tighten the screws", "connect the cable", "test the unit", "done"]
+    pages = [_page(n, body) for n, body in enumerate(bodies, 1)]
+    boilerplate = find_boilerplate(pages)
+    assert boilerplate == {"acme widget manual", "page # of #"}
+    assert strip_boilerplate(pages[2], boilerplate) == "connect the cable"
+    # Lines away from the page edges are kept.
+    text = "intro\nACME Widget Manual\nmore\nend"
+    assert strip_boilerplate(text, boilerplate) == text
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher(num_perm=256)
+    a = "the quick brown fox jumps over the lazy dog near the river bank"
+    b = a.replace("river", "lake")
+    shingles_a, shingles_b = hasher.shingles(a), hasher.shingles(b)
+    jaccard = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+    estimate = np.mean(hasher.signature(a) == hasher.signature(b))
+    assert estimate == pytest.approx(jaccard, abs=0.1)
+
+
+def test_near_duplicates_map_to_the_first_chunk():
+    index = NearDuplicateIndex(threshold=0.7)
+    assert index.canonical("a", NOTICE) == "a"
+    assert index.canonical("b", NOTICE.replace("fan", "fans")) == "a"
+    assert index.canonical("c", "A different paragraph about installing the widget bracket.") == "c"
+    # A chunk ingested again is its own canonical chunk.
+    assert index.canonical("a", NOTICE) == "a"
+    assert len(index) == 2
+
+
+def test_resumed_ingestion_seeds_the_index_with_stored_chunks():
+    index = NearDuplicateIndex()
+    index.extend(["stored"], [NOTICE])
+    assert index.canonical("new", NOTICE) == "stored"
+
+
+def _manual_with_repeated_notice(path: str) -> str:
+    """Every other page repeats the same safety notice between text of its own."""
+    rng = np.random.default_rng(0)
+    sections = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta"]
+    document = pymupdf.open()
+    for n, section in enumerate(sections):
+        body = " ".join(rng.choice(WORDS, size=60))
+        if n % 2:
+            body = f"Section {section} notes\n{NOTICE}\nEnd of section {section}"
+        text = f"ACME Widget Manual\n{body}\nPage {n + 1} of 6"
+        page = document.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=9)
+    document.save(path)
+    document.close()
+    return path
+
+
+def test_retriever_indexes_one_copy_and_reports_every_page(tmp_path):
+    pdf = _manual_with_repeated_notice(str(tmp_path / "manual.pdf"))
+    full = make_retriever(pdf, index_directory=str(tmp_path / "full"))
+    deduplicated = make_retriever(
+        pdf,
+        index_directory=str(tmp_path / "dedup"),
+        dedup_threshold=0.8,
+        strip_boilerplate=True,
+    )
+    assert len(deduplicated.search_index.chunks) < len(full.search_index.chunks)
+    texts = list(deduplicated.search_index.chunks.texts())
+    assert not any("ACME Widget Manual" in text or "of 6" in text for text in texts)
+    assert sum(NOTICE[:40] in text for text in texts) <= 1
+    [document] = deduplicated.search("disconnect the power supply before opening the cover")
+    assert NOTICE[:40] in document.page_content
+    assert document.metadata["pages"] == [1, 3, 5]
+
+
+def test_duplicates_survive_reopening(tmp_path):
+    pdf = make_pdf(str(tmp_path / "manual.pdf"))
+    retriever = make_retriever(pdf, dedup_threshold=0.8)
+    reopened = make_retriever(pdf, dedup_threshold=0.8, ingest=False)
+    assert reopened.duplicates == retriever.duplicates
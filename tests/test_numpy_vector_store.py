@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from fakes import FakeEmbedding
+from numpy_vector_store import NumpyVectorStore
+
+TEXTS = [
+    "transaction commit rollback",
+    "index btree lookup",
+    "join query planner",
+    "schema table column",
+    "trigger update row",
+]
+
+
+def _store(tmp_path, **kwargs) -> NumpyVectorStore:
+    store = NumpyVectorStore(str(tmp_path), FakeEmbedding(), **kwargs)
+    store.add_texts(TEXTS, [{"page": n} for n in range(len(TEXTS))], [f"c{n}" for n in range(len(TEXTS))])
+    return store
+
+
+def test_search_is_exact_and_ranked(tmp_path):
+    store = _store(tmp_path)
+    results = store.similarity_search_with_score("index lookup", k=3)
+    embedding = FakeEmbedding()
+    vectors = np.array(embedding.embed_documents(TEXTS))
+    query = np.array(embedding.embed_query("index lookup"))
+    expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    assert [doc.page_content for doc, _ in results] == [TEXTS[n] for n in np.argsort(-expected)[:3]]
+    assert [score for _, score in results] == pytest.approx(sorted(expected, reverse=True)[:3], abs=1e-6)
+    assert results[0][0].metadata == {"page": 1}
+
+
+def test_persisted_index_is_reopened(tmp_path):
+    store = _store(tmp_path)
+    reopened = NumpyVectorStore(str(tmp_path), FakeEmbedding())
+    assert reopened.get() == store.get()
+    assert reopened.version() == store.version()
+    assert isinstance(reopened.matrix, np.memmap)
+
+
+def test_new_chunks_are_appended_and_existing_ones_replaced_in_place(tmp_path):
+    store = _store(tmp_path)
+    store.add_texts(["view materialized"], [{"page": 9}], ["c5"])
+    assert store.ids == [f"c{n}" for n in range(6)]
+    store.add_texts(["index hash lookup"], [{"page": 1}], ["c1"])
+    assert store.ids == [f"c{n}" for n in range(6)]
+    assert store.similarity_search("hash", k=1)[0].page_content == "index hash lookup"
+    reopened = NumpyVectorStore(str(tmp_path), FakeEmbedding())
+    assert reopened.get()["documents"][1] == "index hash lookup"
+    assert len(reopened.matrix) == 6
+
+
+def test_float16_matrix_scores_like_float32(tmp_path):
+    full = _store(tmp_path / "full")
+    half = _store(tmp_path / "half", dtype="float16")
+    assert half.matrix.dtype == np.float16
+    query = "join planner"
+    full_results = full.similarity_search_with_score(query, k=5)
+    half_results = half.similarity_search_with_score(query, k=5)
+    assert [s for _, s in half_results] == pytest.approx([s for _, s in full_results], abs=1e-3)
+
+
+def test_in_memory_store_and_deletion(tmp_path):
+    memory = NumpyVectorStore(None, FakeEmbedding())
+    memory.add_texts(TEXTS)
+    assert len(memory) == len(TEXTS)
+    store = _store(tmp_path)
+    store.delete_collection()
+    assert len(store) == 0 and store.similarity_search("index") == []
+    assert len(NumpyVectorStore(str(tmp_path), FakeEmbedding())) == 0
@@ -0,0 +1,138 @@
+import random
+
+import pytest
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from fakes import make_pdf
+from offset_splitter import OffsetTextSplitter, PageSpan
+from retriever_with_reranker import CustomDocumentLoader
+
+
+def _recursive(text: str, chunk_size: int, chunk_overlap: int) -> list:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    ).split_text(text)
+
+
+def _offsets(text: str, chunk_size: int, chunk_overlap: int) -> list:
+    spans = OffsetTextSplitter(chunk_size, chunk_overlap).split_spans(text)
+    return [text[start:end] for start, end in spans]
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    # Separators of every level, runs of them, and words longer than small chunks.
+    tokens = ["\n\n", "\n", " ", "  ", "\n\n\n", "\t", "a", "bc", "def", "ghij", "x" * 30]
+    weights = [2, 3, 10, 2, 1, 1, 8, 8, 8, 8, 1]
+    parts, total = [], 0
+    while total < length:
+        token = rng.choices(tokens, weights)[0]
+        parts.append(token)
+        total += len(token)
+    return "".join(parts)
+
+
+@pytest.mark.parametrize(
+    "chunk_size, chunk_overlap",
+    [(2000, 150), (400, 50), (100, 0), (50, 50), (20, 5), (7, 3), (1, 0)],
+)
+def test_random_texts_match_the_recursive_splitter(chunk_size, chunk_overlap):
+    rng = random.Random(chunk_size * 1000 + chunk_overlap)
+    for _ in range(40):
+        text = _random_text(rng, rng.randint(0, 3000))
+        assert _offsets(text, chunk_size, chunk_overlap) == _recursive(
+            text, chunk_size, chunk_overlap
+        )
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "   ",
+        "\n\n\n\n",
+        "  leading and trailing whitespace  \n",
+        "one" * 200,
+        "a b " * 100,
+        "para one\n\npara two\n\n\n\npara three",
+        "line\nline\nline\n" * 40,
+        "word\n\n" + "x" * 120 + "\n\nword",
+    ],
+)
+def test_edge_cases_match_the_recursive_splitter(text):
+    for chunk_size, chunk_overlap in [(50, 10), (10, 10), (3, 0)]:
+        assert _offsets(text, chunk_size, chunk_overlap) == _recursive(
+            text, chunk_size, chunk_overlap
+        )
+
+
+def test_spans_of_a_range_are_relative_to_the_whole_text():
+    text = "prefix " + "alpha beta gamma delta " * 10 + " suffix"
+    start, end = 7, len(text) - 7
+    splitter = OffsetTextSplitter(40, 10)
+    spans = splitter.split_spans(text, start, end)
+    assert all(start <= s < e <= end for s, e in spans)
+    assert [text[s:e] for s, e in spans] == _recursive(text[start:end], 40, 10)
+
+
+def test_split_pages_keeps_the_page_of_each_chunk():
+    texts = ["first page " * 20, "", "third page " * 20]
+    spans = OffsetTextSplitter(50, 10).split_pages(texts)
+    assert {span.page for span in spans} == {0, 2}
+    assert OffsetTextSplitter.slice(texts, spans) == [
+        *_recursive(texts[0], 50, 10),
+        *_recursive(texts[2], 50, 10),
+    ]
+    assert isinstance(spans[0], PageSpan)
+
+
+def test_overlap_larger_than_chunk_size_is_rejected():
+    with pytest.raises(ValueError):
+        OffsetTextSplitter(10, 11)
+
+
+def _chunks(documents) -> list:
+    return [(d.page_content, d.metadata) for d in documents]
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    return make_pdf(str(tmp_path_factory.mktemp("pdf") / "manual.pdf"), pages=5)
+
+
+@pytest.fixture(scope="module")
+def pages(pdf):
+    return list(CustomDocumentLoader(pdf).lazy_load_pages())
+
+
+def test_loaders_produce_the_same_flat_chunks(pdf, pages):
+    recursive = CustomDocumentLoader(pdf).split_and_create_documents(pages=pages)
+    offsets = CustomDocumentLoader(pdf, splitter="offsets").split_and_create_documents(pages=pages)
+    assert len(recursive) > len(pages)
+    assert _chunks(offsets) == _chunks(recursive)
+
+
+def test_loaders_produce_the_same_parent_child_chunks(pdf, pages):
+    children, parents = CustomDocumentLoader(pdf).split_parent_child(pages=pages)
+    offset_children, offset_parents = CustomDocumentLoader(
+        pdf, splitter="offsets"
+    ).split_parent_child(pages=pages)
+    assert len(children) > len(parents)
+    assert _chunks(offset_children) == _chunks(children)
+    assert list(offset_parents) == list(parents)
+    assert _chunks(offset_parents.values()) == _chunks(parents.values())
+
+
+def test_loaders_agree_on_pages_with_separator_runs(pdf):
+    pages = [
+        Document(page_content="  \n\n" + "alpha beta\n" * 300 + "\n\n\n  ", metadata={"page": 0}),
+        Document(page_content="x" * 5000, metadata={"page": 1}),
+        Document(page_content="", metadata={"page": 2}),
+    ]
+    for mode in ("split_and_create_documents", "split_parent_child"):
+        recursive = getattr(CustomDocumentLoader(pdf), mode)(pages=pages)
+        offsets = getattr(CustomDocumentLoader(pdf, splitter="offsets"), mode)(pages=pages)
+        if mode == "split_parent_child":
+            assert list(offsets[1]) == list(recursive[1])
+            recursive, offsets = recursive[0], offsets[0]
+        assert _chunks(offsets) == _chunks(recursive)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import parallel_embeddings
+from parallel_embeddings import ParallelFastEmbedEmbeddings
+
+
+class _Model:
+    """Embeds a text as [its length, 1 for passages or 0]."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, batch_size=None, parallel=None):
+        self.calls.append(("embed", list(texts), parallel))
+        return (np.array([len(t), 0.0]) for t in texts)
+
+    def passage_embed(self, texts, batch_size=None, parallel=None):
+        self.calls.append(("passage", list(texts), parallel))
+        return (np.array([len(t), 1.0]) for t in texts)
+
+    def query_embed(self, text, batch_size=None, parallel=None):
+        return iter([np.array([len(text), 2.0])])
+
+
+class _Pool:
+    """Runs the batches in this process, recording them."""
+
+    def __init__(self):
+        self.batches = []
+
+    def map(self, fn, batches, passages):
+        self.batches.extend(batches)
+        return [fn(batch, passage) for batch, passage in zip(batches, passages)]
+
+
+@pytest.fixture
+def worker_model(monkeypatch):
+    model = _Model()
+    monkeypatch.setattr(parallel_embeddings, "_worker_model", model)
+    return model
+
+
+def _embeddings(**fields) -> ParallelFastEmbedEmbeddings:
+    # Skips validation, which would download the model.
+    embedding = ParallelFastEmbedEmbeddings.model_construct(
+        **{"model_name": "test", "batch_size": 4, "doc_embed_type": "default", **fields}
+    )
+    object.__setattr__(embedding, "model", _Model())
+    return embedding
+
+
+def test_small_calls_are_split_across_workers(worker_model):
+    embedding, pool = _embeddings(workers=3), _Pool()
+    embedding._pool = pool
+    texts = [f"text {'x' * n}" for n in range(7)]
+    vectors = embedding.embed_documents(texts)
+    # Seven texts on three workers: batches of three, well under batch_size.
+    assert [len(batch) for batch in pool.batches] == [3, 3, 1]
+    assert vectors == [[float(len(t)), 0.0] for t in texts]
+
+
+def test_batches_are_capped_at_batch_size(worker_model):
+    embedding, pool = _embeddings(workers=2), _Pool()
+    embedding._pool = pool
+    embedding.embed_documents([str(n) for n in range(20)])
+    assert max(len(batch) for batch in pool.batches) == 4
+
+
+def test_passages_use_passage_embedding(worker_model):
+    embedding, pool = _embeddings(workers=2, doc_embed_type="passage"), _Pool()
+    embedding._pool = pool
+    assert embedding.embed_documents(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+
+
+def test_without_workers_it_embeds_in_process_with_upstream_parallel():
+    embedding = _embeddings(parallel=2)
+    assert embedding.embed_documents(["a", "bb"]) == [[1.0, 0.0], [2.0, 0.0]]
+    assert embedding.model.calls == [("embed", ["a", "bb"], 2)]
+    assert embedding._pool is None
+
+
+def test_single_texts_and_queries_stay_in_process():
+    embedding = _embeddings(workers=4)
+    assert embedding.embed_documents(["abc"]) == [[3.0, 0.0]]
+    assert embedding.embed_query("ab") == [2.0, 2.0]
+    assert embedding._pool is None
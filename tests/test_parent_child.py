@@ -0,0 +1,42 @@
+import pytest
+
+from fakes import make_pdf, make_retriever
+from retriever_with_reranker import CustomDocumentLoader
+
+QUESTION = "transaction trigger index join query"
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    return make_pdf(str(tmp_path_factory.mktemp("parent_child") / "manual.pdf"))
+
+
+def test_children_are_small_pieces_of_their_parents(pdf):
+    children, parents = CustomDocumentLoader(pdf).split_parent_child(
+        child_chunk_size=400, child_chunk_overlap=50
+    )
+    assert len(children) > len(parents) > 0
+    for child in children:
+        parent = parents[child.metadata["parent_id"]]
+        assert len(child.page_content) <= 400
+        assert child.page_content in parent.page_content
+        assert child.metadata["page"] == parent.metadata["page"]
+
+
+def test_search_ranks_children_and_returns_distinct_parents(pdf):
+    retriever = make_retriever(pdf, chunking="parent_child")
+    documents = retriever.search(QUESTION, top_k=2)
+    assert len(documents) == 2
+    parents = {p.page_content for p in retriever.parents.values()}
+    assert all(d.page_content in parents for d in documents)
+    assert documents[0].page_content != documents[1].page_content
+    assert all(len(text) <= 400 for text in retriever.search_index.chunks.texts())
+
+
+def test_parents_are_persisted_with_the_index(pdf):
+    retriever = make_retriever(pdf, chunking="parent_child")
+    reopened = make_retriever(pdf, chunking="parent_child", ingest=False)
+    assert reopened.parents.keys() == retriever.parents.keys()
+    assert reopened.search(QUESTION) == retriever.search(QUESTION)
+    # Both modes keep their own collection.
+    assert retriever.collection_name != make_retriever(pdf).collection_name
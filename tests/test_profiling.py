@@ -0,0 +1,56 @@
+import threading
+import time
+
+from profiling import RequestProfiler, StackSampler
+
+
+def _busy_loop(seconds: float) -> int:
+    deadline, n = time.perf_counter() + seconds, 0
+    while time.perf_counter() < deadline:
+        n += 1
+    return n
+
+
+def test_sampler_sees_other_threads():
+    sampler = StackSampler(interval=0.002)
+    sampler.start()
+    worker = threading.Thread(target=_busy_loop, args=(0.1,), name="fan-out")
+    worker.start()
+    worker.join()
+    stacks = sampler.stop()
+    assert sampler.samples > 0
+    assert any(s.startswith("fan-out;") and "_busy_loop (test_profiling.py" in s for s in stacks)
+
+
+def test_a_profiled_request_writes_a_flamegraph_summary_and_stats(tmp_path):
+    profiler = RequestProfiler(output_dir=str(tmp_path), interval=0.002, top_n=5)
+    with profiler.profile("ask/question?"):
+        _busy_loop(0.05)
+    paths = profiler.last_profile
+    assert set(paths) == {"collapsed", "summary", "pstats"}
+    assert "ask_question_" in paths["summary"]
+    with open(paths["collapsed"], encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    with open(paths["summary"], encoding="utf-8") as f:
+        summary = f.read()
+    assert "sampled self time" in summary and "_busy_loop" in summary
+
+
+def test_only_one_request_is_profiled_at_a_time(tmp_path):
+    profiler = RequestProfiler(output_dir=str(tmp_path))
+    with profiler.profile("outer"):
+        with profiler.profile("inner"):
+            pass
+    assert "outer" in profiler.last_profile["summary"]
+    assert len(list(tmp_path.glob("*.txt"))) == 1
+
+
+def test_disabled_profiles_and_sampling(tmp_path):
+    profiler = RequestProfiler(output_dir=str(tmp_path))
+    with profiler.profile("skipped", enabled=False):
+        pass
+    assert profiler.last_profile is None and not list(tmp_path.iterdir())
+    assert profiler.should_profile(force=True)
+    assert not profiler.should_profile()
+    assert RequestProfiler(sample_rate=1.0).should_profile()
@@ -0,0 +1,70 @@
+import threading
+
+from langchain_core.documents import Document
+
+from fakes import FakeLLM, FakeMessage
+from reasoning_question_handler import CandidateThoughts, ReasoningQuestionHandler
+
+USEFUL = ("What is a schema?", "What is a state?")
+
+
+class _Retriever:
+    """Finds a useful document for the USEFUL thoughts only."""
+
+    def __init__(self):
+        self.batches = []
+
+    def search(self, query, keywords):
+        content = "useful notes" if query in USEFUL else "unrelated notes"
+        return [Document(page_content=f"{content} on {query}", metadata={"page": 0})]
+
+    def search_many(self, queries, keywords):
+        self.batches.append(list(queries))
+        return [self.search(query, keywords) for query in queries]
+
+
+def _respond(graders: list):
+    def respond(variables):
+        if "candidates" in variables:
+            return CandidateThoughts(thoughts=[*USEFUL, "What is a trigger?", USEFUL[0]])
+        if "document" in variables:
+            graders.append(threading.current_thread().name)
+            return FakeMessage("YES" if "useful" in variables["document"] else "NO")
+        if "original_query" in variables:
+            return FakeMessage(f"{variables['original_query']} Rephrased")
+        if "knowledge" in variables:
+            return FakeMessage("YES")
+        return FakeMessage(f"answer to {variables['question']}")
+
+    return respond
+
+
+def test_candidate_thoughts_are_explored_together():
+    graders = []
+    retriever = _Retriever()
+    handler = ReasoningQuestionHandler(
+        FakeLLM(respond=_respond(graders), delay=0.01), retriever, candidate_thoughts=3
+    )
+    result = handler.build_graph().invoke(
+        {
+            "question": "What is the difference between a schema and a state?",
+            "keywords": [],
+            "max_retries": 1,
+            "max_generations": 2,
+        }
+    )
+    # Duplicates are dropped and the list is capped, and all three are retrieved in one batch.
+    assert retriever.batches == [[*USEFUL, "What is a trigger?"]]
+    assert [k["thought"] for k in result["knowledge"]] == list(USEFUL)
+    assert result["final_answer"].startswith("answer to")
+    assert all(name.startswith("candidate-thoughts") for name in graders)
+
+
+def test_handlers_share_one_executor_per_size():
+    first = ReasoningQuestionHandler(FakeLLM(), _Retriever(), candidate_thoughts=3)
+    second = ReasoningQuestionHandler(FakeLLM(), _Retriever(), candidate_thoughts=3)
+    other = ReasoningQuestionHandler(FakeLLM(), _Retriever(), candidate_thoughts=2)
+    single = ReasoningQuestionHandler(FakeLLM(), _Retriever())
+    assert first._executor is second._executor
+    assert other._executor is not first._executor
+    assert single._executor is None
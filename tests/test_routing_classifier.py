@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from fakes import FakeLLM, make_handler, make_pdf
+from routing_classifier import (
+    GRADE,
+    ROUTE,
+    RoutingLog,
+    SoftmaxRouter,
+    _targets,
+    load_router,
+    routing_features,
+    train,
+)
+
+QUESTION = "transaction trigger index join query"
+
+
+def _log_decisions(log: RoutingLog, n: int = 200, seed: int = 0, model: str = "fake-embedding"):
+    """Grade YES when the rerank score is high; route to sub-questions when it is middling."""
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        score = float(rng.uniform(-5, 5))
+        features = routing_features(rng.normal(size=8), score, "a question", "a document")
+        log.append(GRADE, score > 1, features, "a question", model)
+        if score <= 1:
+            log.append(ROUTE, score > -2, features, "a question", model)
+
+
+def test_features_normalize_the_embedding():
+    features = routing_features([3.0, 4.0], 1.5, "two words", "x" * 1000)
+    assert features[:2] == pytest.approx([0.6, 0.8])
+    assert features[2] == 1.5
+    assert features[3:] == pytest.approx([np.log1p(2), np.log1p(1)])
+
+
+def test_targets_allow_the_routes_a_decision_leaves_open():
+    records = [
+        {"stage": GRADE, "decision": True},
+        {"stage": GRADE, "decision": False},
+        {"stage": ROUTE, "decision": True},
+        {"stage": ROUTE, "decision": False},
+    ]
+    assert _targets(records).tolist() == [[1, 0, 0], [0, 1, 1], [0, 1, 0], [0, 0, 1]]
+
+
+def test_trained_router_reproduces_the_logged_decisions(tmp_path):
+    log = RoutingLog(str(tmp_path / "decisions.jsonl"))
+    _log_decisions(log)
+    model_path = str(tmp_path / "model.npz")
+    train(log.path, model_path)
+
+    router = load_router(model_path, "fake-embedding")
+    high = routing_features(np.ones(8), 4.5, "a question", "a document")
+    middle = routing_features(np.ones(8), -0.5, "a question", "a document")
+    low = routing_features(np.ones(8), -4.5, "a question", "a document")
+    assert router.decide(GRADE, high, 0.9) is True
+    assert router.decide(GRADE, low, 0.9) is False
+    assert router.decide(ROUTE, middle, 0.9) is True
+    assert router.decide(ROUTE, low, 0.9) is False
+    # Near the boundary the router defers to the LLM.
+    boundary = routing_features(np.ones(8), 1.0, "a question", "a document")
+    assert router.decide(GRADE, boundary, 0.99) is None
+
+
+def test_router_of_another_embedding_model_is_not_loaded(tmp_path):
+    log = RoutingLog(str(tmp_path / "decisions.jsonl"))
+    _log_decisions(log, model="other-embedding")
+    model_path = str(tmp_path / "model.npz")
+    train(log.path, model_path)
+    assert load_router(model_path, "fake-embedding") is None
+    assert load_router(str(tmp_path / "missing.npz"), "fake-embedding") is None
+
+
+def test_decisions_are_logged_only_when_a_log_path_is_set(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pdf = make_pdf(str(tmp_path / "manual.pdf"))
+    make_handler(monkeypatch, pdf, FakeLLM()).invoke({"question": QUESTION, "max_retries": 1})
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+    log_path = str(tmp_path / "decisions.jsonl")
+    handler = make_handler(monkeypatch, pdf, FakeLLM(), routing_config={"log_path": log_path})
+    handler.invoke({"question": QUESTION, "max_retries": 1})
+    records = list(RoutingLog(log_path).records())
+    assert [(r["stage"], r["decision"]) for r in records] == [(GRADE, True)]
+    assert records[0]["embedding_model"] == "fake-embedding"
+    assert len(records[0]["features"]) == 64 + 3
+
+
+def test_a_confident_router_replaces_the_llm_grader(tmp_path, monkeypatch):
+    pdf = make_pdf(str(tmp_path / "manual.pdf"))
+    features = np.random.default_rng(0).normal(size=(50, 64 + 3))
+    targets = np.tile([1.0, 0.0, 0.0], (50, 1))
+    model_path = str(tmp_path / "model.npz")
+    SoftmaxRouter.fit(features, targets, embedding_model="fake-embedding").save(model_path)
+
+    llm = FakeLLM(content="NO")
+    handler = make_handler(
+        monkeypatch, pdf, llm, routing_config={"model_path": model_path, "audit_rate": 0.0}
+    )
+    result = handler.invoke({"question": QUESTION, "max_retries": 1})
+    # Graded sufficient locally, although the LLM would have said NO.
+    assert not any("knowledge" in call for call in llm.calls)
+    assert result["final_answer"] == "NO"
@@ -0,0 +1,49 @@
+import pytest
+
+from fakes import FakeReranker, make_pdf, make_retriever
+
+QUERIES = [
+    "transaction trigger index join query",
+    "schema key normalization integrity",
+    "widget install manual",
+    "transaction trigger index join query",
+]
+
+
+class CountingReranker(FakeReranker):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def rerank_pairs(self, pairs, **kwargs):
+        pairs = list(pairs)
+        self.batches.append(pairs)
+        return super().rerank_pairs(pairs, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    return make_pdf(str(tmp_path_factory.mktemp("many") / "manual.pdf"))
+
+
+@pytest.mark.parametrize("keywords", [None, ["trigger"], ["trigger", "schema", "widget"]])
+@pytest.mark.parametrize("chunking", ["flat", "parent_child"])
+def test_batched_search_matches_one_search_per_query(pdf, keywords, chunking):
+    retriever = make_retriever(pdf, chunking=chunking)
+    expected = [retriever.search(q, keywords, top_k=2) for q in QUERIES]
+    assert retriever.search_many(QUERIES, keywords, top_k=2) == expected
+
+
+def test_pairs_are_scored_in_one_batch_without_duplicates(pdf):
+    reranker = CountingReranker()
+    retriever = make_retriever(pdf, reranker=reranker, keyphrase_index=False)
+    reranker.batches.clear()
+    retriever.search_many(QUERIES, ["trigger", "schema"])
+    # One batch ranking the keywords for every query, one scoring each distinct (query, chunk) pair.
+    keyword_batch, chunk_batch = reranker.batches
+    assert len(keyword_batch) == len(QUERIES) * 2
+    assert len(chunk_batch) == len(set(chunk_batch))
+    assert {q for q, _ in chunk_batch} == set(QUERIES)
+    assert retriever.search_many([]) == []
+
+
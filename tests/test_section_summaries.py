@@ -0,0 +1,68 @@
+import logging
+
+from langchain_core.documents import Document
+
+from fakes import FakeEmbedding, FakeLLM, FakeMessage, FakeReranker, make_pdf
+from retriever_with_reranker import RetrieveWithReranker
+from section_summaries import SectionSummarizer, build_section_summarizer, is_summary
+
+
+def _pages(n: int) -> list:
+    return [Document(page_content=f"page {i} text", metadata={"page": i}) for i in range(n)]
+
+
+def test_summaries_form_a_tree_over_the_pages():
+    llm = FakeLLM(respond=lambda v: FakeMessage(f"pages {v['first_page']}-{v['last_page']}"))
+    nodes = SectionSummarizer(llm, pages_per_section=4, branching=2).summarize(_pages(10))
+    # Three leaves, two nodes above them and the root.
+    assert [node.metadata["level"] for node in nodes] == [0, 0, 0, 1, 1, 2]
+    assert [node.page_content for node in nodes] == [
+        "pages 1-4", "pages 5-8", "pages 9-10", "pages 1-8", "pages 9-10", "pages 1-10",
+    ]
+    assert nodes[-1].id == "summary-2-0"
+    assert all(is_summary(node.metadata) for node in nodes)
+
+
+def test_a_single_section_is_its_own_root():
+    nodes = SectionSummarizer(FakeLLM(content="all"), pages_per_section=4).summarize(_pages(3))
+    assert len(nodes) == 1
+
+
+def test_blank_pages_are_skipped():
+    pages = [Document(page_content="  ", metadata={"page": 0})]
+    assert SectionSummarizer(FakeLLM()).summarize(pages) == []
+
+
+def test_disabled_summaries_build_no_summarizer():
+    assert build_section_summarizer({}, {}, {"enabled": False, "max_words": 100}) is None
+
+
+def test_failed_summaries_are_logged_and_retried(tmp_path, caplog):
+    pdf = make_pdf(str(tmp_path / "manual.pdf"), pages=4)
+    healthy = FakeLLM(content="summary")
+
+    def respond(variables):
+        raise RuntimeError("provider down")
+
+    failing = FakeLLM(respond=respond)
+    options = dict(
+        file_path=pdf,
+        reranker=FakeReranker(),
+        embedding=FakeEmbedding(),
+        vector_store="numpy",
+        index_directory=str(tmp_path / "indexes"),
+        persist_directory=str(tmp_path / "chromadb"),
+    )
+    with caplog.at_level(logging.WARNING, logger="retriever_with_reranker"):
+        retriever = RetrieveWithReranker(summarizer=SectionSummarizer(failing), **options)
+    assert "Section summaries of" in caplog.text
+    assert caplog.records[0].exc_info is not None
+    assert not retriever.has_summaries() and retriever.needs_finalize()
+
+    # A serving retriever leaves the retry to an ingestion job.
+    retriever = RetrieveWithReranker(
+        summarizer=SectionSummarizer(healthy), ingest=False, **options
+    )
+    assert retriever.needs_finalize()
+    retriever.finalize_ingest()
+    assert retriever.has_summaries() and not retriever.needs_finalize()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from fakes import FakeLLM, make_handler, make_pdf
+from singleflight import SingleFlight
+
+
+def _run_concurrently(fn, n: int) -> list:
+    results = [None] * n
+    errors = [None] * n
+
+    def run(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight, calls = SingleFlight(), []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"answer": [1, 2]}
+
+    results, _ = _run_concurrently(lambda: flight.do("key", slow), 4)
+    assert len(calls) == 1
+    assert all(result == {"answer": [1, 2]} for result in results)
+
+
+def test_followers_get_their_own_copy():
+    flight = SingleFlight()
+    results, _ = _run_concurrently(
+        lambda: flight.do("key", lambda: time.sleep(0.1) or {"answer": [1]}), 3
+    )
+    results[0]["answer"].append(2)
+    assert sum(result["answer"] == [1] for result in results) >= 2
+
+
+def test_followers_receive_the_exception():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    _, errors = _run_concurrently(lambda: flight.do("key", fail), 3)
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_nothing_is_cached_after_the_call():
+    flight, calls = SingleFlight(), []
+    flight.do("key", calls.append, 1)
+    flight.do("key", calls.append, 2)
+    assert calls == [1, 2]
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    llm = FakeLLM(delay=0.05)
+    return make_handler(monkeypatch, make_pdf(str(tmp_path / "manual.pdf")), llm), llm
+
+
+def test_identical_questions_are_coalesced(handler):
+    handler, llm = handler
+    question = {"question": "transaction trigger index join query", "max_retries": 1}
+    results, errors = _run_concurrently(lambda: handler.invoke(dict(question)), 3)
+    assert errors == [None] * 3
+    single_run_calls = len(llm.calls)
+    llm.calls.clear()
+    handler.invoke(dict(question))
+    assert single_run_calls == len(llm.calls)
+    results[0]["final_answer"] = "changed"
+    assert [r["final_answer"] for r in results[1:]] == ["YES", "YES"]
+
+
+def test_explicit_run_ids_are_not_coalesced(handler):
+    handler, llm = handler
+    question = {"question": "transaction trigger index join query", "max_retries": 1}
+    handler.invoke(dict(question))
+    single_run_calls = len(llm.calls)
+    llm.calls.clear()
+    ids = iter(["run-a", "run-b"])
+    lock = threading.Lock()
+
+    def invoke():
+        with lock:
+            run_id = next(ids)
+        return handler.invoke(dict(question), run_id=run_id)
+
+    _, errors = _run_concurrently(invoke, 2)
+    assert errors == [None, None]
+    assert len(llm.calls) == 2 * single_run_calls
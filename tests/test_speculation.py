@@ -0,0 +1,84 @@
+import threading
+import time
+
+from fakes import FakeLLM, make_handler, make_pdf
+from speculation import Speculator
+
+
+def _wait(seconds: float, value):
+    time.sleep(seconds)
+    return value
+
+
+def test_take_or_run_returns_the_speculative_result():
+    speculator = Speculator(enabled=True)
+    assert speculator.speculate("run", "step", _wait, 0.01, "speculated")
+    assert speculator.take_or_run("run", "step", _wait, 0, "direct") == "speculated"
+    assert speculator.stats.snapshot()["hits"] == 1
+
+
+def test_resolve_drops_only_the_losers_of_its_run():
+    speculator = Speculator(enabled=True, max_in_flight=4)
+    speculator.speculate("a", "answer", _wait, 0.05, "a-answer")
+    speculator.speculate("a", "rewrite", _wait, 0.05, "a-rewrite")
+    speculator.speculate("b", "rewrite", _wait, 0.05, "b-rewrite")
+    speculator.resolve("a", keep="answer")
+    speculator.finish("a")
+    assert speculator.take_or_run("b", "rewrite", _wait, 0, "direct") == "b-rewrite"
+    assert speculator.stats.snapshot()["misses"] == 2
+
+
+def test_budget_and_in_flight_caps():
+    speculator = Speculator(enabled=True, max_calls_per_run=1, max_in_flight=1)
+    assert speculator.speculate("a", "one", _wait, 0.1, 1)
+    assert not speculator.speculate("a", "two", _wait, 0, 2)
+    assert not speculator.speculate("b", "one", _wait, 0, 1)
+    speculator.finish("a")
+    # The dropped call still holds the only worker until it returns.
+    assert not speculator.speculate("b", "one", _wait, 0, 1)
+    time.sleep(0.15)
+    assert speculator.speculate("b", "one", _wait, 0, 1)
+
+
+def test_queued_call_runs_directly():
+    speculator = Speculator(enabled=True, max_in_flight=2)
+    speculator._executor._max_workers = 1
+    speculator.speculate("a", "slow", _wait, 0.1, "slow")
+    speculator.speculate("a", "queued", _wait, 0.1, "speculated")
+    assert speculator.take_or_run("a", "queued", _wait, 0, "direct") == "direct"
+    assert speculator.stats.snapshot()["cancelled"] == 1
+
+
+def test_disabled_speculator_runs_everything_directly():
+    speculator = Speculator(enabled=False)
+    assert not speculator.speculate("a", "step", _wait, 0, "speculated")
+    assert speculator.take_or_run("a", "step", _wait, 0, "direct") == "direct"
+
+
+def test_concurrent_runs_of_one_question_keep_their_own_speculation(tmp_path, monkeypatch):
+    llm = FakeLLM(delay=0.1)
+    llm.max_concurrency = 16
+    handler = make_handler(
+        monkeypatch,
+        make_pdf(str(tmp_path / "manual.pdf")),
+        llm,
+        speculation_config={"enabled": True, "max_calls_per_run": 2, "max_in_flight": 8},
+    )
+    question = {"question": "transaction trigger index join query", "max_retries": 1}
+    finals = []
+
+    def stream():
+        finals.append(dict(handler.stream(dict(question)))["final"])
+
+    threads = [threading.Thread(target=stream) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [final["final_answer"] for final in finals] == ["YES", "YES"]
+    assert finals[0]["run_id"] != finals[1]["run_id"]
+    stats = handler.speculation_stats()
+    # Each run drafted its answer and rewrote its question while grading, and used the draft.
+    assert stats["started"] == 4
+    assert stats["hits"] == 2 and stats["misses"] == 2